@@ -0,0 +1,159 @@
+# aggregates.py
+"""
+Mergeable distribution aggregates of a result set, broken down by risk class.
+
+Every tracked value (score_norm and the sanitized display features, all of
+which scoring clamps to a fixed range) gets a histogram of AGG_BINS equal
+bins per risk class, plus per-class sums. The fine histogram doubles as a
+quantile sketch: quantiles are interpolated inside the bin they fall in, so
+the error is at most one bin width (0.1 points for the % features). Coarser
+chart histograms are the fine bins summed in groups.
+
+Aggregates are built per scored chunk (make_shard, or in parallel workers)
+and combined by adding counts, so shards, streamed chunks and incremental
+uploads merge without touching stored rows again; subtracting works the same
+way for rows an upsert replaces or drops.
+"""
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+from scoring import RISK_CLASSES
+
+AGG_BINS = 1000
+
+# value -> (lo, hi) of its fixed range
+AGG_RANGES = {
+    'score_norm': (0.0, 1.0),
+    'util_pct': (0.0, 100.0),
+    'avg_pay': (0.0, 1.0),
+    'minpaid_pct': (0.0, 100.0),
+    'cash_pct': (0.0, 100.0),
+    'spend_change_pct': (-100.0, 100.0),
+    'merchant_mix': (0.0, 1.0)
+}
+AGG_FEATURES = [k for k in AGG_RANGES if k != 'score_norm']
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+DEFAULT_CHART_BINS = 20
+
+def _bin_index(values: np.ndarray, lo: float, hi: float, bins: int) -> np.ndarray:
+    idx = np.floor((values - lo) * (bins / (hi - lo)))
+    return np.clip(np.nan_to_num(idx, nan=0.0), 0, bins - 1).astype(np.int64)
+
+class Aggregates:
+    def __init__(self, bins: int = AGG_BINS):
+        k = len(RISK_CLASSES)
+        self.bins = bins
+        self.counts = np.zeros(k, dtype=np.int64)
+        self.hist = {name: np.zeros((k, bins), dtype=np.int64) for name in AGG_RANGES}
+        self.sums = {name: np.zeros(k, dtype=np.float64) for name in AGG_RANGES}
+        self.abs_sums = {name: np.zeros(k, dtype=np.float64) for name in AGG_RANGES}
+
+    @classmethod
+    def from_batch(cls, risk_code: np.ndarray, score_norm: np.ndarray, features: Dict[str, np.ndarray],
+                   bins: int = AGG_BINS) -> 'Aggregates':
+        """
+        Aggregates of one scored chunk: risk codes, score_norm and the
+        sanitize_batch display features of the same rows.
+        """
+        agg = cls(bins)
+        k = len(RISK_CLASSES)
+        code = np.asarray(risk_code, dtype=np.int64)
+        if not len(code):
+            return agg
+        agg.counts += np.bincount(code, minlength=k)
+        for name, (lo, hi) in AGG_RANGES.items():
+            values = np.asarray(score_norm if name == 'score_norm' else features[name], dtype=np.float64)
+            flat = code * bins + _bin_index(values, lo, hi, bins)
+            agg.hist[name] += np.bincount(flat, minlength=k * bins).reshape(k, bins)
+            finite = np.where(np.isfinite(values), values, 0.0)
+            agg.sums[name] += np.bincount(code, weights=finite, minlength=k)
+            agg.abs_sums[name] += np.bincount(code, weights=np.abs(finite), minlength=k)
+        return agg
+
+    def merge(self, other: 'Aggregates', sign: int = 1) -> 'Aggregates':
+        # in place; sign=-1 removes rows previously merged in
+        if other.bins != self.bins:
+            raise ValueError(f"Cannot merge aggregates with {other.bins} and {self.bins} bins")
+        self.counts += sign * other.counts
+        for name in AGG_RANGES:
+            self.hist[name] += sign * other.hist[name]
+            self.sums[name] += sign * other.sums[name]
+            self.abs_sums[name] += sign * other.abs_sums[name]
+        return self
+
+    def copy(self) -> 'Aggregates':
+        return Aggregates(self.bins).merge(self)
+
+    def nbytes(self) -> int:
+        return self.counts.nbytes + sum(self.hist[n].nbytes + self.sums[n].nbytes + self.abs_sums[n].nbytes
+                                        for n in AGG_RANGES)
+
+    # -- persistence (snapshot.py)
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        out = {'counts': self.counts}
+        for name in AGG_RANGES:
+            out[f'hist.{name}'] = self.hist[name]
+            out[f'sums.{name}'] = self.sums[name]
+            out[f'abs_sums.{name}'] = self.abs_sums[name]
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'Aggregates':
+        agg = cls(int(arrays['hist.score_norm'].shape[1]))
+        agg.counts = np.array(arrays['counts'], dtype=np.int64)
+        for name in AGG_RANGES:
+            agg.hist[name] = np.array(arrays[f'hist.{name}'], dtype=np.int64)
+            agg.sums[name] = np.array(arrays[f'sums.{name}'], dtype=np.float64)
+            agg.abs_sums[name] = np.array(arrays[f'abs_sums.{name}'], dtype=np.float64)
+        return agg
+
+    # -- reading
+    def quantiles(self, name: str, qs: Sequence[float], risk_code: Optional[int] = None) -> List[Optional[float]]:
+        hist = self.hist[name].sum(axis=0) if risk_code is None else self.hist[name][risk_code]
+        total = int(hist.sum())
+        if not total:
+            return [None] * len(qs)
+        lo, hi = AGG_RANGES[name]
+        width = (hi - lo) / self.bins
+        cum = np.cumsum(hist)
+        out = []
+        for q in qs:
+            target = min(max(float(q), 0.0), 1.0) * total
+            i = min(int(np.searchsorted(cum, target, side='left')), self.bins - 1)
+            before = cum[i - 1] if i else 0
+            frac = (target - before) / hist[i] if hist[i] else 0.0
+            out.append(round(lo + (i + frac) * width, 6))
+        return out
+
+    def describe(self, chart_bins: int = DEFAULT_CHART_BINS, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+        """
+        JSON view: class counts, then per value chart histogram (chart_bins
+        bins, must divide AGG_BINS), mean, mean of absolute values and
+        quantiles, each for all customers and per risk class.
+        """
+        if chart_bins < 1 or self.bins % chart_bins:
+            raise ValueError(f"bins must divide {self.bins}")
+        group = self.bins // chart_bins
+        groups = [('all', None)] + [(c, i) for i, c in enumerate(RISK_CLASSES)]
+        n = {g: int(self.counts.sum() if i is None else self.counts[i]) for g, i in groups}
+        values = {}
+        for name, (lo, hi) in AGG_RANGES.items():
+            coarse = self.hist[name].reshape(len(RISK_CLASSES), chart_bins, group).sum(axis=2)
+            sums, abs_sums = self.sums[name], self.abs_sums[name]
+            values[name] = {
+                'range': [lo, hi],
+                'edges': np.linspace(lo, hi, chart_bins + 1).round(6).tolist(),
+                'counts': {g: (coarse.sum(axis=0) if i is None else coarse[i]).tolist() for g, i in groups},
+                'mean': {g: (round(float(sums.sum() if i is None else sums[i]) / n[g], 6) if n[g] else None) for g, i in groups},
+                'mean_abs': {g: (round(float(abs_sums.sum() if i is None else abs_sums[i]) / n[g], 6) if n[g] else None) for g, i in groups},
+                'quantiles': {g: dict(zip([str(q) for q in qs], self.quantiles(name, qs, i))) for g, i in groups}
+            }
+        return {
+            'risk_classes': RISK_CLASSES,
+            'counts': n,
+            'sketch_bins': self.bins,
+            'quantile_error': {name: (hi - lo) / self.bins for name, (lo, hi) in AGG_RANGES.items()},
+            'score_norm': values.pop('score_norm'),
+            'features': values
+        }
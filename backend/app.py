@@ -1,10 +1,29 @@
 # app.py
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
-import io
-from scoring import score_row
-from utils import parse_csv_bytes, validate_records_columns, records_to_csv_bytes
+from fastapi.responses import Response, JSONResponse, StreamingResponse, PlainTextResponse
+import asyncio
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+import aggregates
+import ingest
+import metrics
+import parallel
+import jobs
+import snapshot
+from results import ResultRegistry
+from scoring import score_row, score_batch, sanitize_batch, action_code, RISK_CLASSES, CONTRIB_KEYS, FLAG_BITS
+from store import ResultStore, shard_from_decoded
+from schema import resolve_schema, ColumnDecoder
+from query import query_records, worklist_records
+from rescore import resolve_params, rescore, rescore_summary
+from export import export_stream
+from columnar import columnar_bytes, encode_json
+from delta import DeltaUpload
+from utils import parse_csv_rows, CsvStreamParser, parse_csv_header
 
 app = FastAPI(title="Credit Card Early Risk API - Simple (no pandas)")
 
@@ -15,90 +34,469 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 'Content-Encoding: gzip' request bodies are inflated as they arrive (ingest.py)
+app.add_middleware(ingest.GzipRequestMiddleware)
 
-# simple in-memory store
-LAST_RESULTS = {
-    'records': []  # list of dicts (original row keys + scoring fields)
-}
+# bytes read from the upload per step in streaming mode
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+# with SNAPSHOT_DIR set, uploads are published as on-disk snapshots so every
+# worker process serves the latest one; unset, results stay in this process
+SNAPSHOTS = snapshot.SnapshotWatcher() if snapshot.SNAPSHOT_DIR else None
+
+# scored uploads by upload ID (columnar stores, see store.py / results.py)
+RESULTS = ResultRegistry(snapshots=SNAPSHOTS)
 
 @app.get("/")
 async def root():
     return {"message": "Credit Card Early Risk API (CSV parsing without pandas). POST /upload to score a CSV file."}
 
+def _score_rows_rowwise(decoder, rows):
+    # reference path: score_row on one dict per record
+    with metrics.stage('decode', len(rows)):
+        decoded = decoder.decode(rows)
+    header = decoder.schema.header
+    with metrics.stage('score', len(rows)):
+        outs = [score_row({h: v.strip() for h, v in zip(header, r)}) for r in rows]
+    batch = {
+        'raw_score': np.array([o['raw_score'] for o in outs], dtype=np.float64),
+        'score_norm': np.array([o['score_norm'] for o in outs], dtype=np.float64),
+        'risk_code': np.array([RISK_CLASSES.index(o['risk_class']) for o in outs], dtype=np.int8),
+        'contribs': np.array([[o['contribs'][k] for k in CONTRIB_KEYS] for o in outs], dtype=np.float64).reshape(-1, len(CONTRIB_KEYS)),
+        'top3': np.array([[CONTRIB_KEYS.index(k) for k, _ in o['top3']] for o in outs], dtype=np.int8).reshape(-1, 3),
+        'flag_bits': np.array([sum(1 << FLAG_BITS.index(f) for fl in o['flags'].values() for f, _ in fl) for o in outs], dtype=np.uint32),
+        'action_code': np.array([action_code(o['risk_class'], o) for o in outs], dtype=np.uint8),
+        'features': sanitize_batch(decoded['columns'])
+    }
+    return shard_from_decoded(decoded, batch)
+
+def _score_rows_batch(decoder, rows):
+    with metrics.stage('decode', len(rows)):
+        decoded = decoder.decode(rows)
+    with metrics.stage('score', len(rows)):
+        return shard_from_decoded(decoded, score_batch(decoded['columns']))
+
+def _resolve_schema(header):
+    schema = resolve_schema(header)
+    if schema.missing:
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {schema.missing}")
+    return schema
+
+def _require_rows(n: int):
+    # a header without data rows never replaces the latest results
+    if n == 0:
+        raise HTTPException(status_code=400, detail="CSV has no data rows.")
+
+def _upload_response(store, schema, **extra):
+    response = dict(store.summary(), upload_id=store.uid)
+    response['schema'] = dict(schema.describe(), **store.parse_stats)
+    response.update(extra)
+    return response
+
+def _records_response(store, response):
+    with metrics.stage('materialize', len(store)):
+        response['records'] = list(store.iter_rows())
+    with metrics.stage('encode', len(store)):
+        return JSONResponse(content=response)
+
+def _columnar_response(store):
+    # summary + one array per field (columnar.py), encoded once per result set
+    with metrics.stage('encode', len(store)):
+        body, cached = columnar_bytes(store)
+    return Response(content=body, media_type='application/json', headers={'X-Cache': 'hit' if cached else 'miss'})
+
+async def _publish(store):
+    # the store is complete and never written again from here on; it is
+    # registered only once its snapshot is current, so a failed write never
+    # leaves this process serving results the other workers cannot see
+    if SNAPSHOTS is not None:
+        with metrics.stage('snapshot', len(store)):
+            await run_in_threadpool(snapshot.publish, store, SNAPSHOTS.root)
+    RESULTS.add(store)
+
+def _publish_job(store):
+    # jobs.JobManager worker thread; same as _publish, off the event loop
+    if SNAPSHOTS is not None:
+        with metrics.stage('snapshot', len(store)):
+            snapshot.publish(store, SNAPSHOTS.root)
+    RESULTS.add(store)
+
+# background scoring jobs (POST /jobs), see jobs.py
+JOBS = jobs.JobManager(_publish_job)
+
+@app.on_event("shutdown")
+def _shutdown_jobs():
+    JOBS.shutdown()
+
+# event-loop lag probe (metrics.monitor_event_loop), one per worker process
+_LOOP_MONITOR = None
+
+@app.on_event("startup")
+async def _start_loop_monitor():
+    global _LOOP_MONITOR
+    if metrics.METRICS_ENABLED and metrics.LOOP_MONITOR_INTERVAL > 0:
+        _LOOP_MONITOR = asyncio.create_task(metrics.monitor_event_loop())
+
+@app.on_event("shutdown")
+async def _stop_loop_monitor():
+    if _LOOP_MONITOR is not None:
+        _LOOP_MONITOR.cancel()
+
+def _current_store(upload_id: Optional[str] = None):
+    """
+    The result set of `upload_id` (404 if unknown or evicted without a
+    snapshot), else the latest upload, or None before any non-empty upload.
+    """
+    if upload_id:
+        store = RESULTS.get(upload_id)
+        if store is None:
+            raise HTTPException(status_code=404, detail=f"Unknown upload_id: {upload_id}")
+        return store
+    store = RESULTS.latest()
+    return store if store is not None and len(store) else None
+
+class _DecompressedUpload:
+    """
+    UploadFile-style async read() over a .csv.gz / .csv.zst upload: the
+    spooled file is decompressed a read at a time, off the event loop.
+    """
+    def __init__(self, file: UploadFile, compression: str):
+        self.filename = file.filename
+        self._reader = ingest.open_decompressed(file.file, compression)
+
+    async def read(self, size: int = -1) -> bytes:
+        try:
+            return await run_in_threadpool(self._reader.read, size)
+        except ingest.DECOMPRESS_ERRORS as e:
+            raise HTTPException(status_code=400, detail=f"Unable to decompress upload: {e}")
+
+def _upload_compression(filename: str) -> Optional[str]:
+    try:
+        return ingest.upload_compression(filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _upload_chunks(file: UploadFile):
+    """
+    Read and parse the upload UPLOAD_CHUNK_BYTES at a time, yielding
+    (decoder, rows, parser) once the header is known (rows may be empty).
+    """
+    parser = CsvStreamParser(dict_rows=False)
+    decoder = None
+    while True:
+        with metrics.stage('read'):
+            data = await file.read(UPLOAD_CHUNK_BYTES)
+        metrics.record_bytes(len(data))
+        with metrics.stage('parse') as st:
+            try:
+                rows = parser.feed(data) if data else parser.close()
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Unable to parse CSV: {e}")
+            st.rows = len(rows)
+        if decoder is None and (parser.fieldnames is not None or not data):
+            with metrics.stage('validate'):
+                decoder = ColumnDecoder(_resolve_schema(parser.fieldnames))
+        if decoder is not None:
+            yield decoder, rows, parser
+        if not data:
+            return
+
+async def _upload_streaming(file: UploadFile, score_fn):
+    # read, parse and score one chunk at a time; only the compact store and its
+    # running class counts outlive a chunk
+    store = None
+    async for decoder, rows, parser in _upload_chunks(file):
+        if store is None:
+            store = ResultStore(decoder.schema.output_header)
+        if rows:
+            shard = score_fn(decoder, rows)
+            with metrics.stage('aggregate', len(rows)):
+                store.append_shard(shard)
+
+    _require_rows(len(store))
+    return store, _upload_response(store, decoder.schema, bytes_read=parser.bytes_read, encoding=parser.encoding)
+
+async def _upload_upsert(file: UploadFile, base_id: Optional[str], keep_missing: bool):
+    # stream the file and re-score only new or changed customers against the
+    # base result set (the latest one by default); answers with counts only
+    base = _current_store(base_id)
+    delta = None
+    n_rows = 0
+    async for decoder, rows, parser in _upload_chunks(file):
+        if delta is None:
+            delta = DeltaUpload(base, decoder.schema.output_header, keep_missing)
+        if rows:
+            with metrics.stage('decode', len(rows)):
+                decoded = decoder.decode(rows)
+            delta.add(decoded)
+            n_rows += len(rows)
+
+    _require_rows(n_rows)
+    store = delta.finish()
+    return store, _upload_response(store, decoder.schema, bytes_read=parser.bytes_read, encoding=parser.encoding,
+                                   **delta.report())
+
+async def _upload_parallel(content: bytes, encoding: str):
+    with metrics.stage('validate'):
+        schema = _resolve_schema(parse_csv_header(content, encoding))
+    with metrics.stage('parallel_score') as st:
+        try:
+            shards = await parallel.score_csv_parallel(content, parallel.SCORING_WORKERS, encoding=encoding)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unable to parse CSV: {e}")
+        st.rows = sum(len(s['ids']) for s in shards)
+    _require_rows(st.rows)
+
+    store = ResultStore(schema.output_header)
+    with metrics.stage('aggregate', st.rows):
+        for shard in shards:
+            store.append_shard(shard)
+    return store, _upload_response(store, schema, encoding=encoding)
+
+async def _upload_buffered(file: UploadFile, score_fn, engine: str):
+    with metrics.stage('read'):
+        content = await file.read()
+    metrics.record_bytes(len(content))
+    encoding = ingest.detect_encoding(content)
+
+    # large files are split into byte ranges and scored on the process pool
+    if (engine == 'batch' and parallel.SCORING_WORKERS > 1 and len(content) >= parallel.PARALLEL_MIN_BYTES
+            and encoding in ingest.BYTE_SPLITTABLE):
+        return await _upload_parallel(content, encoding)
+
+    with metrics.stage('parse') as st:
+        try:
+            header, rows = parse_csv_rows(content, encoding)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Unable to parse CSV: {e}")
+        st.rows = len(rows)
+
+    # header resolved once per file; cells decoded column by column
+    with metrics.stage('validate'):
+        decoder = ColumnDecoder(_resolve_schema(header))
+    _require_rows(len(rows))
+    store = ResultStore(decoder.schema.output_header)
+    shard = score_fn(decoder, rows)
+    with metrics.stage('aggregate', len(rows)):
+        store.append_shard(shard)
+    return store, _upload_response(store, decoder.schema, encoding=encoding)
+
 @app.post("/upload")
-async def upload_csv(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith('.csv'):
-        raise HTTPException(status_code=400, detail="Please upload a CSV file with .csv extension.")
-    content = await file.read()
+async def upload_csv(file: UploadFile = File(...), engine: str = Query('batch', regex='^(batch|row)$'),
+                     mode: str = Query('buffered', regex='^(buffered|stream|upsert)$'),
+                     base: str = None, keep_missing: bool = False,
+                     layout: str = Query('records', regex='^(records|columnar)$')):
+    # .csv.gz / .csv.zst are decompressed a chunk at a time as they are parsed
+    compression = _upload_compression(file.filename)
+    source = file if compression is None else _DecompressedUpload(file, compression)
+
+    # 'batch' scores whole columns at once (same results as 'row', the per-record loop)
+    score_fn = _score_rows_rowwise if engine == 'row' else _score_rows_batch
+
+    t0 = time.perf_counter()
     try:
-        records = parse_csv_bytes(content)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Unable to parse CSV: {e}")
-
-    missing = validate_records_columns(records)
-    if missing:
-        raise HTTPException(status_code=400, detail=f"Missing required columns: {missing}")
-
-    scored_rows = []
-    for r in records:
-        score_out = score_row(r)
-        out = r.copy()
-        # attach computed fields
-        out.update({
-            'raw_score': score_out['raw_score'],
-            'score_norm': score_out['score_norm'],
-            'risk_class': score_out['risk_class'],
-            'top3_contribs': str(score_out['top3']),
-            'contribs': str(score_out['contribs'])
-        })
-        scored_rows.append(out)
-
-    LAST_RESULTS['records'] = scored_rows
-
-    total = len(scored_rows)
-    high = sum(1 for r in scored_rows if r.get('risk_class') == 'High')
-    medium = sum(1 for r in scored_rows if r.get('risk_class') == 'Medium')
-    low = sum(1 for r in scored_rows if r.get('risk_class') == 'Low')
-
-    response = {
-        'total_customers': total,
-        'high_risk': high,
-        'medium_risk': medium,
-        'low_risk': low,
-        'records': scored_rows
-    }
-    return JSONResponse(content=response)
+        # 'stream' never holds the raw file in memory and answers with totals only
+        if mode == 'stream':
+            store, response = await _upload_streaming(source, score_fn)
+        # 'upsert' streams too, diffing against the `base` upload (default: latest)
+        elif mode == 'upsert':
+            store, response = await _upload_upsert(source, base, keep_missing)
+        else:
+            if compression is None:
+                store, response = await _upload_buffered(file, score_fn, engine)
+            else:
+                # never inflated whole: scored chunk by chunk, answered like buffered
+                store, response = await _upload_streaming(source, score_fn)
+            # 'records' lists every row as an object; 'columnar' returns arrays per field
+            if layout == 'columnar':
+                response = _columnar_response(store)
+            else:
+                response = _records_response(store, response)
+        # only a result set whose response was built replaces the latest one
+        await _publish(store)
+    except Exception:
+        metrics.record_upload(mode, time.perf_counter() - t0, 0, ok=False)
+        raise
+    metrics.record_upload(mode, time.perf_counter() - t0, len(store))
+    return response
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...), mode: str = Query('score', regex='^(score|upsert)$'),
+                     base: str = None, keep_missing: bool = False):
+    # spool the file (still compressed, if it is) and return at once; poll
+    # /jobs/{job_id} for progress
+    compression = _upload_compression(file.filename)
+    job = jobs.Job(file.filename, mode, _current_store(base) if mode == 'upsert' else None, keep_missing, compression)
+    try:
+        JOBS.reserve(job)
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': '5'})
+    try:
+        job.path = JOBS.spool_path()
+        with open(job.path, 'wb') as out:
+            while True:
+                data = await file.read(UPLOAD_CHUNK_BYTES)
+                if not data:
+                    break
+                await run_in_threadpool(out.write, data)
+                job.bytes_total += len(data)
+        metrics.record_bytes(job.bytes_total)
+    except BaseException as e:
+        JOBS.release(job, 'failed', f"Unable to read upload: {e}")
+        raise
+    JOBS.start(job)
+    return job.describe()
+
+@app.get("/jobs")
+async def list_jobs():
+    return {'jobs': JOBS.describe(), 'counts': JOBS.counts(), 'max_queue': JOBS.max_queue, 'workers': JOBS.workers}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return job.describe()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return job.describe()
+
+@app.get("/uploads")
+async def list_uploads():
+    # result sets held by this worker, most recently used first
+    return {'uploads': RESULTS.describe(), 'bytes': RESULTS.total_bytes(), 'max_bytes': RESULTS.max_bytes}
 
 @app.get("/summary")
-async def get_summary():
-    recs = LAST_RESULTS.get('records', [])
-    if not recs:
+async def get_summary(upload_id: str = None):
+    store = _current_store(upload_id)
+    if store is None:
         return {"message": "No data processed yet."}
-    total = len(recs)
-    high = sum(1 for r in recs if r.get('risk_class') == 'High')
-    medium = sum(1 for r in recs if r.get('risk_class') == 'Medium')
-    low = sum(1 for r in recs if r.get('risk_class') == 'Low')
-    return {
-        'total_customers': total,
-        'high_risk': high,
-        'medium_risk': medium,
-        'low_risk': low
-    }
+    return dict(store.summary(), upload_id=store.uid)
+
+@app.get("/aggregates")
+async def get_aggregates(upload_id: str = None, bins: int = Query(20, ge=1), quantiles: str = None):
+    # chart histograms, means and quantiles per risk class, kept up to date
+    # while scoring (see aggregates.py); no pass over the rows here
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    try:
+        qs = [float(q) for q in quantiles.split(',') if q.strip()] if quantiles else aggregates.DEFAULT_QUANTILES
+        if any(not 0.0 <= q <= 1.0 for q in qs):
+            raise ValueError("quantiles must be between 0 and 1")
+        return dict(store.get_aggregates().describe(bins, qs), upload_id=store.uid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _list_param(value: Optional[str]) -> List[str]:
+    # comma-separated query parameter -> its non-empty items
+    return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+@app.get("/cube")
+async def get_cube(by: str = 'risk_class', risk_class: str = None, limit_band: str = None, util_band: str = None,
+                   flag: str = None, upload_id: str = None):
+    # customer counts, credit limit sums and mean score_norm, grouped by the
+    # comma-separated `by` dimensions and rolled up over the rest; the other
+    # parameters keep only the listed labels. Read from the cube cells kept
+    # while scoring (see cube.py); no pass over the rows here
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    filters = {'risk_class': _list_param(risk_class), 'limit_band': _list_param(limit_band),
+               'util_band': _list_param(util_band), 'flag': _list_param(flag)}
+    try:
+        cube = store.get_cube()
+        return dict(cube.query(_list_param(by), filters), dimensions=cube.dimensions(), upload_id=store.uid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/customer/{customer_id}")
-async def get_customer(customer_id: str):
-    recs = LAST_RESULTS.get('records', [])
-    for r in recs:
-        if str(r.get('Customer ID')) == str(customer_id):
-            return r
-    raise HTTPException(status_code=404, detail="Customer not found in last processed file.")
+async def get_customer(customer_id: str, upload_id: str = None):
+    store = _current_store(upload_id)
+    # flags, reasons and actions are rendered here only, from the stored codes
+    rec = store.detail(customer_id) if store is not None else None
+    if rec is None:
+        raise HTTPException(status_code=404, detail="Customer not found in last processed file.")
+    return rec
+
+@app.get("/records")
+async def get_records(score_min: float = None, score_max: float = None, risk_class: str = None,
+                      flag: str = None, id_prefix: str = None, sort: str = 'score_norm',
+                      order: str = 'desc', offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=1000),
+                      cursor: int = Query(None, ge=0), with_total: bool = False, upload_id: str = None):
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    try:
+        return query_records(store, score_min=score_min, score_max=score_max, risk_class=risk_class,
+                             flag=flag, id_prefix=id_prefix, sort=sort, order=order, offset=offset,
+                             limit=limit, cursor=cursor, with_total=with_total)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/worklist")
+async def get_worklist(n: int = Query(100, ge=1), order: str = 'score', upload_id: str = None):
+    # top-n customers by score_norm or by score_norm x credit limit, from the
+    # candidates kept while scoring (see worklist.py); no sort of the full set
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    try:
+        body = dict(worklist_records(store, n, order), upload_id=store.uid)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # encoded directly: a few thousand records would spend far longer in
+    # FastAPI's generic response encoding than in the lookup itself
+    return Response(encode_json(body), media_type='application/json')
+
+class RescoreRequest(BaseModel):
+    weights: Optional[Dict[str, float]] = None
+    flag_thresholds: Optional[Dict[str, float]] = None
+    risk_thresholds: Optional[Dict[str, float]] = None
+
+@app.post("/rescore")
+async def rescore_last(req: RescoreRequest, upload_id: str = None):
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    try:
+        params = resolve_params(req.weights, req.flag_thresholds, req.risk_thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    t0 = time.perf_counter()
+    with metrics.stage('rescore', len(store)):
+        result, cached = rescore(store, params)
+    response = rescore_summary(result)
+    response.update({'upload_id': store.uid, 'params': params, 'cached': cached, 'elapsed_ms': round((time.perf_counter() - t0) * 1000.0, 3)})
+    return response
 
 @app.get("/download_scored_csv")
-async def download_scored_csv():
-    recs = LAST_RESULTS.get('records', [])
-    if not recs:
+async def download_scored_csv(format: str = 'csv', columns: str = None, upload_id: str = None):
+    # streamed chunk by chunk from the store; `columns` is a comma-separated projection
+    store = _current_store(upload_id)
+    if store is None:
         raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
-    csv_bytes = records_to_csv_bytes(recs)
-    return StreamingResponse(io.BytesIO(csv_bytes), media_type="text/csv", headers={
-        'Content-Disposition': 'attachment; filename="scored_customers.csv"'
+    try:
+        body, media_type, ext = export_stream(store, format, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(body, media_type=media_type, headers={
+        'Content-Disposition': f'attachment; filename="scored_customers.{ext}"'
     })
+
+@app.get("/columnar")
+async def get_columnar(upload_id: str = None):
+    # same body as /upload?layout=columnar, served from the encoded cache
+    store = _current_store(upload_id)
+    if store is None:
+        raise HTTPException(status_code=404, detail="No scored data available. Upload first.")
+    return _columnar_response(store)
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(_current_store(), RESULTS, JOBS), media_type="text/plain; version=0.0.4")
@@ -0,0 +1 @@
+# benchmarks: run from backend/, e.g. `python -m benchmarks.parallel_scaling`
@@ -0,0 +1,318 @@
+# loadtest.py
+"""
+Concurrent API traffic against the app running under uvicorn.
+
+    cd backend
+    python -m benchmarks.loadtest --duration 30
+    python -m benchmarks.loadtest --mix summary=40,customer=40,download=4:0.5,upload=1:2 --rows 200000
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --no-seed    # an already running server
+
+Starts uvicorn on a free port (unless --url is given), uploads a seed
+portfolio so the read endpoints have data, then runs every client of --mix
+for --duration seconds. Each client loops: one request, then an exponential
+think time. --mix entries are scenario=clients[:mean think seconds]; the
+scenarios are listed in SCENARIOS. Uploads are synthetic CSVs with the
+data/dataset1.csv input columns (benchmarks/synthetic.py).
+
+The report gives, per endpoint, requests, errors, throughput and
+p50/p95/p99/max latency. It also shows event-loop blocking, taken from the
+server's own lag probe (delinquency_event_loop_lag_seconds in /metrics,
+scraped before and after the run; with several uvicorn workers that is
+whichever worker answers the scrape) and from the 'ping' clients' GET /
+latency. Client and server share the machine's CPUs; point --url at a
+server elsewhere for numbers that exclude the client's own load.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+import numpy as np
+import httpx
+
+from benchmarks.synthetic import portfolio_csv_bytes
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = 'ping=1:0.05,summary=20,customer=20,records=5,worklist=2:1,download=2:1,upload=1:2'
+_LAG = 'delinquency_event_loop_lag_seconds'
+_METRIC_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$')
+
+# -- scenarios: (label, method, url, request kwargs) for one request
+def _ping(ctx, rng):
+    return 'GET /', 'GET', '/', {}
+
+def _summary(ctx, rng):
+    return 'GET /summary', 'GET', '/summary', {}
+
+def _customer(ctx, rng):
+    return 'GET /customer/{id}', 'GET', f"/customer/C{rng.randrange(ctx['id_range']):08d}", {}
+
+def _records(ctx, rng):
+    risk = rng.choice(['High', 'Medium', 'Low'])
+    return 'GET /records', 'GET', '/records', {'params': {'risk_class': risk, 'limit': 50}}
+
+def _worklist(ctx, rng):
+    return 'GET /worklist', 'GET', '/worklist', {'params': {'n': 1000, 'order': rng.choice(['score', 'exposure'])}}
+
+def _aggregates(ctx, rng):
+    return 'GET /aggregates', 'GET', '/aggregates', {}
+
+def _download(ctx, rng):
+    return 'GET /download_scored_csv', 'GET', '/download_scored_csv', {}
+
+def _upload(ctx, rng):
+    files = {'file': ('portfolio.csv', ctx['upload_csv'], 'text/csv')}
+    return f"POST {ctx['upload_path']}", 'POST', ctx['upload_path'], {'files': files}
+
+SCENARIOS: Dict[str, Callable] = {
+    'ping': _ping,
+    'summary': _summary,
+    'customer': _customer,
+    'records': _records,
+    'worklist': _worklist,
+    'aggregates': _aggregates,
+    'download': _download,
+    'upload': _upload
+}
+
+def parse_mix(text: str, think: float) -> List[Tuple[str, int, float]]:
+    # "summary=20,upload=1:2" -> [(scenario, clients, mean think seconds)]
+    mix = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, spec = part.strip().partition('=')
+        clients, _, mean = spec.partition(':')
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}; choose from {sorted(SCENARIOS)}")
+        mix.append((name, int(clients or 1), float(mean) if mean else think))
+    return mix
+
+# -- server
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    cmd = [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(port),
+           '--workers', str(workers), '--log-level', 'warning']
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=dict(os.environ, **env))
+
+async def wait_ready(client: httpx.AsyncClient, proc: Optional[subprocess.Popen], timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+        try:
+            if (await client.get('/')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"server not ready after {timeout:.0f}s")
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+# -- event-loop lag from /metrics
+def parse_metrics(text: str) -> Dict[str, float]:
+    out = {}
+    for line in text.splitlines():
+        m = _METRIC_RE.match(line)
+        if m:
+            out[m.group(1) + (m.group(2) or '')] = float(m.group(3))
+    return out
+
+def _lag_buckets(snap: Dict[str, float]) -> List[Tuple[float, float]]:
+    # cumulative (upper bound, count) pairs of the lag histogram
+    out = []
+    for key, count in snap.items():
+        if key.startswith(_LAG + '_bucket'):
+            le = key.split('le="', 1)[1].split('"', 1)[0]
+            out.append((float('inf') if le == '+Inf' else float(le), count))
+    return sorted(out)
+
+def loop_report(before: Dict[str, float], after: Dict[str, float], seconds: float) -> Optional[Dict[str, Any]]:
+    """
+    Blocking seen by the server's lag probe between two scrapes: total
+    seconds blocked, its share of the run, probe count and bucket upper
+    bounds for the p99 and largest lag.
+    """
+    if _LAG + '_count' not in after:
+        return None
+    probes = after[_LAG + '_count'] - before.get(_LAG + '_count', 0.0)
+    blocked = after[_LAG + '_sum'] - before.get(_LAG + '_sum', 0.0)
+    prev = dict(_lag_buckets(before))
+    deltas = [(le, count - prev.get(le, 0.0)) for le, count in _lag_buckets(after)]
+    p99 = next((le for le, c in deltas if probes and c >= 0.99 * probes), None)
+    worst = next((le for le, c in deltas if c >= probes), None) if probes else None
+    over_100ms = probes - next((c for le, c in deltas if le >= 0.1), probes)
+    return {
+        'probes': int(probes),
+        'blocked_s': round(blocked, 3),
+        'blocked_pct': round(100.0 * blocked / seconds, 2) if seconds > 0 else 0.0,
+        'p99_lag_le_s': p99,
+        'max_lag_le_s': worst,
+        'lags_over_100ms': int(over_100ms)
+    }
+
+async def scrape(client: httpx.AsyncClient) -> Dict[str, float]:
+    try:
+        r = await client.get('/metrics')
+        return parse_metrics(r.text) if r.status_code == 200 else {}
+    except httpx.HTTPError:
+        return {}
+
+# -- clients
+async def run_client(client: httpx.AsyncClient, scenario: str, think: float, ctx: Dict[str, Any],
+                     seed: int, t_start: float, stop_at: float, samples: List[Tuple]):
+    rng = random.Random(seed)
+    make = SCENARIOS[scenario]
+    # spread the first requests out instead of firing every client at once
+    await asyncio.sleep(rng.uniform(0, min(think, 1.0)) if think > 0 else 0)
+    while time.perf_counter() < stop_at:
+        label, method, url, kwargs = make(ctx, rng)
+        t0 = time.perf_counter()
+        try:
+            r = await client.request(method, url, **kwargs)
+            status, size = r.status_code, len(r.content)
+        except httpx.HTTPError as e:
+            status, size = type(e).__name__, 0
+        samples.append((label, t0 - t_start, time.perf_counter() - t0, status, size))
+        if think > 0:
+            await asyncio.sleep(rng.expovariate(1.0 / think))
+
+def endpoint_report(samples: List[Tuple], seconds: float) -> List[Dict[str, Any]]:
+    by_label: Dict[str, List[Tuple]] = {}
+    for s in samples:
+        by_label.setdefault(s[0], []).append(s)
+    out = []
+    for label, rows in sorted(by_label.items()):
+        lat = np.array([r[2] for r in rows]) * 1000.0
+        errors = sum(1 for r in rows if not isinstance(r[3], int) or r[3] >= 400)
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99]).tolist()
+        out.append({
+            'endpoint': label,
+            'requests': len(rows),
+            'errors': errors,
+            'req_per_sec': round(len(rows) / seconds, 2),
+            'mb_per_sec': round(sum(r[4] for r in rows) / seconds / 1e6, 2),
+            'p50_ms': round(p50, 1),
+            'p95_ms': round(p95, 1),
+            'p99_ms': round(p99, 1),
+            'max_ms': round(float(lat.max()), 1)
+        })
+    return out
+
+async def run_load(url: str, mix: List[Tuple[str, int, float]], duration: float, rows: int, upload_rows: int,
+                   upload_path: str, seed_upload: bool, timeout: float,
+                   proc: Optional[subprocess.Popen] = None) -> Dict[str, Any]:
+    clients = sum(n for _, n, _ in mix)
+    limits = httpx.Limits(max_connections=clients + 4, max_keepalive_connections=clients + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await wait_ready(client, proc)
+        if seed_upload:
+            t0 = time.perf_counter()
+            r = await client.post('/upload', params={'mode': 'stream'},
+                                  files={'file': ('seed.csv', portfolio_csv_bytes(rows, seed=1), 'text/csv')})
+            r.raise_for_status()
+            print(f"seed upload: {rows} rows in {time.perf_counter() - t0:.2f}s")
+        uploads = any(s == 'upload' for s, _, _ in mix)
+        # uploads replace the latest result set: look up IDs present in both files
+        ctx = {'id_range': max(1, min(rows, upload_rows) if uploads else rows), 'upload_path': upload_path,
+               'upload_csv': portfolio_csv_bytes(upload_rows, seed=2) if uploads else b''}
+
+        before = await scrape(client)
+        samples: List[Tuple] = []
+        t_start = time.perf_counter()
+        stop_at = t_start + duration
+        tasks = []
+        for k, (scenario, n, think) in enumerate(mix):
+            for i in range(n):
+                tasks.append(run_client(client, scenario, think, ctx, 1000 * k + i, t_start, stop_at, samples))
+        await asyncio.gather(*tasks)
+        # slow requests started near the end stretch the run past `duration`
+        elapsed = time.perf_counter() - t_start
+        after = await scrape(client)
+
+    return {
+        'url': url,
+        'duration_s': round(elapsed, 2),
+        'clients': clients,
+        'mix': [{'scenario': s, 'clients': n, 'think_s': t} for s, n, t in mix],
+        'rows': rows,
+        'upload_rows': upload_rows,
+        'endpoints': endpoint_report(samples, elapsed),
+        'event_loop': loop_report(before, after, elapsed)
+    }
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n{result['clients']} clients for {result['duration_s']}s against {result['url']}")
+    print(f"{'endpoint':<28} {'reqs':>7} {'errs':>5} {'req/s':>8} {'MB/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for e in result['endpoints']:
+        print(f"{e['endpoint']:<28} {e['requests']:>7} {e['errors']:>5} {e['req_per_sec']:>8.1f} {e['mb_per_sec']:>7.2f} "
+              f"{e['p50_ms']:>9.1f} {e['p95_ms']:>9.1f} {e['p99_ms']:>9.1f} {e['max_ms']:>9.1f}")
+    loop = result['event_loop']
+    if loop is None:
+        print("\nevent loop: no lag metrics (METRICS_ENABLED=0 or LOOP_MONITOR_INTERVAL=0 on the server)")
+    else:
+        print(f"\nevent loop: blocked {loop['blocked_s']}s ({loop['blocked_pct']}% of the run) over {loop['probes']} probes; "
+              f"p99 lag <= {loop['p99_lag_le_s']}s, max <= {loop['max_lag_le_s']}s, {loop['lags_over_100ms']} lags over 100ms")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--url', help="target a running server instead of starting uvicorn")
+    ap.add_argument('--workers', type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument('--mix', default=DEFAULT_MIX, help="scenario=clients[:think seconds],...")
+    ap.add_argument('--think', type=float, default=0.1, help="default mean think time between requests")
+    ap.add_argument('--duration', type=float, default=20.0)
+    ap.add_argument('--rows', type=int, default=100000, help="customers in the seed upload")
+    ap.add_argument('--upload-rows', type=int, default=50000, help="customers per 'upload' request")
+    ap.add_argument('--upload-path', default='/upload', help="e.g. /upload?mode=stream or /jobs")
+    ap.add_argument('--no-seed', action='store_true', help="skip the seed upload (server already has data)")
+    ap.add_argument('--timeout', type=float, default=300.0, help="per-request timeout, seconds")
+    ap.add_argument('--env', action='append', default=[], help="NAME=VALUE for the started server; repeatable")
+    ap.add_argument('--json', help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    mix = parse_mix(args.mix, args.think)
+    proc, url, snapshots = None, args.url, None
+    if url is None:
+        port = _free_port()
+        snapshots = tempfile.mkdtemp(prefix='loadtest-snapshots-')
+        env = {'SNAPSHOT_DIR': snapshots}
+        env.update(e.split('=', 1) for e in args.env)
+        proc = start_server(port, args.workers, env)
+        url = f'http://127.0.0.1:{port}'
+    try:
+        result = asyncio.run(run_load(url, mix, args.duration, args.rows, args.upload_rows, args.upload_path,
+                                      not args.no_seed, args.timeout, proc))
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        if snapshots is not None:
+            shutil.rmtree(snapshots, ignore_errors=True)
+
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    return 1 if any(e['errors'] for e in result['endpoints']) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
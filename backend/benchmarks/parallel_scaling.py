@@ -0,0 +1,63 @@
+# parallel_scaling.py
+"""
+Throughput of process-pool scoring vs. number of workers.
+
+    cd backend
+    python -m benchmarks.parallel_scaling --rows 1000000 --workers 1,2,4,8,16,32
+"""
+import argparse
+import asyncio
+import time
+
+import parallel
+from scoring import score_batch
+from schema import resolve_schema, ColumnDecoder
+from store import ResultStore, shard_from_decoded
+from utils import parse_csv_rows, parse_csv_header
+from benchmarks.synthetic import cached_portfolio
+
+def _score_serial(content: bytes) -> int:
+    header, rows = parse_csv_rows(content)
+    schema = resolve_schema(header)
+    decoded = ColumnDecoder(schema).decode(rows)
+    store = ResultStore(schema.output_header)
+    store.append_shard(shard_from_decoded(decoded, score_batch(decoded['columns'])))
+    return len(store)
+
+def _score_parallel(content: bytes, workers: int, shard_bytes: int) -> int:
+    shards = asyncio.run(parallel.score_csv_parallel(content, workers, shard_bytes))
+    store = ResultStore(resolve_schema(parse_csv_header(content)).output_header)
+    for shard in shards:
+        store.append_shard(shard)
+    return len(store)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--rows', type=int, default=1000000)
+    ap.add_argument('--workers', default='1,2,4,8')
+    ap.add_argument('--shard-bytes', type=int, default=parallel.SHARD_BYTES)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    with open(cached_portfolio(args.rows), 'rb') as f:
+        content = f.read()
+    print(f"{args.rows} rows, {len(content) / 1e6:.1f} MB, shard {args.shard_bytes / 1e6:.1f} MB")
+    print(f"{'workers':>8} {'best s':>8} {'rows/s':>12} {'speedup':>8}")
+
+    baseline = None
+    for w in [int(x) for x in args.workers.split(',')]:
+        if w > 1:
+            # warm the pool so worker start-up is not timed
+            parallel.get_pool(w)
+            _score_parallel(content[:args.shard_bytes], w, args.shard_bytes)
+        best = float('inf')
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            n = _score_serial(content) if w <= 1 else _score_parallel(content, w, args.shard_bytes)
+            best = min(best, time.perf_counter() - t0)
+        baseline = baseline or best
+        print(f"{w:>8} {best:>8.3f} {n / best:>12,.0f} {baseline / best:>7.2f}x")
+    parallel.shutdown_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# pipeline.py
+"""
+Stage-by-stage and end-to-end benchmark of the scoring pipeline.
+
+    cd backend
+    python -m benchmarks.pipeline --sizes 10k,100k              # run, compare to baseline
+    python -m benchmarks.pipeline --sizes 10k,100k --save-baseline
+    python -m benchmarks.pipeline --sizes 1m,10m --row-limit 200000 --endpoint-max-rows 1000000
+
+Every stage reports rows/s (requests/s for the small API reads) and the peak
+RSS growth seen while it ran. Per-row stages (sanitize_row, get_flags, ...)
+run on at most --row-limit rows, so 1M/10M portfolios stay practical. With a stored
+baseline (benchmarks/baseline.json by default), any stage slower than the
+baseline by more than --tolerance makes the run exit non-zero.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from scoring import sanitize_row, compute_feature_score, get_flags, get_recommended_actions, score_row, score_batch
+from schema import resolve_schema, ColumnDecoder
+from store import ResultStore, shard_from_decoded
+from utils import parse_csv_bytes, parse_csv_rows, records_to_csv_bytes
+from benchmarks.synthetic import cached_portfolio
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+_SIZES = {'k': 1000, 'm': 1000000}
+_READ_REPEAT = 50
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text[-1] in _SIZES:
+        return int(float(text[:-1]) * _SIZES[text[-1]])
+    return int(text)
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is KiB on Linux, bytes on macOS; only a fallback
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+class PeakRss:
+    """
+    Samples RSS on a background thread while a stage runs; .peak_delta is the
+    highest RSS seen minus RSS at entry.
+    """
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak_delta = 0
+
+    def __enter__(self):
+        self._start = _rss_bytes()
+        self._peak = self._start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, _rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, _rss_bytes())
+        self.peak_delta = self._peak - self._start
+
+def timed(name: str, rows: int, fn: Callable[[], Any], results: List[Dict[str, Any]]) -> Any:
+    gc.collect()
+    with PeakRss() as mem:
+        t0 = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - t0
+    results.append({
+        'stage': name,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed > 0 else float('inf'),
+        'peak_rss_mb': mem.peak_delta / 1e6
+    })
+    return out
+
+def _per_row(fn, items):
+    def run():
+        for x in items:
+            fn(x)
+    return run
+
+def bench_size(rows: int, row_limit: int, endpoint_max_rows: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    with open(cached_portfolio(rows), 'rb') as f:
+        content = f.read()
+
+    # legacy per-row stages, on a prefix of at most row_limit rows
+    n_row = min(rows, row_limit)
+    records = timed('parse_csv_bytes', rows, lambda: parse_csv_bytes(content), results)
+    sample = records[:n_row]
+    del records
+    features = [sanitize_row(r) for r in sample]
+    timed('sanitize_row', n_row, _per_row(sanitize_row, sample), results)
+    timed('compute_feature_score', n_row, _per_row(compute_feature_score, features), results)
+    flags = [get_flags(f) for f in features]
+    timed('get_flags', n_row, _per_row(get_flags, features), results)
+    classes = [score_row(r)['risk_class'] for r in sample]
+    triples = list(zip(classes, features, flags))
+    timed('get_recommended_actions', n_row, lambda: [get_recommended_actions(*t) for t in triples], results)
+    timed('score_row', n_row, _per_row(score_row, sample), results)
+    del sample, features, flags, triples
+
+    # columnar pipeline used by /upload
+    header, csv_rows = timed('parse_csv_rows', rows, lambda: parse_csv_rows(content), results)
+    schema = resolve_schema(header)
+    decoded = timed('decode_columns', rows, lambda: ColumnDecoder(schema).decode(csv_rows), results)
+    del csv_rows
+    batch = timed('score_batch', rows, lambda: score_batch(decoded['columns']), results)
+    store = ResultStore(schema.output_header)
+    timed('store_append', rows, lambda: store.append_shard(shard_from_decoded(decoded, batch)), results)
+    del decoded, batch
+
+    scored = timed('store_iter_rows', rows, lambda: list(store.iter_rows()), results)
+    timed('records_to_csv_bytes', rows, lambda: records_to_csv_bytes(scored), results)
+    response = dict(store.summary(), records=scored)
+    timed('upload_json_encode', rows, lambda: JSONResponse(content=response).body, results)
+    del scored, response, store
+
+    if rows <= endpoint_max_rows:
+        results.extend(bench_endpoints(content, rows))
+    return results
+
+def bench_endpoints(content: bytes, rows: int) -> List[Dict[str, Any]]:
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    results: List[Dict[str, Any]] = []
+    client = TestClient(app_module.app)
+
+    def call(method, url, expect=200, **kw):
+        def run():
+            r = getattr(client, method)(url, **kw)
+            if r.status_code != expect:
+                raise RuntimeError(f"{method.upper()} {url} -> {r.status_code}: {r.text[:200]}")
+            return r
+        return run
+
+    files = lambda: {'file': ('portfolio.csv', content, 'text/csv')}
+    timed('POST /upload', rows, lambda: call('post', '/upload', files=files())(), results)
+    timed('POST /upload?mode=stream', rows, lambda: call('post', '/upload?mode=stream', files=files())(), results)
+    # cheap reads are repeated so their rate (requests/s here) is not noise
+    for name, fn in (('GET /summary', call('get', '/summary')),
+                     ('GET /customer/{id}', call('get', '/customer/C00000000')),
+                     ('GET /records', call('get', '/records?limit=50&risk_class=High'))):
+        timed(name, _READ_REPEAT, lambda: [fn() for _ in range(_READ_REPEAT)], results)
+    timed('POST /rescore', rows, call('post', '/rescore', json={'weights': {'pay': 0.35}}), results)
+    timed('GET /download_scored_csv', rows, call('get', '/download_scored_csv'), results)
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    for r in results:
+        ref = baseline.get(f"{r['size']}|{r['stage']}")
+        if not ref:
+            continue
+        r['baseline_rows_per_sec'] = ref['rows_per_sec']
+        if r['rows_per_sec'] < ref['rows_per_sec'] * (1.0 - tolerance):
+            regressions.append(f"{r['size']} {r['stage']}: {r['rows_per_sec']:,.0f} rows/s "
+                               f"vs baseline {ref['rows_per_sec']:,.0f}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sizes', default='10k,100k', help="portfolio sizes, e.g. 10k,100k,1m,10m")
+    ap.add_argument('--row-limit', type=int, default=100000, help="max rows for per-row stages")
+    ap.add_argument('--endpoint-max-rows', type=int, default=1000000, help="skip API stages above this size")
+    ap.add_argument('--baseline', default=DEFAULT_BASELINE)
+    ap.add_argument('--save-baseline', action='store_true', help="store this run as the new baseline")
+    ap.add_argument('--tolerance', type=float, default=0.20, help="allowed rows/s drop vs baseline")
+    ap.add_argument('--json', help="also write results to this file")
+    args = ap.parse_args(argv)
+
+    all_results = []
+    for size_text in args.sizes.split(','):
+        rows = parse_size(size_text)
+        print(f"\n== {size_text} ({rows} rows) ==")
+        print(f"{'stage':<28} {'rows':>10} {'seconds':>9} {'rows/s':>13} {'peak MB':>9}")
+        for r in bench_size(rows, args.row_limit, args.endpoint_max_rows):
+            r['size'] = size_text
+            all_results.append(r)
+            print(f"{r['stage']:<28} {r['rows']:>10} {r['seconds']:>9.3f} {r['rows_per_sec']:>13,.0f} {r['peak_rss_mb']:>9.1f}")
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"\nprocess peak RSS: {(rss if sys.platform == 'darwin' else rss * 1024) / 1e6:.1f} MB")
+
+    status = 0
+    if args.save_baseline:
+        baseline = {f"{r['size']}|{r['stage']}": {'rows_per_sec': r['rows_per_sec'], 'peak_rss_mb': r['peak_rss_mb']}
+                    for r in all_results}
+        baseline['_meta'] = {'python': platform.python_version(), 'machine': platform.machine(),
+                             'cpus': os.cpu_count(), 'recorded': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(all_results, json.load(f), args.tolerance)
+        compared = sum('baseline_rows_per_sec' in r for r in all_results)
+        if not compared:
+            # different sizes or stage names: nothing was checked, which is not a pass
+            print(f"\nno comparable entries in {args.baseline} (sizes {args.sizes}); "
+                  "run with --save-baseline to record them")
+            status = 1
+        elif regressions:
+            print(f"\nREGRESSIONS (> {args.tolerance:.0%} slower than baseline):")
+            for line in regressions:
+                print("  " + line)
+            status = 1
+        else:
+            print(f"\nno regressions vs {args.baseline} ({compared} of {len(all_results)} stages compared)")
+    else:
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline to record one")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# synthetic.py
+import csv
+import io
+import os
+import random
+from typing import Optional
+
+from utils import REQUIRED_COLUMNS
+
+def _row(rng: random.Random, i: int) -> list:
+    # loosely follows the value ranges seen in data/dataset1.csv
+    risky = rng.random() < 0.15
+    util = rng.uniform(55, 100) if risky else rng.uniform(0, 70)
+    pay = rng.uniform(10, 55) if risky else rng.uniform(40, 100)
+    minpaid = rng.uniform(20, 90) if risky else rng.uniform(0, 40)
+    merchant = rng.uniform(0.1, 0.7) if risky else rng.uniform(0.4, 1.0)
+    cash = rng.uniform(10, 60) if risky else rng.uniform(0, 20)
+    spend = rng.uniform(-40, 40) if risky else rng.uniform(-15, 15)
+    dpd = rng.choice([1, 2, 3]) if risky and rng.random() < 0.6 else 0
+    return [
+        f"C{i:08d}",
+        rng.randrange(20000, 500000, 100),
+        round(util, 1),
+        round(pay, 1),
+        round(minpaid, 1),
+        round(merchant, 2),
+        round(cash, 1),
+        round(spend, 1),
+        dpd
+    ]
+
+def portfolio_csv_bytes(rows: int, seed: int = 7) -> bytes:
+    """
+    Build an in-memory portfolio CSV with the dataset1.csv input columns.
+    """
+    rng = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(REQUIRED_COLUMNS)
+    for i in range(rows):
+        writer.writerow(_row(rng, i))
+    return out.getvalue().encode('utf-8')
+
+def write_portfolio_csv(path: str, rows: int, seed: int = 7, block_rows: int = 100000) -> str:
+    """
+    Write a portfolio CSV to `path` in blocks, so multi-million-row files never
+    sit in memory. Reuses an existing file of the same name.
+    """
+    if os.path.exists(path):
+        return path
+    rng = random.Random(seed)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(REQUIRED_COLUMNS)
+        for start in range(0, rows, block_rows):
+            writer.writerows(_row(rng, i) for i in range(start, min(rows, start + block_rows)))
+    os.replace(tmp, path)
+    return path
+
+def cached_portfolio(rows: int, cache_dir: Optional[str] = None, seed: int = 7) -> str:
+    cache_dir = cache_dir or os.path.join(os.path.dirname(__file__), '.data')
+    os.makedirs(cache_dir, exist_ok=True)
+    return write_portfolio_csv(os.path.join(cache_dir, f'portfolio_{rows}_{seed}.csv'), rows, seed)
@@ -0,0 +1,124 @@
+# columnar.py
+"""
+Column-oriented JSON for a whole result set: one array per field, risk class
+as codes into RISK_CLASSES, contribs as one numeric array per contrib key,
+top3_contribs as indices into CONTRIB_KEYS and flags as bitmasks over FLAG_BITS.
+
+Encoded with orjson (numpy arrays serialize without a Python round trip;
+NaN becomes null) when it is installed, else with the stdlib encoder. Result
+sets never change once published, so encoded payloads are cached per upload
+and served again as-is.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+
+import numpy as np
+from scoring import RISK_CLASSES, CONTRIB_KEYS, FLAG_BITS
+from store import ResultStore, TYPED_INPUT_COLUMNS, ID_COLUMN
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# total size of encoded payloads kept (LRU)
+COLUMNAR_CACHE_BYTES = int(os.environ.get('COLUMNAR_CACHE_BYTES', str(256 << 20)))
+
+def _array(values: np.ndarray) -> np.ndarray:
+    # orjson wants plain, C-contiguous ndarrays (no memmap, no strided views)
+    return np.ascontiguousarray(np.asarray(values))
+
+def columnar_payload(store: ResultStore) -> Dict[str, Any]:
+    columns: Dict[str, Any] = {}
+    for h in store.header:
+        if h == ID_COLUMN:
+            columns[h] = store.ids[:]
+        elif h in TYPED_INPUT_COLUMNS:
+            columns[h] = _array(store.column(h))
+        elif h in store.extras:
+            columns[h] = store.extras[h][:]
+    contribs = store.column('contribs')
+    columns.update({
+        'raw_score': _array(store.column('raw_score')),
+        'score_norm': _array(store.column('score_norm')),
+        'risk_code': _array(store.column('risk_code')),
+        'contribs': {k: _array(contribs[:, j]) for j, k in enumerate(CONTRIB_KEYS)},
+        'top3_contribs': _array(store.column('top3')),
+        'flag_bits': _array(store.column('flag_bits'))
+    })
+    return dict(store.summary(),
+                upload_id=store.uid,
+                schema=store.parse_stats,
+                risk_classes=RISK_CLASSES,
+                contrib_keys=CONTRIB_KEYS,
+                flag_bits=FLAG_BITS,
+                columns=columns)
+
+def _plain(obj):
+    # stdlib fallback: lists, with NaN / inf as null like orjson
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind == 'f':
+            out = obj.astype(object)
+            out[~np.isfinite(obj)] = None
+            return out.tolist()
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    return obj
+
+def encode_json(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(_plain(obj), separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+class EncodedCache:
+    """
+    LRU of encoded payloads keyed by (store uid, store version), bounded by
+    their total size in bytes.
+    """
+    def __init__(self, max_bytes: int = COLUMNAR_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, old = self._items.popitem(last=False)
+                self._bytes -= len(old)
+
+COLUMNAR_CACHE = EncodedCache()
+
+def columnar_bytes(store: ResultStore, cache: EncodedCache = COLUMNAR_CACHE) -> Tuple[bytes, bool]:
+    """
+    Encoded columnar payload of `store`; returns (body, served_from_cache).
+    """
+    key = (store.uid, store.version)
+    body = cache.get(key)
+    if body is not None:
+        return body, True
+    body = encode_json(columnar_payload(store))
+    cache.put(key, body)
+    return body, False
@@ -0,0 +1,196 @@
+# cube.py
+"""
+Exposure cube of a result set: customer counts, credit limit sums and
+score_norm sums over risk class x credit-limit band x utilisation band, and
+the same again per high-severity flag.
+
+Cells are built per scored chunk and combined by adding them, like
+aggregates.py: shards merge on append, and incremental uploads add re-scored
+rows and subtract replaced ones without visiting unchanged customers. A
+query only slices and sums the small precomputed arrays.
+
+Flags are not exclusive, so the flag dimension counts a customer once under
+every high flag that fired ('none' when none did); summing across several
+flags can count a customer more than once. Queries that neither group nor
+filter by flag use the flag-free cells and count everyone exactly once.
+"""
+import os
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+from scoring import RISK_CLASSES, FLAG_BITS, FLAG_REASONS, FLAG_THRESHOLDS
+
+def _edges(name: str, default: str) -> tuple:
+    # comma-separated band boundaries from the environment, checked at import
+    value = os.environ.get(name, default)
+    try:
+        edges = tuple(float(x) for x in value.split(',') if x.strip())
+    except ValueError:
+        raise ValueError(f"{name} must be comma-separated numbers, got {value!r}") from None
+    if not edges:
+        raise ValueError(f"{name} must list at least one band edge")
+    if any(not np.isfinite(e) for e in edges) or any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError(f"{name} must be finite and strictly increasing, got {value!r}")
+    return edges
+
+# credit limit band boundaries; limits that are not numbers go to 'unknown'
+LIMIT_BAND_EDGES = _edges('CUBE_LIMIT_BANDS', '50000,100000,200000,300000,500000')
+# larger limits are data errors (e.g. 1e308) and go to 'unknown' too: summed,
+# they would overflow to inf, and inf cells cannot have rows subtracted again
+MAX_CREDIT_LIMIT = 1e12
+# utilisation % band boundaries, the upper two at the util flag thresholds
+UTIL_BAND_EDGES = _edges('CUBE_UTIL_BANDS', f"30,{FLAG_THRESHOLDS['util_med_pct']},{FLAG_THRESHOLDS['util_high_pct']}")
+
+HIGH_FLAGS = [f for f in FLAG_BITS if FLAG_REASONS[f][0] == 'high']
+FLAG_VALUES = HIGH_FLAGS + ['none']
+_HIGH_MASK = np.uint32(sum(1 << FLAG_BITS.index(f) for f in HIGH_FLAGS))
+
+CUBE_DIMS = ('risk_class', 'limit_band', 'util_band', 'flag')
+CUBE_STATS = ('count', 'limit_sum', 'score_sum')
+
+def _short(v: float) -> str:
+    # 50000 -> '50k', 1500000 -> '1.5M'
+    for div, unit in ((1e6, 'M'), (1e3, 'k')):
+        if abs(v) >= div:
+            return f"{v / div:g}{unit}"
+    return f"{v:g}"
+
+def band_labels(edges: Sequence[float], fmt=_short, lo: Optional[str] = None, hi: Optional[str] = None) -> List[str]:
+    # len(edges) + 1 labels: below the first edge, between edges, from the last one up
+    first = f"{lo}-{fmt(edges[0])}" if lo is not None else f"<{fmt(edges[0])}"
+    last = f"{fmt(edges[-1])}-{hi}" if hi is not None else f">={fmt(edges[-1])}"
+    return [first] + [f"{fmt(a)}-{fmt(b)}" for a, b in zip(edges, edges[1:])] + [last]
+
+class ExposureCube:
+    def __init__(self, limit_edges: Sequence[float] = LIMIT_BAND_EDGES, util_edges: Sequence[float] = UTIL_BAND_EDGES):
+        self.limit_edges = tuple(float(e) for e in limit_edges)
+        self.util_edges = tuple(float(e) for e in util_edges)
+        self.labels = {
+            'risk_class': list(RISK_CLASSES),
+            'limit_band': band_labels(self.limit_edges) + ['unknown'],
+            'util_band': band_labels(self.util_edges, lo='0', hi='100'),
+            'flag': list(FLAG_VALUES)
+        }
+        shape = tuple(len(self.labels[d]) for d in CUBE_DIMS)
+        # cells[stat]: risk x limit x util; flag_cells[stat]: the same per flag
+        self.cells = {s: np.zeros(shape[:3], dtype=np.int64 if s == 'count' else np.float64) for s in CUBE_STATS}
+        self.flag_cells = {s: np.zeros(shape, dtype=np.int64 if s == 'count' else np.float64) for s in CUBE_STATS}
+
+    @classmethod
+    def from_batch(cls, risk_code: np.ndarray, score_norm: np.ndarray, features: Dict[str, np.ndarray],
+                   flag_bits: np.ndarray, **edges) -> 'ExposureCube':
+        """
+        Cells of one scored chunk: risk codes, score_norm, sanitize_batch
+        features (the values the flags were raised on) and flag bitmasks of
+        the same rows.
+        """
+        cube = cls(**edges)
+        if not len(risk_code):
+            return cube
+        shape = cube.cells['count'].shape
+        limit = np.asarray(features['credit_limit'], dtype=np.float64)
+        known = np.abs(limit) < MAX_CREDIT_LIMIT
+        limit_band = np.where(known, np.searchsorted(cube.limit_edges, np.where(known, limit, 0.0), side='right'),
+                              shape[1] - 1)
+        util_band = np.searchsorted(cube.util_edges, np.asarray(features['util_pct'], dtype=np.float64), side='right')
+        flat = np.ravel_multi_index((np.asarray(risk_code, dtype=np.int64), limit_band, util_band), shape)
+        size = int(np.prod(shape))
+        weights = {'limit_sum': np.where(known, limit, 0.0), 'score_sum': np.asarray(score_norm, dtype=np.float64)}
+
+        def sums(rows):
+            idx = flat if rows is None else flat[rows]
+            out = {'count': np.bincount(idx, minlength=size)}
+            for s, w in weights.items():
+                out[s] = np.bincount(idx, weights=w if rows is None else w[rows], minlength=size)
+            return {s: v.reshape(shape) for s, v in out.items()}
+
+        for s, v in sums(None).items():
+            cube.cells[s] += v.astype(cube.cells[s].dtype)
+        bits = np.asarray(flag_bits, dtype=np.uint32)
+        for k, flag in enumerate(FLAG_VALUES):
+            fired = (bits & _HIGH_MASK) == 0 if flag == 'none' else (bits & np.uint32(1 << FLAG_BITS.index(flag))) != 0
+            if fired.any():
+                for s, v in sums(fired).items():
+                    cube.flag_cells[s][..., k] += v.astype(cube.flag_cells[s].dtype)
+        return cube
+
+    def merge(self, other: 'ExposureCube', sign: int = 1) -> 'ExposureCube':
+        # in place; sign=-1 removes rows previously merged in
+        if (other.limit_edges, other.util_edges) != (self.limit_edges, self.util_edges):
+            raise ValueError("Cannot merge cubes with different band edges")
+        for s in CUBE_STATS:
+            self.cells[s] += sign * other.cells[s]
+            self.flag_cells[s] += sign * other.flag_cells[s]
+        return self
+
+    def copy(self) -> 'ExposureCube':
+        return ExposureCube(self.limit_edges, self.util_edges).merge(self)
+
+    # -- persistence (snapshot.py)
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        out = {'limit_edges': np.array(self.limit_edges), 'util_edges': np.array(self.util_edges)}
+        for s in CUBE_STATS:
+            out[f'cells.{s}'] = self.cells[s]
+            out[f'flag_cells.{s}'] = self.flag_cells[s]
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'ExposureCube':
+        cube = cls(arrays['limit_edges'].tolist(), arrays['util_edges'].tolist())
+        for s in CUBE_STATS:
+            cube.cells[s] = np.array(arrays[f'cells.{s}'], dtype=cube.cells[s].dtype)
+            cube.flag_cells[s] = np.array(arrays[f'flag_cells.{s}'], dtype=cube.flag_cells[s].dtype)
+        return cube
+
+    # -- reading
+    def query(self, by: Sequence[str] = ('risk_class',), filters: Optional[Dict[str, Sequence[str]]] = None) -> Dict[str, Any]:
+        """
+        Roll up every dimension not in `by` and slice by `filters` (dimension
+        -> labels to keep). Returns the non-empty cells of the remaining
+        dimensions with count, credit limit sum and mean score_norm, and
+        their total.
+        """
+        filters = {d: list(dict.fromkeys(v)) for d, v in (filters or {}).items() if v}
+        for d in list(by) + list(filters):
+            if d not in CUBE_DIMS:
+                raise ValueError(f"Unknown cube dimension {d!r}; choose from {list(CUBE_DIMS)}")
+        by = [d for d in CUBE_DIMS if d in by]
+        per_flag = 'flag' in by or 'flag' in filters
+        dims = CUBE_DIMS if per_flag else CUBE_DIMS[:3]
+        arrays = self.flag_cells if per_flag else self.cells
+
+        index = []
+        for d in dims:
+            labels = self.labels[d]
+            unknown = [v for v in filters.get(d, []) if v not in labels]
+            if unknown:
+                raise ValueError(f"Unknown {d} value(s) {unknown}; choose from {labels}")
+            index.append([labels.index(v) for v in filters[d]] if d in filters else list(range(len(labels))))
+        rolled = tuple(i for i, d in enumerate(dims) if d not in by)
+        # one open-mesh index shared by the three stats; none without filters
+        sel = np.ix_(*index) if filters else ()
+        sub = {s: arrays[s][sel].sum(axis=rolled) for s in CUBE_STATS}
+
+        def cell(count, limit_sum, score_sum) -> Dict[str, Any]:
+            return {'count': int(count), 'credit_limit_sum': round(float(limit_sum), 2),
+                    'score_norm_mean': round(float(score_sum) / count, 6) if count else None}
+
+        kept = [[self.labels[d][i] for i in index[dims.index(d)]] for d in by]
+        filled = np.flatnonzero(sub['count'])
+        stats = zip(*(np.ravel(sub[s])[filled].tolist() for s in CUBE_STATS))
+        if by:
+            pos = np.unravel_index(filled, sub['count'].shape)
+            keys = zip(*([labels[p] for p in ps.tolist()] for labels, ps in zip(kept, pos)))
+        else:
+            keys = [()] * len(filled)
+        cells = [dict(zip(by, key), **cell(*vals)) for key, vals in zip(keys, stats)]
+        return {
+            'by': by,
+            'filters': filters,
+            'per_flag': per_flag,
+            'cells': cells,
+            'total': cell(*(sub[s].sum() for s in CUBE_STATS))
+        }
+
+    def dimensions(self) -> Dict[str, List[str]]:
+        return {d: list(self.labels[d]) for d in CUBE_DIMS}
@@ -0,0 +1,124 @@
+# delta.py
+from typing import Dict, Any, List, Optional
+import numpy as np
+import metrics
+from aggregates import Aggregates
+from cube import ExposureCube
+from scoring import score_batch, sanitize_batch, input_hash_batch, RISK_CLASSES
+from store import ResultStore, shard_from_decoded, SCORE_COLUMNS
+
+class DeltaUpload:
+    """
+    Builds the next version of a result set from a new portfolio file, chunk
+    by chunk, re-scoring only customers whose scoring inputs changed.
+
+    A row is unchanged when its Customer ID exists in `base` and its
+    scoring.input_hash_batch hash matches the stored row's; its scores are
+    copied instead of recomputed. Customers of `base` missing from the file
+    are removed, or carried over as they are with keep_missing (for partial
+    delta files). The new store is a fresh, independent result set.
+
+    The new store's aggregates and exposure cube start from the base's:
+    re-scored and extra rows are added, and base rows not carried over
+    unchanged are subtracted once at the end, so unchanged customers cost
+    nothing there either.
+    """
+    def __init__(self, base: Optional[ResultStore], header: List[str], keep_missing: bool = False):
+        self.base = base if base is not None and len(base) else None
+        self.keep_missing = keep_missing
+        self.store = ResultStore(header)
+        self.counts = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        self._base_hashes = self.base.input_hashes() if self.base is not None else None
+        self._matched = np.zeros(len(self.base) if self.base is not None else 0, dtype=bool)
+        # base rows copied once as they are: their aggregates carry over
+        self._carried = np.zeros(len(self._matched), dtype=bool)
+        self.aggregates = self.base.get_aggregates().copy() if self.base is not None else Aggregates()
+        self.cube = self.base.get_cube().copy() if self.base is not None else ExposureCube()
+
+    def _summarize(self, risk_code: np.ndarray, score_norm: np.ndarray, features: Dict[str, np.ndarray],
+                   flag_bits: np.ndarray, sign: int = 1):
+        # add (or with sign=-1 remove) rows in the running aggregates and cube
+        self.aggregates.merge(Aggregates.from_batch(risk_code, score_norm, features), sign=sign)
+        self.cube.merge(ExposureCube.from_batch(risk_code, score_norm, features, flag_bits), sign=sign)
+
+    def add(self, decoded: Dict[str, Any]):
+        """
+        Diff and append one schema.ColumnDecoder chunk.
+        """
+        n = len(decoded['ids'])
+        if n == 0:
+            return
+        columns = decoded['columns']
+        with metrics.stage('diff', n):
+            rows = np.full(n, -1, dtype=np.int64)
+            same = np.zeros(n, dtype=bool)
+            if self.base is not None:
+                rows = self.base.find_many(decoded['ids'])
+            known = rows >= 0
+            if known.any():
+                same[known] = self._base_hashes[rows[known]] == input_hash_batch(columns)[known]
+                self._matched[rows[known]] = True
+            need = ~same
+
+        batch = {}
+        with metrics.stage('score', int(need.sum())):
+            scored = score_batch({k: v[need] for k, v in columns.items()}) if need.any() else None
+            # score columns are copied from the base store for unchanged customers
+            for name in SCORE_COLUMNS:
+                ref = scored[name] if scored is not None else self.base.cols[name]
+                out = np.empty((n,) + ref.shape[1:], dtype=ref.dtype)
+                if same.any():
+                    out[same] = self.base.cols[name][rows[same]]
+                if scored is not None:
+                    out[need] = scored[name]
+                batch[name] = out
+
+        self.counts['added'] += int((~known).sum())
+        self.counts['changed'] += int((known & need).sum())
+        self.counts['unchanged'] += int(same.sum())
+        with metrics.stage('aggregate', n):
+            if scored is not None:
+                self._summarize(scored['risk_code'], scored['score_norm'], scored['features'], scored['flag_bits'])
+            if same.any():
+                # the first unchanged copy of a base row carries it over;
+                # repeats of the same customer are extra rows
+                pos = np.flatnonzero(same)
+                _, first = np.unique(rows[pos], return_index=True)
+                carry = np.zeros(len(pos), dtype=bool)
+                carry[first] = ~self._carried[rows[pos[first]]]
+                self._carried[rows[pos[carry]]] = True
+                extra = pos[~carry]
+                if len(extra):
+                    self._summarize(batch['risk_code'][extra], batch['score_norm'][extra],
+                                    sanitize_batch({k: v[extra] for k, v in columns.items()}), batch['flag_bits'][extra])
+            self.store.append_shard(shard_from_decoded(decoded, batch))
+
+    def finish(self) -> ResultStore:
+        if self.base is not None:
+            missing = np.flatnonzero(~self._matched)
+            if self.keep_missing:
+                self.store.append_shard(self.base.take(missing, self.store.header))
+                self._carried[missing] = True
+            else:
+                self.counts['removed'] = int(len(missing))
+            # replaced and removed base rows leave the aggregates and cube
+            gone = np.flatnonzero(~self._carried)
+            if len(gone):
+                inputs = {k: v[gone] for k, v in self.base.input_columns().items()}
+                self._summarize(self.base.column('risk_code')[gone], self.base.column('score_norm')[gone],
+                                sanitize_batch(inputs), self.base.column('flag_bits')[gone], sign=-1)
+        self.store.aggregates = self.aggregates
+        self.store.cube = self.cube
+        return self.store
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Row counts plus the change in customers per risk class, from the two
+        stores' running class counts (no pass over the rows).
+        """
+        before = self.base.class_counts if self.base is not None else np.zeros(len(RISK_CLASSES), dtype=np.int64)
+        delta = (self.store.class_counts - before).tolist()
+        return dict(self.counts,
+                    rescored=self.counts['added'] + self.counts['changed'],
+                    base_upload_id=self.base.uid if self.base is not None else None,
+                    class_delta={c: int(d) for c, d in zip(RISK_CLASSES, delta)})
@@ -1,119 +1,428 @@
 # evaluate_scoring.py
-import sys
+"""
+Evaluate the scoring engine against a labeled portfolio and search for better
+weights / risk thresholds.
+
+    cd backend
+    python evaluate_scoring.py --csv data/test_accounts.csv
+    python evaluate_scoring.py --csv history.csv --search random --trials 200 --workers 8
+    python evaluate_scoring.py --csv history.csv --search grid --weight-factors 0.5,1,2 \
+        --low-grid 0.35,0.4,0.45 --med-grid 0.45,0.5,0.55 --out-dir eval_out
+
+The labeled CSV is read in chunks with the upload parser and sanitized once;
+every parameter set is then scored with score_features_batch in batches of
+--batch-rows. One sort of the scores gives the confusion counts at every
+distinct threshold (ROC, PR, AUC, average precision, recall at --alert-rate).
+Candidate weight sets are spread over a process pool; each task also tries
+every risk-threshold pair, which only changes the Low/Medium/High split.
+
+The leaderboard is ranked by AUC, then recall at --alert-rate, then F1 of the
+High class (moved by the med threshold), then F1 of the Medium and High
+classes together (the low threshold's watch list).
+"""
+import argparse
+import csv
 import os
-import pandas as pd
-import numpy as np
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
-# adapt path so we can import scoring.score_row
-# assume backend/scoring.py exports score_row
-sys.path.insert(0, os.path.abspath("backend"))
-from scoring import score_row   # must match your file
+import numpy as np
 
-from sklearn.metrics import (
-    accuracy_score, precision_score, recall_score, f1_score,
-    roc_auc_score, confusion_matrix, classification_report
-)
-import matplotlib.pyplot as plt
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from scoring import (score_features_batch, sanitize_batch, classify_batch, DEFAULT_WEIGHTS, FLAG_THRESHOLDS,
+                     RISK_THRESHOLDS, RISK_CLASSES, CONTRIB_KEYS)
+from schema import resolve_schema, ColumnDecoder
+from rescore import params_key
+from utils import CsvStreamParser
 
 # ----- CONFIG -----
-CSV_PATH = "data/test_accounts.csv"   # change to your test CSV
-USE_BINARY = True   # True -> delinquent (DPD>=1) vs not; False -> multiclass
-# If using binary, choose probability threshold for prediction (0..1)
-PROB_THRESHOLD = 0.5   # you can tune this (0.4, 0.45...) to balance recall/precision
-
-# ----- LOAD CSV -----
-df = pd.read_csv(CSV_PATH)
-print(f"Loaded {len(df)} rows from {CSV_PATH}")
-
-# Ensure label column exists
-label_col_candidates = ["DPD Bucket Next Month", "DPD_Bucket_Next_Month", "DPD", "dpd"]
-label_col = None
-for c in label_col_candidates:
-    if c in df.columns:
-        label_col = c
-        break
-if label_col is None:
-    raise RuntimeError("No DPD label column found. Add 'DPD Bucket Next Month' to CSV.")
-
-y_true_raw = df[label_col].fillna(0).astype(int).values
-
-# ----- Score rows using your scoring engine -----
-pred_probs = []
-pred_scores = []
-rows_out = []
-for _, row in df.iterrows():
-    row_dict = row.to_dict()
-    out = score_row(row_dict)   # uses your scoring.py function
-    rows_out.append(out)
-    # canonical probability = score_norm (we set risk_score == score_norm)
-    prob = float(out.get("score_norm", out.get("risk_score", 0.0)))
-    pred_probs.append(prob)
-    pred_scores.append(prob)  # same here (kept for clarity)
-
-pred_probs = np.array(pred_probs)
-
-# ----- Build binary/multiclass predictions -----
-if USE_BINARY:
-    # define true binary labels: delinquent if dpd >= 1
-    y_true = (y_true_raw >= 1).astype(int)
-    y_pred = (pred_probs >= PROB_THRESHOLD).astype(int)
-else:
-    # multiclass: use thresholds to bucket score_norm into Low/Medium/High mapping
-    # adapt threshold cutoffs to match your scoring.RISK_THRESHOLDS
-    def score_to_class(p):
-        if p >= 0.50:
-            return 3  # High -> map to DPD 3 (approx)
-        elif p >= 0.40:
-            return 2  # Medium -> DPD 2
-        else:
-            return 0  # Low -> DPD 0
-    y_true = y_true_raw
-    y_pred = np.array([score_to_class(p) for p in pred_probs])
-
-# ----- Metrics (binary) -----
-if USE_BINARY:
-    acc = accuracy_score(y_true, y_pred)
-    prec = precision_score(y_true, y_pred, zero_division=0)
-    rec = recall_score(y_true, y_pred, zero_division=0)
-    f1 = f1_score(y_true, y_pred, zero_division=0)
+CSV_PATH = "data/test_accounts.csv"   # labeled portfolio (needs 'DPD Bucket Next Month')
+POSITIVE_DPD = 1         # delinquent = DPD bucket >= this
+ALERT_RATE = 0.05        # share of the book an analyst team can review
+READ_CHUNK_BYTES = 8 << 20
+BATCH_ROWS = 250000
+SCORE_FIELDS = ('score_norm', 'final_prob')
+
+# -- loading
+def load_labeled(path: str, chunk_bytes: int = READ_CHUNK_BYTES, keep_ids: bool = False) -> Dict[str, Any]:
+    """
+    Parse and sanitize a labeled CSV chunk by chunk. Returns {'features'
+    (sanitize_batch arrays), 'dpd', 'ids' (when keep_ids)}.
+    """
+    parser = CsvStreamParser(dict_rows=False)
+    decoder = None
+    parts: Dict[str, List[np.ndarray]] = {}
+    dpd: List[np.ndarray] = []
+    ids: List[str] = []
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_bytes)
+            rows = parser.feed(data) if data else parser.close()
+            if decoder is None and (parser.fieldnames is not None or not data):
+                schema = resolve_schema(parser.fieldnames or [])
+                if schema.missing:
+                    raise RuntimeError(f"{path}: missing required columns {schema.missing}")
+                decoder = ColumnDecoder(schema)
+            if rows:
+                decoded = decoder.decode(rows)
+                for k, v in sanitize_batch(decoded['columns']).items():
+                    parts.setdefault(k, []).append(v)
+                dpd.append(decoded['columns']['dpd'])
+                if keep_ids:
+                    ids.extend(decoded['ids'])
+            if not data:
+                break
+    if not dpd:
+        raise RuntimeError(f"{path}: no data rows")
+    return {
+        'features': {k: np.concatenate(v) for k, v in parts.items()},
+        'dpd': np.concatenate(dpd).astype(np.int64),
+        'ids': ids if keep_ids else None
+    }
+
+# -- scoring
+def score_labeled(features: Dict[str, np.ndarray], weights: Dict[str, float], field: str = 'score_norm',
+                  batch_rows: int = BATCH_ROWS) -> np.ndarray:
+    n = len(features['util_pct'])
+    out = np.empty(n, dtype=np.float64)
+    for start in range(0, n, batch_rows):
+        stop = min(n, start + batch_rows)
+        res = score_features_batch({k: v[start:stop] for k, v in features.items()}, weights, with_top3=False)
+        out[start:stop] = res[field]
+    return out
+
+# -- metrics
+def threshold_sweep(scores: np.ndarray, y: np.ndarray) -> Dict[str, Any]:
+    """
+    Confusion counts at every distinct score, predicting positive when
+    score >= threshold, from one descending sort. Arrays run from the highest
+    threshold (fewest alerts) to the lowest (everyone alerted).
+    """
+    order = np.argsort(-scores, kind='stable')
+    s = scores[order]
+    tps = np.cumsum(y[order], dtype=np.int64)
+    last = np.r_[np.flatnonzero(np.diff(s)), len(s) - 1]
+    tp = tps[last]
+    fp = (last + 1) - tp
+    pos = int(tps[-1]) if len(tps) else 0
+    neg = len(s) - pos
+    return {'thresholds': s[last], 'tp': tp, 'fp': fp, 'fn': pos - tp, 'tn': neg - fp,
+            'positives': pos, 'negatives': neg, 'n': len(s)}
+
+def _div(a, b):
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.zeros_like(a), where=b > 0)
+
+def roc_curve(sweep: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    fpr = np.r_[0.0, _div(sweep['fp'], sweep['negatives'])]
+    tpr = np.r_[0.0, _div(sweep['tp'], sweep['positives'])]
+    return fpr, tpr, np.r_[np.inf, sweep['thresholds']]
+
+def pr_curve(sweep: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    precision = _div(sweep['tp'], sweep['tp'] + sweep['fp'])
+    recall = _div(sweep['tp'], sweep['positives'])
+    return precision, recall, sweep['thresholds']
+
+def roc_auc(sweep: Dict[str, Any]) -> float:
+    if not sweep['positives'] or not sweep['negatives']:
+        return float('nan')
+    fpr, tpr, _ = roc_curve(sweep)
+    # trapezoids; tied scores form one diagonal step (same as sklearn)
+    return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) * 0.5))
+
+def average_precision(sweep: Dict[str, Any]) -> float:
+    if not sweep['positives']:
+        return float('nan')
+    precision, recall, _ = pr_curve(sweep)
+    return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+def confusion_at(sweep: Dict[str, Any], threshold: float) -> Dict[str, int]:
+    # counts for score >= threshold, looked up in the sweep (no rescan)
+    i = int(np.searchsorted(-sweep['thresholds'], -threshold, side='right')) - 1
+    if i < 0:
+        return {'tp': 0, 'fp': 0, 'fn': sweep['positives'], 'tn': sweep['negatives']}
+    return {k: int(sweep[k][i]) for k in ('tp', 'fp', 'fn', 'tn')}
+
+def at_alert_rate(sweep: Dict[str, Any], rate: float) -> Dict[str, float]:
+    """
+    Recall / precision when alerting at most `rate` of the book, at the lowest
+    threshold that stays within budget (ties are never split).
+    """
+    alerts = sweep['tp'] + sweep['fp']
+    i = int(np.searchsorted(alerts, rate * sweep['n'], side='right')) - 1
+    if i < 0:
+        return {'threshold': float('inf'), 'alert_rate': 0.0, 'recall': 0.0, 'precision': 0.0}
+    tp, n_alert = int(sweep['tp'][i]), int(alerts[i])
+    return {
+        'threshold': float(sweep['thresholds'][i]),
+        'alert_rate': n_alert / sweep['n'],
+        'recall': tp / sweep['positives'] if sweep['positives'] else 0.0,
+        'precision': tp / n_alert if n_alert else 0.0
+    }
+
+def class_table(scores: np.ndarray, dpd: np.ndarray, risk_thresholds: Dict[str, float]) -> np.ndarray:
+    # rows: RISK_CLASSES, columns: DPD bucket 0..max
+    codes = classify_batch(scores, risk_thresholds).astype(np.int64)
+    width = int(dpd.max()) + 1 if len(dpd) else 1
+    return np.bincount(codes * width + np.clip(dpd, 0, None), minlength=len(RISK_CLASSES) * width).reshape(len(RISK_CLASSES), width)
+
+def _alert_metrics(alert: np.ndarray, y: np.ndarray) -> Tuple[int, int, float, float, float]:
+    # (alerted, true positives, precision, recall, F1) of a boolean alert mask
+    tp = int(np.count_nonzero(alert & (y == 1)))
+    n_alert = int(np.count_nonzero(alert))
+    pos = int(y.sum())
+    precision = tp / n_alert if n_alert else 0.0
+    recall = tp / pos if pos else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return n_alert, tp, precision, recall, f1
+
+def class_metrics(scores: np.ndarray, y: np.ndarray, risk_thresholds: Dict[str, float]) -> Dict[str, float]:
+    """
+    High class (score >= med) as an alert list; the Medium band (low <= score
+    < med) by its size and delinquency rate; and Medium + High (score >= low)
+    as the wider watch list, the only metric here that the low threshold moves.
+    """
+    n = len(y)
+    n_high, tp_high, precision, recall, f1 = _alert_metrics(scores >= risk_thresholds['med'], y)
+    n_watch, tp_watch, _, _, watch_f1 = _alert_metrics(scores >= risk_thresholds['low'], y)
+    n_med = n_watch - n_high
+    return {'high_rate': n_high / n if n else 0.0, 'high_precision': precision, 'high_recall': recall, 'high_f1': f1,
+            'medium_rate': n_med / n if n else 0.0,
+            'medium_precision': (tp_watch - tp_high) / n_med if n_med else 0.0,
+            'watch_f1': watch_f1}
+
+# -- search space
+def _normalized(weights: Dict[str, float]) -> Dict[str, float]:
+    # score_norm divides by the weight sum, so only the weights' shares matter
+    total = sum(weights[k] for k in CONTRIB_KEYS) or 1.0
+    return dict({k: round(weights[k] / total, 6) for k in CONTRIB_KEYS}, bias=weights.get('bias', 0.0))
+
+def weight_grid(factors: List[float]) -> List[Dict[str, float]]:
+    """
+    DEFAULT_WEIGHTS with every contrib weight scaled by each of `factors`
+    (all combinations), deduplicated after normalizing.
+    """
+    out, seen = [], set()
+    grid = np.array(np.meshgrid(*[factors] * len(CONTRIB_KEYS), indexing='ij')).reshape(len(CONTRIB_KEYS), -1).T
+    for row in grid:
+        w = _normalized(dict({k: DEFAULT_WEIGHTS[k] * f for k, f in zip(CONTRIB_KEYS, row)}, bias=DEFAULT_WEIGHTS['bias']))
+        key = tuple(w[k] for k in CONTRIB_KEYS)
+        if key not in seen:
+            seen.add(key)
+            out.append(w)
+    return out
+
+def weight_samples(trials: int, concentration: float, seed: int) -> List[Dict[str, float]]:
+    # Dirichlet draws centred on the default shares; higher concentration stays closer
+    rng = np.random.default_rng(seed)
+    base = np.array([_normalized(DEFAULT_WEIGHTS)[k] for k in CONTRIB_KEYS])
+    draws = rng.dirichlet(np.maximum(base, 1e-3) * concentration, size=trials)
+    return [_normalized(DEFAULT_WEIGHTS)] + [
+        dict({k: round(float(v), 6) for k, v in zip(CONTRIB_KEYS, d)}, bias=DEFAULT_WEIGHTS['bias']) for d in draws]
+
+def threshold_pairs(lows: List[float], meds: List[float]) -> List[Dict[str, float]]:
+    return [{'low': lo, 'med': md} for lo in lows for md in meds if lo <= md]
+
+# -- evaluation (runs in pool workers)
+_DATA: Dict[str, Any] = {}
+
+def _init_worker(features: Dict[str, np.ndarray], y: np.ndarray, field: str, alert_rate: float, batch_rows: int):
+    _DATA.update(features=features, y=y, field=field, alert_rate=alert_rate, batch_rows=batch_rows)
+
+def evaluate_weights(weights: Dict[str, float], risk_pairs: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+    """
+    Score the loaded set once under `weights`; one leaderboard row per
+    risk-threshold pair.
+    """
+    y = _DATA['y']
+    scores = score_labeled(_DATA['features'], weights, _DATA['field'], _DATA['batch_rows'])
+    sweep = threshold_sweep(scores, y)
+    base = {'auc': roc_auc(sweep), 'average_precision': average_precision(sweep)}
+    at_rate = at_alert_rate(sweep, _DATA['alert_rate'])
+    base.update({'recall_at_rate': at_rate['recall'], 'precision_at_rate': at_rate['precision'],
+                 'threshold_at_rate': at_rate['threshold']})
+    rows = []
+    for rt in risk_pairs:
+        params = {'weights': weights, 'flag_thresholds': dict(FLAG_THRESHOLDS), 'risk_thresholds': rt}
+        rows.append(dict(base, params_key=params_key(params), weights=weights, risk_thresholds=rt,
+                         **class_metrics(scores, y, rt)))
+    return rows
+
+def rank(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def key(r):
+        auc = r['auc'] if r['auc'] == r['auc'] else -1.0
+        return (-auc, -r['recall_at_rate'], -r['high_f1'], -r['watch_f1'])
+    return sorted(rows, key=key)
+
+def run_search(data: Dict[str, Any], candidates: List[Dict[str, float]], risk_pairs: List[Dict[str, float]],
+               y: np.ndarray, field: str, alert_rate: float, workers: int, batch_rows: int) -> List[Dict[str, Any]]:
+    args = (data['features'], y, field, alert_rate, batch_rows)
+    rows = []
+    # 0/1 workers = evaluate in-process (as parallel.SCORING_WORKERS)
+    if workers <= 1 or len(candidates) == 1:
+        _init_worker(*args)
+        for w in candidates:
+            rows.extend(evaluate_weights(w, risk_pairs))
+        return rank(rows)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=args) as pool:
+        for result in pool.map(evaluate_weights, candidates, [risk_pairs] * len(candidates)):
+            rows.extend(result)
+    return rank(rows)
+
+# -- reports
+def _write_csv(path: str, header: List[str], rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(header)
+        w.writerows(rows)
+
+def write_curves(out_dir: str, name: str, sweep: Dict[str, Any]):
+    fpr, tpr, thr = roc_curve(sweep)
+    _write_csv(os.path.join(out_dir, f'{name}_roc.csv'), ['threshold', 'fpr', 'tpr'], zip(thr.tolist(), fpr.tolist(), tpr.tolist()))
+    precision, recall, thr = pr_curve(sweep)
+    _write_csv(os.path.join(out_dir, f'{name}_pr.csv'), ['threshold', 'precision', 'recall'],
+               zip(thr.tolist(), precision.tolist(), recall.tolist()))
+    _write_csv(os.path.join(out_dir, f'{name}_confusion.csv'), ['threshold', 'tp', 'fp', 'fn', 'tn'],
+               zip(sweep['thresholds'].tolist(), sweep['tp'].tolist(), sweep['fp'].tolist(),
+                   sweep['fn'].tolist(), sweep['tn'].tolist()))
+
+def write_leaderboard(path: str, rows: List[Dict[str, Any]]):
+    header = (['rank', 'params_key', 'auc', 'average_precision', 'recall_at_rate', 'precision_at_rate',
+               'threshold_at_rate', 'high_rate', 'high_precision', 'high_recall', 'high_f1', 'medium_rate',
+               'medium_precision', 'watch_f1']
+              + [f'w_{k}' for k in CONTRIB_KEYS] + ['risk_low', 'risk_med'])
+    _write_csv(path, header, ([i + 1] + [r[h] for h in header[1:14]] + [r['weights'][k] for k in CONTRIB_KEYS]
+                              + [r['risk_thresholds']['low'], r['risk_thresholds']['med']] for i, r in enumerate(rows)))
+
+def plot_roc(path: str, curves: Dict[str, Tuple[np.ndarray, np.ndarray, float]]) -> bool:
     try:
-        auc = roc_auc_score(y_true, pred_probs)
-    except Exception:
-        auc = float("nan")
-    print("Binary evaluation (delinquent >=1 vs 0):")
-    print(f"Rows: {len(df)}  Positive cases: {y_true.sum()}  Negative: {len(df)-y_true.sum()}")
-    print(f"Accuracy: {acc:.4f}  Precision: {prec:.4f}  Recall: {rec:.4f}  F1: {f1:.4f}  AUC: {auc:.4f}")
-    print("\nConfusion matrix (rows: true, cols: pred):")
-    print(confusion_matrix(y_true, y_pred))
-    print("\nClassification report:")
-    print(classification_report(y_true, y_pred, digits=4))
-else:
-    # multiclass report
-    print("Multiclass classification report (raw DPD buckets vs predicted classes):")
-    print(classification_report(y_true, y_pred, digits=4))
-    print("Confusion matrix:")
-    print(confusion_matrix(y_true, y_pred))
-
-# ----- ROC curve plot (binary) -----
-if USE_BINARY:
-    from sklearn.metrics import roc_curve
-    fpr, tpr, thr = roc_curve(y_true, pred_probs)
-    plt.figure(figsize=(6,5))
-    plt.plot(fpr, tpr, label=f"AUC={auc:.3f}")
-    plt.plot([0,1],[0,1],"--",color="gray")
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    plt.figure(figsize=(6, 5))
+    for label, (fpr, tpr, auc) in curves.items():
+        plt.plot(fpr, tpr, label=f"{label} AUC={auc:.3f}")
+    plt.plot([0, 1], [0, 1], "--", color="gray")
     plt.xlabel("False Positive Rate")
     plt.ylabel("True Positive Rate")
     plt.title("ROC Curve")
     plt.legend()
     plt.tight_layout()
-    plt.savefig("roc_curve.png")
-    print("Saved ROC curve to roc_curve.png")
-
-# ----- Save scored rows (optional) -----
-out_df = df.copy()
-# attach predictions
-out_df["pred_prob"] = pred_probs
-out_df["pred_label_binary"] = y_pred if USE_BINARY else (y_pred)
-out_df["true_label_raw"] = y_true_raw
-out_df.to_csv("scored_test_output.csv", index=False)
-print("Saved scored rows to scored_test_output.csv")
+    plt.savefig(path)
+    plt.close()
+    return True
+
+def print_report(title: str, sweep: Dict[str, Any], scores: np.ndarray, dpd: np.ndarray, y: np.ndarray,
+                 risk_thresholds: Dict[str, float], alert_rate: float):
+    at_rate = at_alert_rate(sweep, alert_rate)
+    print(f"\n== {title}")
+    print(f"Rows: {sweep['n']}  Positive: {sweep['positives']}  Negative: {sweep['negatives']}")
+    print(f"AUC: {roc_auc(sweep):.4f}  Average precision: {average_precision(sweep):.4f}")
+    print(f"At alert rate {alert_rate:.2%}: threshold {at_rate['threshold']:.4f}  alerted {at_rate['alert_rate']:.2%}  "
+          f"recall {at_rate['recall']:.4f}  precision {at_rate['precision']:.4f}")
+    for label, t in (('medium', risk_thresholds['low']), ('high', risk_thresholds['med'])):
+        c = confusion_at(sweep, t)
+        print(f"Confusion at {label} cut-off {t}: tp={c['tp']} fp={c['fp']} fn={c['fn']} tn={c['tn']}")
+    print(f"Risk class x DPD bucket (thresholds {risk_thresholds}):")
+    table = class_table(scores, dpd, risk_thresholds)
+    print('        ' + ''.join(f'{"DPD " + str(j):>10}' for j in range(table.shape[1])))
+    for name, row in zip(RISK_CLASSES, table.tolist()):
+        print(f'{name:<8}' + ''.join(f'{v:>10}' for v in row))
+
+def _floats(s: str) -> List[float]:
+    return [float(x) for x in s.split(',') if x.strip()]
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--csv', default=CSV_PATH)
+    ap.add_argument('--score-field', choices=SCORE_FIELDS, default='score_norm',
+                    help='score_norm (feature score, canonical) or final_prob (blended with rule flags)')
+    ap.add_argument('--positive-dpd', type=int, default=POSITIVE_DPD)
+    ap.add_argument('--alert-rate', type=float, default=ALERT_RATE)
+    ap.add_argument('--search', choices=('none', 'grid', 'random'), default='none')
+    ap.add_argument('--weight-factors', default='0.5,1,2', help='grid: multipliers tried for each weight')
+    ap.add_argument('--trials', type=int, default=100, help='random: weight sets sampled')
+    ap.add_argument('--concentration', type=float, default=20.0, help='random: Dirichlet concentration')
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--low-grid', default=str(RISK_THRESHOLDS['low']))
+    ap.add_argument('--med-grid', default=str(RISK_THRESHOLDS['med']))
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    ap.add_argument('--top', type=int, default=20)
+    ap.add_argument('--out-dir', default=None, help='write leaderboard, ROC/PR/confusion CSVs and roc_curve.png')
+    ap.add_argument('--scored-out', default=None, help='write per-customer scores of the default parameters')
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    data = load_labeled(args.csv, keep_ids=bool(args.scored_out))
+    y = (data['dpd'] >= args.positive_dpd).astype(np.int64)
+    print(f"Loaded {len(y)} rows from {args.csv} in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    scores = score_labeled(data['features'], DEFAULT_WEIGHTS, args.score_field, args.batch_rows)
+    sweep = threshold_sweep(scores, y)
+    print(f"Scored and swept in {time.perf_counter() - t0:.2f}s")
+    print_report('Default parameters', sweep, scores, data['dpd'], y, RISK_THRESHOLDS, args.alert_rate)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+        write_curves(args.out_dir, 'default', sweep)
+    if args.scored_out:
+        codes = classify_batch(scores, RISK_THRESHOLDS)
+        _write_csv(args.scored_out, ['Customer ID', args.score_field, 'risk_class', 'true_label_raw', 'true_label_binary'],
+                   zip(data['ids'], scores.tolist(), (RISK_CLASSES[c] for c in codes.tolist()), data['dpd'].tolist(), y.tolist()))
+        print(f"Saved scored rows to {args.scored_out}")
+
+    if args.search == 'none':
+        if args.out_dir:
+            fpr, tpr, _ = roc_curve(sweep)
+            if plot_roc(os.path.join(args.out_dir, 'roc_curve.png'), {'default': (fpr, tpr, roc_auc(sweep))}):
+                print(f"Saved ROC curve to {os.path.join(args.out_dir, 'roc_curve.png')}")
+        return
+
+    if args.search == 'grid':
+        candidates = weight_grid(_floats(args.weight_factors))
+    else:
+        candidates = weight_samples(args.trials, args.concentration, args.seed)
+    risk_pairs = threshold_pairs(_floats(args.low_grid), _floats(args.med_grid))
+    if not risk_pairs:
+        raise SystemExit('No risk threshold pair with low <= med')
+    print(f"\nSearching {len(candidates)} weight sets x {len(risk_pairs)} risk threshold pairs on {args.workers} worker(s)...")
+    t0 = time.perf_counter()
+    board = run_search(data, candidates, risk_pairs, y, args.score_field, args.alert_rate, args.workers, args.batch_rows)
+    elapsed = time.perf_counter() - t0
+    print(f"Evaluated {len(candidates)} weight sets in {elapsed:.2f}s ({len(candidates) * len(y) / elapsed:,.0f} rows/s)")
+
+    print(f"\nLeaderboard (AUC, then recall at {args.alert_rate:.2%} alerted, then High-class F1, "
+          "then Medium+High F1):")
+    print(f"{'#':>3} {'auc':>7} {'ap':>7} {'rec@rate':>8} {'hi_f1':>7} {'hi_rate':>7} {'wl_f1':>7} {'med_rate':>8} "
+          f"{'med_prec':>8}  weights / risk thresholds")
+    for i, r in enumerate(board[:args.top]):
+        w = ' '.join(f"{k}={r['weights'][k]:.3f}" for k in CONTRIB_KEYS)
+        print(f"{i + 1:>3} {r['auc']:>7.4f} {r['average_precision']:>7.4f} {r['recall_at_rate']:>8.4f} "
+              f"{r['high_f1']:>7.4f} {r['high_rate']:>7.2%} {r['watch_f1']:>7.4f} {r['medium_rate']:>8.2%} "
+              f"{r['medium_precision']:>8.4f}  {w} | low={r['risk_thresholds']['low']} med={r['risk_thresholds']['med']}")
+
+    best = board[0]
+    best_scores = score_labeled(data['features'], best['weights'], args.score_field, args.batch_rows)
+    best_sweep = threshold_sweep(best_scores, y)
+    print_report(f"Best parameters ({best['params_key']})", best_sweep, best_scores, data['dpd'], y,
+                 best['risk_thresholds'], args.alert_rate)
+
+    if args.out_dir:
+        write_leaderboard(os.path.join(args.out_dir, 'leaderboard.csv'), board)
+        write_curves(args.out_dir, 'best', best_sweep)
+        fpr, tpr, _ = roc_curve(sweep)
+        bfpr, btpr, _ = roc_curve(best_sweep)
+        if plot_roc(os.path.join(args.out_dir, 'roc_curve.png'),
+                    {'default': (fpr, tpr, roc_auc(sweep)), 'best': (bfpr, btpr, best['auc'])}):
+            print(f"Saved ROC curve to {os.path.join(args.out_dir, 'roc_curve.png')}")
+        print(f"Saved leaderboard and curves to {args.out_dir}")
+
+if __name__ == '__main__':
+    main()
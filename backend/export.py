@@ -0,0 +1,180 @@
+# export.py
+"""
+Streaming exports of a ResultStore. Every writer is a generator of bytes that
+renders EXPORT_CHUNK_ROWS rows at a time straight from the store's columns, so
+no export is ever held in memory whole.
+
+Arrow IPC and Parquet need pyarrow, which is optional: without it those two
+formats are rejected and the text formats keep working.
+"""
+import csv
+import io
+import json
+import math
+import os
+import zlib
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+import numpy as np
+
+from store import ResultStore, ID_COLUMN, TYPED_INPUT_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', '10000'))
+
+# format -> (media type, file extension)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    'csv': ('text/csv', 'csv'),
+    'csv.gz': ('application/gzip', 'csv.gz'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+ARROW_FORMATS = ('arrow', 'parquet')
+
+def resolve_columns(store: ResultStore, columns: Optional[str]) -> List[str]:
+    """
+    Parse a comma-separated projection against the store's output fields
+    (None/empty selects all, in record order). Unknown names raise ValueError.
+    """
+    fields = store.fields()
+    if not columns:
+        return fields
+    wanted = [c.strip() for c in columns.split(',') if c.strip()]
+    unknown = [c for c in wanted if c not in fields]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}; available: {fields}")
+    # keep the caller's order, drop repeats
+    return list(dict.fromkeys(wanted))
+
+def check_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'; expected one of {list(EXPORT_FORMATS)}")
+    if fmt in ARROW_FORMATS and pa is None:
+        raise ValueError(f"Format '{fmt}' requires pyarrow, which is not installed")
+
+# -- text formats
+def iter_csv(store: ResultStore, fields: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    # same output as utils.records_to_csv_bytes(list(store.iter_rows()))
+    if not len(store):
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for chunk in store.iter_chunks(fields, chunk_rows):
+        writer.writerows(zip(*chunk))
+        yield buf.getvalue().encode('utf-8')
+        buf.seek(0)
+        buf.truncate()
+
+def iter_csv_gzip(store: ResultStore, fields: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS,
+                  level: int = 6) -> Iterator[bytes]:
+    gz = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 16+15: gzip container
+    for data in iter_csv(store, fields, chunk_rows):
+        out = gz.compress(data)
+        if out:
+            yield out
+    yield gz.flush()
+
+def _json_line(dumps, fields: List[str], values) -> str:
+    try:
+        return dumps(dict(zip(fields, values)))
+    except ValueError:
+        # NaN / inf are not JSON: null, as in the columnar payload
+        return dumps({f: None if isinstance(v, float) and not math.isfinite(v) else v for f, v in zip(fields, values)})
+
+def iter_ndjson(store: ResultStore, fields: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    # one /upload-style record per line
+    dumps = json.JSONEncoder(ensure_ascii=False, allow_nan=False).encode
+    for chunk in store.iter_chunks(fields, chunk_rows):
+        lines = [_json_line(dumps, fields, values) for values in zip(*chunk)]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+# -- columnar formats (pyarrow)
+class _ChunkSink(io.RawIOBase):
+    # write-only file object collecting what pyarrow writes until it is drained
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def _arrow_schema(store: ResultStore, fields: List[str]):
+    types = []
+    for f in fields:
+        if f in TYPED_INPUT_COLUMNS or f in ('raw_score', 'score_norm'):
+            types.append(pa.field(f, pa.float64()))
+        else:
+            types.append(pa.field(f, pa.string()))
+    return pa.schema(types)
+
+def _arrow_batches(store: ResultStore, fields: List[str], schema, chunk_rows: int):
+    # numeric fields come from the stored float64 arrays without a Python round trip
+    numeric = {f for f in fields if f in TYPED_INPUT_COLUMNS or f in ('raw_score', 'score_norm')}
+    for start in range(0, len(store), chunk_rows):
+        stop = min(start + chunk_rows, len(store))
+        arrays = []
+        for f in fields:
+            if f in numeric:
+                # non-finite values ('NaN', 'inf' cells) as null, as in the columnar payload
+                values = np.asarray(store.cols[f][start:stop])
+                arrays.append(pa.array(values, type=pa.float64(), mask=~np.isfinite(values)))
+            else:
+                values = store.field_values(f, start, stop)
+                if f != ID_COLUMN:
+                    values = [v if v is None else str(v) for v in values]
+                arrays.append(pa.array(values, type=pa.string()))
+        yield pa.record_batch(arrays, schema=schema)
+
+def iter_arrow(store: ResultStore, fields: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    # Arrow IPC streaming format, one record batch per chunk
+    schema = _arrow_schema(store, fields)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in _arrow_batches(store, fields, schema, chunk_rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+def iter_parquet(store: ResultStore, fields: List[str], chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    # one row group per chunk; the footer is written on close
+    schema = _arrow_schema(store, fields)
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in _arrow_batches(store, fields, schema, chunk_rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+_WRITERS = {
+    'csv': iter_csv,
+    'csv.gz': iter_csv_gzip,
+    'ndjson': iter_ndjson,
+    'arrow': iter_arrow,
+    'parquet': iter_parquet
+}
+
+def export_stream(store: ResultStore, fmt: str = 'csv', columns: Optional[str] = None,
+                  chunk_rows: Optional[int] = None) -> Tuple[Iterator[bytes], str, str]:
+    """
+    Validate format and projection up front (ValueError), then return
+    (byte generator, media type, file extension).
+    """
+    check_format(fmt)
+    fields = resolve_columns(store, columns)
+    media_type, ext = EXPORT_FORMATS[fmt]
+    return _WRITERS[fmt](store, fields, chunk_rows or EXPORT_CHUNK_ROWS), media_type, ext
@@ -0,0 +1,201 @@
+# ingest.py
+"""
+Upload byte streams: compressed CSV files and request bodies, decompressed
+incrementally, and text encoding detection for the CSV parser.
+
+A '.csv.gz' / '.csv.zst' upload is read through a decompressing file object
+over the spooled upload, a bounded piece at a time, so the decompressed file
+is never held in memory. A request sent with 'Content-Encoding: gzip' is inflated by
+GzipRequestMiddleware the same way, one bounded piece per ASGI message,
+before the multipart parser sees it.
+
+zstd needs the optional 'zstandard' package; gzip is in the stdlib.
+"""
+import codecs
+import gzip
+import zlib
+from typing import Optional, List, Tuple, BinaryIO
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# file name suffix -> compression
+COMPRESSED_SUFFIXES = {
+    '.csv.gz': 'gzip',
+    '.csv.gzip': 'gzip',
+    '.csv.zst': 'zstd',
+    '.csv.zstd': 'zstd'
+}
+# largest piece of inflated request body handed on per ASGI message
+INFLATE_CHUNK_BYTES = 1 << 20
+# compressed bytes fed to the zstd decoder at a time (bounds its output per step)
+ZSTD_READ_BYTES = 64 << 10
+# bytes examined when guessing the text encoding of a CSV stream
+SNIFF_BYTES = 64 << 10
+
+# longest first: the UTF-32 LE BOM starts with the UTF-16 LE one
+_BOMS: List[Tuple[bytes, str]] = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+]
+# encodings whose newline byte never occurs inside another character
+# (what parallel.split_csv_bytes relies on)
+BYTE_SPLITTABLE = ('utf-8', 'utf-8-sig', 'cp1252')
+# errors raised by the decompressors on corrupt or truncated input
+DECOMPRESS_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+def upload_compression(filename: str) -> Optional[str]:
+    """
+    Compression of an uploaded file from its name: None for '.csv', 'gzip' or
+    'zstd' for the COMPRESSED_SUFFIXES; anything else raises ValueError.
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return None
+    for suffix, kind in COMPRESSED_SUFFIXES.items():
+        if name.endswith(suffix):
+            return kind
+    raise ValueError("Please upload a CSV file with .csv, .csv.gz or .csv.zst extension.")
+
+def open_decompressed(raw: BinaryIO, compression: Optional[str]) -> BinaryIO:
+    """
+    File object whose read() returns the decompressed bytes of `raw`, at
+    most the size asked for. Concatenated gzip members / zstd frames are read
+    through, as their command-line tools do; truncated input raises EOFError.
+    """
+    if compression is None:
+        return raw
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd uploads need the 'zstandard' package on the server.")
+        return _ZstdReader(raw)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+class _ZstdReader:
+    """
+    read() over a zstd stream, decoded ZSTD_READ_BYTES of input at a time.
+    Unlike zstandard's stream_reader, a stream cut off inside a frame raises
+    EOFError (as gzip does) instead of reading as a shorter file.
+    """
+    def __init__(self, raw: BinaryIO):
+        self._raw = raw
+        self._d = zstandard.ZstdDecompressor().decompressobj()
+        self._in_frame = False
+        self._input = b''
+        self._out = bytearray()
+        self._done = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._done and (size < 0 or len(self._out) < size):
+            data = self._input or self._raw.read(ZSTD_READ_BYTES)
+            self._input = b''
+            if not data:
+                self._done = True
+                if self._in_frame:
+                    raise EOFError("Compressed file ended before the end of a zstd frame")
+                break
+            if self._d.eof:
+                # next frame of a multi-frame stream
+                self._d = zstandard.ZstdDecompressor().decompressobj()
+            self._out += self._d.decompress(data)
+            self._in_frame = not self._d.eof
+            if self._d.eof:
+                self._input = self._d.unused_data
+        n = len(self._out) if size < 0 else min(size, len(self._out))
+        out = bytes(self._out[:n])
+        del self._out[:n]
+        return out
+
+def detect_encoding(head: bytes, default: str = 'utf-8', fallback: str = 'cp1252') -> str:
+    """
+    Text encoding of a CSV stream from its first bytes: a byte order mark
+    decides; without one the data is `default` (UTF-8) if it decodes as such,
+    else `fallback` (Windows-1252, what spreadsheet exports use).
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    try:
+        # not final: the sample may end inside a multi-byte character
+        codecs.getincrementaldecoder(default)().decode(head[:SNIFF_BYTES], final=False)
+        return default
+    except UnicodeDecodeError:
+        return fallback
+
+# -- Content-Encoding: gzip request bodies
+class _Inflater:
+    """
+    Incremental gzip decoder over pushed input, handing out at most `limit`
+    bytes per pull; the rest stays compressed until asked for.
+    """
+    def __init__(self):
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._input = b''
+
+    def push(self, data: bytes):
+        self._input += data
+
+    def pull(self, limit: int) -> bytes:
+        out = []
+        size = 0
+        while self._input and size < limit:
+            if self._d.eof:
+                # next member of a concatenated gzip stream
+                self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunk = self._d.decompress(self._input, limit - size)
+            self._input = self._d.unused_data if self._d.eof else self._d.unconsumed_tail
+            out.append(chunk)
+            size += len(chunk)
+            if not chunk and not self._d.eof:
+                break
+        return b''.join(out)
+
+    def close(self):
+        if not self._d.eof or self._input:
+            raise ValueError("Truncated or corrupt gzip request body")
+
+class GzipRequestMiddleware:
+    """
+    ASGI middleware inflating request bodies sent with 'Content-Encoding:
+    gzip' as they are received. Content-Encoding and Content-Length are
+    dropped from the request headers, which then describe the inflated body.
+    """
+    def __init__(self, app, chunk_bytes: int = INFLATE_CHUNK_BYTES):
+        self.app = app
+        self.chunk_bytes = chunk_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        headers = scope.get('headers') or []
+        encoding = next((v.decode('latin-1').strip().lower() for k, v in headers if k == b'content-encoding'), '')
+        if encoding not in ('gzip', 'x-gzip'):
+            return await self.app(scope, receive, send)
+
+        scope = dict(scope, headers=[(k, v) for k, v in headers if k not in (b'content-encoding', b'content-length')])
+        inflater = _Inflater()
+        ended = False
+
+        async def inflating_receive():
+            nonlocal ended
+            while True:
+                body = inflater.pull(self.chunk_bytes)
+                if body:
+                    return {'type': 'http.request', 'body': body, 'more_body': True}
+                if ended:
+                    inflater.close()
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                message = await receive()
+                if message['type'] != 'http.request':
+                    return message
+                inflater.push(message.get('body', b''))
+                ended = not message.get('more_body', False)
+
+        await self.app(scope, inflating_receive, send)
@@ -0,0 +1,410 @@
+# jobs.py
+"""
+Background scoring jobs: POST /jobs spools the upload to a temporary file and
+returns at once; a bounded pool of JOB_WORKERS threads works through the file
+chunk by chunk, off the event loop, so other requests keep being served.
+
+Parsing, decoding and scoring hold the GIL, so doing them on those threads
+would still stall the event loop. A job thread therefore only reads the file
+and cuts it into whole CSV records (byte scans); the records go to a pool of
+JOB_PROCESSES worker processes (parallel.score_csv_shard) and come back as
+store shards, merged in file order. Upserts diff in the job thread against
+their base result set, so only parsing and decoding run in the workers there.
+JOB_PROCESSES=0, or an encoding whose bytes cannot be split at newlines,
+keeps all the work on the job thread.
+
+At most JOB_QUEUE_MAX jobs are queued or running at a time; further
+submissions are refused (HTTP 429) until one finishes. Progress (rows done,
+rows/sec, ETA from the share of bytes read) is updated after every chunk, and
+cancellation is checked between chunks. Finished jobs are remembered up to
+JOB_HISTORY.
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple, BinaryIO
+
+import ingest
+import metrics
+import parallel
+from delta import DeltaUpload
+from schema import resolve_schema, ColumnDecoder
+from scoring import score_batch
+from store import ResultStore, shard_from_decoded
+from utils import CsvStreamParser, csv_record_end, parse_csv_header
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+# worker processes that parse and score job chunks (0 = on the job thread)
+JOB_PROCESSES = int(os.environ.get('JOB_PROCESSES', '2'))
+# queued + running jobs accepted at once
+JOB_QUEUE_MAX = int(os.environ.get('JOB_QUEUE_MAX', '8'))
+# finished jobs kept for /jobs/{id}
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', '100'))
+# bytes read from the spooled file per chunk (one progress update each)
+JOB_CHUNK_BYTES = int(os.environ.get('JOB_CHUNK_BYTES', str(1 << 20)))
+# spooled uploads go here ('' = system temp dir)
+JOB_SPOOL_DIR = os.environ.get('JOB_SPOOL_DIR', '') or None
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+_FINISHED = ('done', 'failed', 'cancelled')
+
+class QueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, filename: str, mode: str = 'score', base: Optional[ResultStore] = None,
+                 keep_missing: bool = False, compression: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.mode = mode
+        self.base = base
+        self.keep_missing = keep_missing
+        # the spooled file stays compressed; see ingest.open_decompressed
+        self.compression = compression
+        self.state = 'queued'
+        self.path: Optional[str] = None
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.rows_done = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    def progress(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        rate = self.rows_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.state == 'running' and rate > 0 and self.bytes_read:
+            # rows still to come, extrapolated from the bytes read so far
+            remaining = self.rows_done * (self.bytes_total - self.bytes_read) / self.bytes_read
+            eta = round(remaining / rate, 3)
+        return {
+            'rows_done': self.rows_done,
+            'bytes_read': self.bytes_read,
+            'bytes_total': self.bytes_total,
+            'fraction': round(self.bytes_read / self.bytes_total, 4) if self.bytes_total else 0.0,
+            'elapsed_s': round(elapsed, 3),
+            'rows_per_sec': round(rate, 1),
+            'eta_s': eta
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        out = {
+            'job_id': self.id,
+            'state': self.state,
+            'mode': self.mode,
+            'filename': self.filename,
+            'compression': self.compression,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': self.progress()
+        }
+        if self.error is not None:
+            out['error'] = self.error
+        if self.result is not None:
+            out['result'] = self.result
+        return out
+
+def _last_record_end(buf: bytes) -> int:
+    # offset past the last newline of buf that ends a CSV record (0 if none);
+    # buf starts at a record boundary
+    nl = buf.rfind(b'\n')
+    quotes = buf.count(b'"', 0, nl) if nl >= 0 else 0
+    while nl >= 0:
+        if quotes % 2 == 0:
+            return nl + 1
+        prev = buf.rfind(b'\n', 0, nl)
+        quotes -= buf.count(b'"', prev + 1, nl)
+        nl = prev
+    return 0
+
+def _record_chunks(f: BinaryIO, raw: BinaryIO, head: bytes) -> Iterator[Tuple[bytes, int]]:
+    """
+    Whole CSV records of the stream `head` + f, about JOB_CHUNK_BYTES at a
+    time, with the position reached in the spooled (raw) file.
+    """
+    buf, data = b'', head
+    while data:
+        buf += data
+        cut = _last_record_end(buf)
+        if cut:
+            yield buf[:cut], raw.tell()
+            buf = buf[cut:]
+        with metrics.stage('read'):
+            data = f.read(JOB_CHUNK_BYTES)
+    if buf:
+        yield buf, raw.tell()
+
+def _finish(job: Job, store: Optional[ResultStore], delta: Optional[DeltaUpload], schema, encoding: str,
+            csv_bytes: int) -> ResultStore:
+    if job.rows_done == 0:
+        raise ValueError("CSV has no data rows.")
+    if delta is not None:
+        store = delta.finish()
+        job.result = delta.report()
+    job.result = dict(job.result or {}, schema=dict(schema.describe(), **store.parse_stats),
+                      encoding=encoding, csv_bytes=csv_bytes)
+    return store
+
+def _target(job: Job, header: Optional[List[str]]):
+    # (schema, store, delta) for a job's resolved header
+    with metrics.stage('validate'):
+        schema = resolve_schema(header)
+        if schema.missing:
+            raise ValueError(f"Missing required columns: {schema.missing}")
+    if job.mode == 'upsert':
+        return schema, None, DeltaUpload(job.base, schema.output_header, job.keep_missing)
+    return schema, ResultStore(schema.output_header), None
+
+def score_file(job: Job, check: Callable[[], None], pool: Optional[ProcessPoolExecutor] = None) -> ResultStore:
+    """
+    Parse and score job.path chunk by chunk, like /upload?mode=stream (or
+    mode=upsert against job.base), decompressing it on the way if needed.
+    Chunks are scored on `pool` when given (see the module docstring).
+    `check` raises JobCancelled when asked to stop.
+    """
+    with open(job.path, 'rb') as raw:
+        f = ingest.open_decompressed(raw, job.compression)
+        with metrics.stage('read'):
+            head = f.read(JOB_CHUNK_BYTES)
+        encoding = ingest.detect_encoding(head)
+        if pool is not None and encoding in ingest.BYTE_SPLITTABLE:
+            return _score_on_pool(job, check, pool, f, raw, head, encoding)
+        return _score_in_thread(job, check, f, raw, head, encoding)
+
+def _score_on_pool(job: Job, check: Callable[[], None], pool: ProcessPoolExecutor, f: BinaryIO, raw: BinaryIO,
+                   head: bytes, encoding: str) -> ResultStore:
+    header = None
+    schema = store = delta = None
+    csv_bytes = 0
+    # chunks in flight, oldest first: enough to keep every worker busy
+    pending: "deque[Tuple[Any, int]]" = deque()
+    limit = 2 * max(1, getattr(pool, '_max_workers', 1))
+
+    def collect():
+        future, pos = pending.popleft()
+        with metrics.stage('parallel_score') as st:
+            part = future.result()
+            n = st.rows = len(part['ids'])
+        if delta is not None:
+            delta.add(part)
+        else:
+            with metrics.stage('aggregate', n):
+                store.append_shard(part)
+        job.rows_done += n
+        # position in the spooled file, to compare with bytes_total
+        job.bytes_read = pos
+
+    work = parallel.decode_csv_shard if job.mode == 'upsert' else parallel.score_csv_shard
+    try:
+        for chunk, pos in _record_chunks(f, raw, head):
+            check()
+            csv_bytes += len(chunk)
+            if header is None:
+                end = csv_record_end(chunk, 0)
+                header, chunk = chunk[:end], chunk[end:]
+                schema, store, delta = _target(job, parse_csv_header(header, encoding))
+            if chunk.strip():
+                pending.append((pool.submit(work, header, chunk, encoding), pos))
+            # finished chunks are merged at once so progress stays current
+            while pending and (len(pending) > limit or pending[0][0].done()):
+                collect()
+        if header is None:
+            schema, store, delta = _target(job, None)
+        while pending:
+            check()
+            collect()
+    finally:
+        for future, _ in pending:
+            future.cancel()
+    job.bytes_read = raw.tell()
+    check()
+    return _finish(job, store, delta, schema, encoding, csv_bytes)
+
+def _score_in_thread(job: Job, check: Callable[[], None], f: BinaryIO, raw: BinaryIO, head: bytes,
+                     encoding: str) -> ResultStore:
+    parser = CsvStreamParser(encoding, dict_rows=False)
+    decoder = None
+    store = None
+    delta = None
+    data = head
+    while True:
+        check()
+        with metrics.stage('parse') as st:
+            rows = parser.feed(data) if data else parser.close()
+            st.rows = len(rows)
+        if decoder is None and (parser.fieldnames is not None or not data):
+            schema, store, delta = _target(job, parser.fieldnames)
+            decoder = ColumnDecoder(schema)
+        if decoder is not None and rows:
+            with metrics.stage('decode', len(rows)):
+                decoded = decoder.decode(rows)
+            if delta is not None:
+                delta.add(decoded)
+            else:
+                with metrics.stage('score', len(rows)):
+                    shard = shard_from_decoded(decoded, score_batch(decoded['columns']))
+                with metrics.stage('aggregate', len(rows)):
+                    store.append_shard(shard)
+            job.rows_done += len(rows)
+        # position in the spooled file, to compare with bytes_total
+        job.bytes_read = raw.tell()
+        if not data:
+            break
+        with metrics.stage('read'):
+            data = f.read(JOB_CHUNK_BYTES)
+    check()
+    return _finish(job, store, delta, decoder.schema, parser.encoding, parser.bytes_read)
+
+class JobManager:
+    """
+    Bounded worker pool + job table. `publish(store)` is called from the
+    worker thread once a job's result set is complete.
+    """
+    def __init__(self, publish: Callable[[ResultStore], None], workers: int = JOB_WORKERS,
+                 max_queue: int = JOB_QUEUE_MAX, history: int = JOB_HISTORY, processes: int = JOB_PROCESSES):
+        self.publish = publish
+        self.workers = max(1, workers)
+        self.processes = max(0, processes)
+        # scoring processes shared by all jobs, started with the first one
+        self._procs: Optional[ProcessPoolExecutor] = None
+        self.max_queue = max(1, max_queue)
+        self.history = history
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='score-job')
+        return self._pool
+
+    def _get_procs(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._procs is None and self.processes:
+                self._procs = ProcessPoolExecutor(max_workers=self.processes)
+            return self._procs
+
+    def reserve(self, job: Job):
+        """
+        Claim a queue slot for `job` before its upload is spooled; raises
+        QueueFull when JOB_QUEUE_MAX jobs are already queued or running.
+        """
+        with self._lock:
+            if self._active >= self.max_queue:
+                self.rejected += 1
+                raise QueueFull(f"Job queue is full ({self.max_queue} queued or running); retry later.")
+            self._active += 1
+            self._jobs[job.id] = job
+            self._trim()
+
+    def release(self, job: Job, state: str, error: Optional[str] = None):
+        with self._lock:
+            if job.state in _FINISHED:
+                return
+            job.state = state
+            job.error = error
+            job.finished_at = time.time()
+            self._active -= 1
+        if job.path is not None:
+            try:
+                os.unlink(job.path)
+            except FileNotFoundError:
+                pass
+        # drop the reference so an upsert base can be evicted
+        job.base = None
+
+    def _trim(self):
+        finished = [jid for jid, j in self._jobs.items() if j.state in _FINISHED]
+        for jid in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    def spool_path(self) -> str:
+        fd, path = tempfile.mkstemp(prefix='job-', suffix='.csv', dir=JOB_SPOOL_DIR)
+        os.close(fd)
+        return path
+
+    def start(self, job: Job):
+        job.future = self._get_pool().submit(self._run, job)
+
+    def _run(self, job: Job):
+        if job.cancel_event.is_set():
+            self.release(job, 'cancelled')
+            return
+
+        def check():
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+
+        job.state = 'running'
+        job.started_at = time.time()
+        t0 = time.perf_counter()
+        try:
+            store = score_file(job, check, self._get_procs())
+            with metrics.stage('publish', len(store)):
+                self.publish(store)
+            job.result = dict(job.result, **store.summary(), upload_id=store.uid)
+        except JobCancelled:
+            self.release(job, 'cancelled')
+            return
+        except Exception as e:
+            metrics.record_upload('job', time.perf_counter() - t0, 0, ok=False)
+            self.release(job, 'failed', f"{type(e).__name__}: {e}")
+            return
+        metrics.record_upload('job', time.perf_counter() - t0, job.rows_done)
+        self.release(job, 'done')
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Ask a job to stop: queued jobs never start, running ones stop at the
+        next chunk boundary. Finished jobs are left as they are.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.state in _FINISHED:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self.release(job, 'cancelled')
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        out = {s: 0 for s in JOB_STATES}
+        for job in list(self._jobs.values()):
+            out[job.state] += 1
+        return out
+
+    def describe(self) -> List[Dict[str, Any]]:
+        # newest first
+        return [j.describe() for j in list(self._jobs.values())[::-1]]
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            if job.state not in _FINISHED:
+                job.cancel_event.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._procs is not None:
+            self._procs.shutdown(wait=True, cancel_futures=True)
+            self._procs = None
+        # jobs that never started: drop their spooled files
+        for job in list(self._jobs.values()):
+            self.release(job, 'cancelled')
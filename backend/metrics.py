@@ -0,0 +1,322 @@
+# metrics.py
+"""
+In-process metrics with Prometheus text exposition (served at /metrics).
+
+METRICS_ENABLED=0 turns instrumentation off: scoring functions are then left
+unwrapped at import time and stage() returns a shared no-op context manager.
+METRICS_SAMPLE_RATE (0..1) samples the per-row scoring hooks (score_row and
+friends), which are called once per customer; stages and batch functions are
+always timed since they run a handful of times per upload.
+LOOP_MONITOR_INTERVAL sets how often the app probes its event loop for lag
+(time it was blocked by work that never yielded).
+
+Process-pool workers (parallel.py) keep their own registry which is never
+scraped; the parent records their work under the 'parallel_score' stage.
+"""
+import abc
+import asyncio
+import bisect
+import functools
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+METRICS_SAMPLE_RATE = min(1.0, max(0.0, float(os.environ.get('METRICS_SAMPLE_RATE', '0.01'))))
+
+# seconds between event-loop lag probes (0 = no probe)
+LOOP_MONITOR_INTERVAL = float(os.environ.get('LOOP_MONITOR_INTERVAL', '0.05'))
+
+PREFIX = 'delinquency_'
+
+# seconds; per-stage timings span a 1k-row chunk to a multi-million-row file
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# seconds; per-row scoring calls are microseconds, batch calls up to seconds
+CALL_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3, 0.01, 0.1, 1.0, 10.0)
+# seconds; a healthy loop lags well under a millisecond
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+def _fmt(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric(abc.ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abc.abstractmethod
+    def _new_child(self):
+        # one value per label combination (_Value, _HistogramValue)
+        ...
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for key, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def render(self, name, labelnames, key):
+        return [f'{name}{_labels(labelnames, key)} {_fmt(self.value)}']
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, key):
+        lines, total = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            le = 'le="%s"' % _fmt(bound)
+            lines.append(f'{name}_bucket{_labels(labelnames, key, le)} {total}')
+        lines.append(f'{name}_sum{_labels(labelnames, key)} {_fmt(self.sum)}')
+        lines.append(f'{name}_count{_labels(labelnames, key)} {total}')
+        return lines
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(PREFIX + name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._add(Gauge(PREFIX + name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=STAGE_BUCKETS) -> Histogram:
+        return self._add(Histogram(PREFIX + name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram('stage_seconds', 'Time spent in each pipeline stage (/upload, /rescore).', ('stage',))
+STAGE_ROWS = REGISTRY.counter('stage_rows_total', 'Rows processed by each pipeline stage.', ('stage',))
+STAGE_ROWS_PER_SEC = REGISTRY.gauge('stage_rows_per_second', 'Throughput of the last run of each pipeline stage.', ('stage',))
+UPLOAD_SECONDS = REGISTRY.histogram('upload_seconds', 'End-to-end /upload latency.', ('mode',))
+UPLOADS = REGISTRY.counter('uploads_total', 'Uploads handled, by mode and outcome.', ('mode', 'status'))
+ROWS_SCORED = REGISTRY.counter('rows_scored_total', 'Customers scored by /upload.')
+UPLOAD_ROWS_PER_SEC = REGISTRY.gauge('upload_rows_per_second', 'End-to-end throughput of the last successful /upload.')
+BYTES_INGESTED = REGISTRY.counter('bytes_ingested_total', 'Raw CSV bytes read by /upload.')
+CALL_SECONDS = REGISTRY.histogram('scoring_call_seconds', 'Latency of scoring.py functions (per-row hooks sampled).',
+                                  ('function',), buckets=CALL_BUCKETS)
+STORE_ROWS = REGISTRY.gauge('result_store_rows', 'Customers held in the current result store.')
+STORE_BYTES = REGISTRY.gauge('result_store_bytes', 'Approximate memory held by the current result store.')
+RESULT_SETS = REGISTRY.gauge('result_sets', 'Result sets (uploads) held in memory.')
+RESULT_SETS_BYTES = REGISTRY.gauge('result_sets_bytes', 'Approximate memory held by all result sets.')
+RESULT_SET_EVICTIONS = REGISTRY.counter('result_set_evictions_total', 'Result sets evicted to stay under RESULTS_MAX_BYTES.')
+JOBS = REGISTRY.gauge('jobs', 'Background scoring jobs known to this worker, by state.', ('state',))
+JOBS_REJECTED = REGISTRY.counter('jobs_rejected_total', 'Job submissions refused because the queue was full.')
+LOOP_LAG = REGISTRY.histogram('event_loop_lag_seconds', 'How late the event loop woke up for a timer; the sum is time '
+                              'the loop was blocked.', buckets=LAG_BUCKETS)
+LOOP_LAG_MAX = REGISTRY.gauge('event_loop_lag_max_seconds', 'Largest event-loop lag seen by this worker.')
+
+# -- hooks
+class _Stage:
+    """
+    Times one stage into STAGE_SECONDS; `rows` may be set inside the block
+    once the row count is known.
+    """
+    __slots__ = ('name', 'rows', '_t0')
+
+    def __init__(self, name: str, rows: int = 0):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._t0
+        STAGE_SECONDS.labels(self.name).observe(elapsed)
+        if self.rows:
+            STAGE_ROWS.labels(self.name).inc(self.rows)
+            if elapsed > 0:
+                STAGE_ROWS_PER_SEC.labels(self.name).set(self.rows / elapsed)
+        return False
+
+class _NullStage:
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name: str, rows: int = 0):
+    if not METRICS_ENABLED:
+        return _NULL_STAGE
+    return _Stage(name, rows)
+
+def instrument(name: Optional[str] = None, per_row: bool = False) -> Callable:
+    """
+    Decorator timing a function into CALL_SECONDS{function=name}. per_row
+    hooks are sampled at METRICS_SAMPLE_RATE. When metrics are disabled (or
+    the sample rate is 0 for a per-row hook) the function is returned as is.
+    """
+    def wrap(fn):
+        rate = METRICS_SAMPLE_RATE if per_row else 1.0
+        if not METRICS_ENABLED or rate <= 0.0:
+            return fn
+        hist = CALL_SECONDS.labels(name or fn.__name__)
+        clock = time.perf_counter
+
+        if rate >= 1.0:
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                t0 = clock()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    hist.observe(clock() - t0)
+            return timed
+
+        sample = random.random
+
+        @functools.wraps(fn)
+        def sampled(*args, **kwargs):
+            if sample() >= rate:
+                return fn(*args, **kwargs)
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(clock() - t0)
+        return sampled
+    return wrap
+
+def record_upload(mode: str, seconds: float, rows: int, ok: bool = True):
+    if not METRICS_ENABLED:
+        return
+    UPLOAD_SECONDS.labels(mode).observe(seconds)
+    UPLOADS.labels(mode, 'ok' if ok else 'error').inc()
+    if ok:
+        ROWS_SCORED.labels().inc(rows)
+        if seconds > 0:
+            UPLOAD_ROWS_PER_SEC.labels().set(rows / seconds)
+
+def record_bytes(n: int):
+    if METRICS_ENABLED and n:
+        BYTES_INGESTED.labels().inc(n)
+
+async def monitor_event_loop(interval: float = LOOP_MONITOR_INTERVAL):
+    """
+    Sleep `interval` seconds at a time and record how much later than asked
+    the loop resumed. Anything running on the loop without yielding (parsing,
+    scoring, encoding in a request handler) shows up as lag.
+    """
+    loop = asyncio.get_running_loop()
+    hist, worst = LOOP_LAG.labels(), LOOP_LAG_MAX.labels()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - t0 - interval)
+        hist.observe(lag)
+        if lag > worst.value:
+            worst.set(lag)
+
+def render(store=None, registry=None, jobs=None) -> str:
+    """
+    Prometheus text for every metric; result-store and job gauges are read
+    from the latest `store`, the results.ResultRegistry and the
+    jobs.JobManager at scrape time.
+    """
+    STORE_ROWS.labels().set(len(store) if store is not None else 0)
+    STORE_BYTES.labels().set(store.nbytes() if store is not None else 0)
+    if registry is not None:
+        RESULT_SETS.labels().set(len(registry))
+        RESULT_SETS_BYTES.labels().set(registry.total_bytes())
+        RESULT_SET_EVICTIONS.labels().set(registry.evictions)
+    if jobs is not None:
+        for state, count in jobs.counts().items():
+            JOBS.labels(state).set(count)
+        JOBS_REJECTED.labels().set(jobs.rejected)
+    return REGISTRY.render()
@@ -0,0 +1,87 @@
+# parallel.py
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from scoring import score_batch
+from schema import resolve_schema, ColumnDecoder
+from store import shard_from_decoded
+from utils import CsvStreamParser, csv_record_end
+
+# worker processes for parallel scoring (0/1 = score in-process)
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', '0'))
+# target size of each CSV byte range handed to a worker
+SHARD_BYTES = int(os.environ.get('SCORING_SHARD_BYTES', str(8 << 20)))
+# smaller uploads are not worth the pickling round-trip
+PARALLEL_MIN_BYTES = int(os.environ.get('SCORING_PARALLEL_MIN_BYTES', str(4 << 20)))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    # one long-lived pool per process; resized only if the worker count changes
+    global _POOL, _POOL_WORKERS
+    if _POOL is None or _POOL_WORKERS != workers:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False)
+        _POOL = ProcessPoolExecutor(max_workers=workers)
+        _POOL_WORKERS = workers
+    return _POOL
+
+def shutdown_pool():
+    global _POOL, _POOL_WORKERS
+    if _POOL is not None:
+        _POOL.shutdown(wait=True)
+    _POOL, _POOL_WORKERS = None, 0
+
+def split_csv_bytes(content: bytes, shard_bytes: Optional[int] = None) -> Tuple[bytes, List[bytes]]:
+    """
+    Split raw CSV bytes into the header record and byte ranges of roughly
+    shard_bytes each, cut only at record boundaries (never inside a quoted
+    field). Newline bytes never occur inside a UTF-8 multi-byte character, so
+    every shard decodes on its own.
+    """
+    shard_bytes = shard_bytes or SHARD_BYTES
+    header_end = csv_record_end(content, 0)
+    header, shards = content[:header_end], []
+    start = header_end
+    while start < len(content):
+        target = min(len(content), start + max(1, shard_bytes))
+        if target >= len(content):
+            end = len(content)
+        else:
+            quotes = content.count(b'"', start, target)
+            end = csv_record_end(content, target, quotes)
+        shards.append(content[start:end])
+        start = end
+    return header, shards
+
+def decode_csv_shard(header: bytes, shard: bytes, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Worker entry point: parse one byte range (prefixed with the header record)
+    into a schema.ColumnDecoder chunk.
+    """
+    parser = CsvStreamParser(encoding, dict_rows=False)
+    rows = parser.feed(header) + parser.feed(shard) + parser.close()
+    return ColumnDecoder(resolve_schema(parser.fieldnames)).decode(rows)
+
+def score_csv_shard(header: bytes, shard: bytes, encoding: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Worker entry point: parse and score one byte range with score_batch and
+    reduce it for ResultStore.append_shard.
+    """
+    decoded = decode_csv_shard(header, shard, encoding)
+    return shard_from_decoded(decoded, score_batch(decoded['columns']))
+
+async def score_csv_parallel(content: bytes, workers: int, shard_bytes: Optional[int] = None,
+                             encoding: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Score raw CSV bytes on a process pool, one byte range per task. Results
+    come back in the original row order. `encoding` must be one of
+    ingest.BYTE_SPLITTABLE (detected per shard when None).
+    """
+    header, shards = split_csv_bytes(content, shard_bytes)
+    pool = get_pool(workers)
+    loop = asyncio.get_running_loop()
+    tasks = [loop.run_in_executor(pool, score_csv_shard, header, shard, encoding) for shard in shards]
+    return list(await asyncio.gather(*tasks))
@@ -0,0 +1,182 @@
+# query.py
+from typing import Dict, Any, List, Optional, Tuple, Callable
+import numpy as np
+from scoring import FLAG_BITS, RISK_CLASSES, CONTRIB_KEYS
+from store import ResultStore, TYPED_INPUT_COLUMNS, ID_COLUMN
+
+SORTABLE_COLUMNS = list(TYPED_INPUT_COLUMNS) + ['raw_score', 'score_norm']
+
+MAX_PAGE_SIZE = 1000
+# rows examined per step when residual filters have to be checked row by row
+_SCAN_BLOCK = 4096
+
+class QueryIndex:
+    """
+    Read-side indexes over one ResultStore, built lazily and cached until the
+    store is written to again:
+      - per (column, risk class) row order sorted by the column, with sorted values
+      - Customer IDs in sorted order for prefix search
+      - per-flag boolean masks, unpacked from the stored flag bitmask
+    """
+    def __init__(self, store: ResultStore):
+        self.store = store
+        self._orders: Dict[Tuple[str, Optional[int]], Tuple[np.ndarray, np.ndarray]] = {}
+        self._ids_sorted = None
+        self._flags = None
+
+    def order(self, column: str, risk_code: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        key = (column, risk_code)
+        if key not in self._orders:
+            values = self.store.column(column)
+            if risk_code is None:
+                rows = np.argsort(values, kind='stable')
+            else:
+                base, _ = self.order(column)
+                rows = base[self.store.column('risk_code')[base] == risk_code]
+            self._orders[key] = (rows, values[rows])
+        return self._orders[key]
+
+    def prefix_rows(self, prefix: str) -> np.ndarray:
+        if self._ids_sorted is None:
+            ids = np.array(self.store.ids[:], dtype=str)
+            rows = np.argsort(ids, kind='stable')
+            self._ids_sorted = (rows, ids[rows])
+        rows, ids = self._ids_sorted
+        lo = np.searchsorted(ids, prefix, side='left')
+        hi = np.searchsorted(ids, prefix + chr(0x10ffff), side='left')
+        return np.sort(rows[lo:hi])
+
+    def flag_mask(self, flag: str) -> np.ndarray:
+        if flag not in FLAG_BITS:
+            raise ValueError(f"Unknown flag: {flag}")
+        if self._flags is None:
+            self._flags = {}
+        if flag not in self._flags:
+            bit = np.uint32(1 << FLAG_BITS.index(flag))
+            self._flags[flag] = (self.store.column('flag_bits') & bit) != 0
+        return self._flags[flag]
+
+def index_for(store: ResultStore) -> QueryIndex:
+    if store.indexes is None:
+        store.indexes = QueryIndex(store)
+    return store.indexes
+
+def query_records(store: ResultStore, score_min: Optional[float] = None, score_max: Optional[float] = None,
+                  risk_class: Optional[str] = None, flag: Optional[str] = None, id_prefix: Optional[str] = None,
+                  sort: str = 'score_norm', order: str = 'desc', offset: int = 0, limit: int = 50,
+                  cursor: Optional[int] = None, with_total: bool = False) -> Dict[str, Any]:
+    """
+    Filter, sort and page the scored records of a store.
+
+    Rows come from a presorted index on `sort` (per risk class when filtered by
+    class), a score range on score_norm narrows it by binary search, and only
+    the remaining filters (flag, score range on other sorts) are checked while
+    walking the index, so a page costs O(log n + rows examined). `cursor` is a
+    position in that walk returned as next_cursor; total is only counted for
+    residual filters when with_total is set.
+    """
+    if sort not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort!r}; choose one of {SORTABLE_COLUMNS}")
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    if risk_class is not None and risk_class not in RISK_CLASSES:
+        raise ValueError(f"risk_class must be one of {RISK_CLASSES}")
+    limit = max(0, min(int(limit), MAX_PAGE_SIZE))
+
+    idx = index_for(store)
+    risk_code = RISK_CLASSES.index(risk_class) if risk_class is not None else None
+    scores = store.column('score_norm')
+    predicates: List[Callable[[np.ndarray], np.ndarray]] = []
+
+    if id_prefix:
+        rows = idx.prefix_rows(id_prefix)
+        if risk_code is not None:
+            rows = rows[store.column('risk_code')[rows] == risk_code]
+        values = store.column(sort)[rows]
+        o = np.argsort(values, kind='stable')
+        rows, values = rows[o], values[o]
+    else:
+        rows, values = idx.order(sort, risk_code)
+
+    if score_min is not None or score_max is not None:
+        if sort == 'score_norm':
+            lo = 0 if score_min is None else np.searchsorted(values, score_min, side='left')
+            hi = len(rows) if score_max is None else np.searchsorted(values, score_max, side='right')
+            rows = rows[lo:max(lo, hi)]
+        else:
+            lo_v = -np.inf if score_min is None else score_min
+            hi_v = np.inf if score_max is None else score_max
+            predicates.append(lambda r: (scores[r] >= lo_v) & (scores[r] <= hi_v))
+    if flag:
+        mask = idx.flag_mask(flag)
+        predicates.append(lambda r: mask[r])
+
+    if order == 'desc':
+        rows = rows[::-1]
+
+    start = int(cursor or 0)
+    if not predicates:
+        start += offset
+        page = rows[start:start + limit]
+        end = start + len(page)
+        total = len(rows)
+    else:
+        page_parts = []
+        taken, skip, pos, end = 0, offset, start, len(rows)
+        while pos < len(rows) and taken < limit:
+            block = rows[pos:pos + _SCAN_BLOCK]
+            keep = np.ones(len(block), dtype=bool)
+            for p in predicates:
+                keep &= p(block)
+            hits = np.flatnonzero(keep)
+            if skip:
+                dropped = min(skip, len(hits))
+                hits, skip = hits[dropped:], skip - dropped
+            hits = hits[:limit - taken]
+            page_parts.append(block[hits])
+            taken += len(hits)
+            end = pos + int(hits[-1]) + 1 if taken == limit and len(hits) else min(pos + _SCAN_BLOCK, len(rows))
+            pos += _SCAN_BLOCK
+        page = np.concatenate(page_parts) if page_parts else rows[:0]
+        total = None
+        if with_total:
+            keep = np.ones(len(rows), dtype=bool)
+            for p in predicates:
+                keep &= p(rows)
+            total = int(keep.sum())
+
+    return {
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'next_cursor': end if end < len(rows) else None,
+        'records': [store.row(int(i)) for i in page]
+    }
+
+def worklist_records(store: ResultStore, n: int = 100, order: str = 'score') -> Dict[str, Any]:
+    """
+    The n highest-ranked customers by `order` (see worklist.py) with their
+    class, credit limit, exposure and top three score drivers. Rows come from
+    the store's bounded candidate set, so only those are ever sorted.
+    """
+    rows = store.get_worklist().top(order, n)
+    score = store.column('score_norm')[rows]
+    limit = store.column('Credit Limit')[rows]
+    exposure = np.where(np.isfinite(limit) & (limit > 0), limit, 0.0) * score
+    codes = store.column('risk_code')[rows]
+    top3 = store.column('top3')[rows].astype(np.int64)
+    top3_values = np.take_along_axis(store.column('contribs')[rows], top3, axis=1).round(6)
+    keys = np.array(CONTRIB_KEYS, dtype=object)[top3]
+    records = []
+    for j, (i, s, c, lim, e, names, values) in enumerate(zip(rows.tolist(), score.tolist(), codes.tolist(), limit.tolist(),
+                                                              exposure.round(2).tolist(), keys.tolist(), top3_values.tolist())):
+        records.append({
+            'rank': j + 1,
+            ID_COLUMN: store.ids[i],
+            'score_norm': s,
+            'risk_class': RISK_CLASSES[c],
+            'credit_limit': lim if lim == lim else None,
+            'exposure': e,
+            'top3_contribs': list(zip(names, values))
+        })
+    return {'order': order, 'n': len(records), 'total_customers': len(store), 'records': records}
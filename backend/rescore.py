@@ -0,0 +1,146 @@
+# rescore.py
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+from scoring import (score_features_batch, flag_counts_from_bits, blend_probs, DEFAULT_WEIGHTS,
+                     FLAG_THRESHOLDS, RISK_THRESHOLDS, RISK_CLASSES, FLAG_BITS)
+from store import ResultStore
+
+# parameter sets kept per store (LRU)
+RESCORE_CACHE_SIZE = int(os.environ.get('RESCORE_CACHE_SIZE', '8'))
+# quantiles reported for final_prob / rule_prob
+PROB_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+
+def resolve_params(weights: Optional[Dict[str, float]] = None,
+                   flag_thresholds: Optional[Dict[str, float]] = None,
+                   risk_thresholds: Optional[Dict[str, float]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Merge partial overrides onto the module defaults. Unknown keys raise
+    ValueError rather than being silently ignored.
+    """
+    params = {}
+    for name, defaults, override in (('weights', DEFAULT_WEIGHTS, weights),
+                                     ('flag_thresholds', FLAG_THRESHOLDS, flag_thresholds),
+                                     ('risk_thresholds', RISK_THRESHOLDS, risk_thresholds)):
+        override = override or {}
+        unknown = sorted(set(override) - set(defaults))
+        if unknown:
+            raise ValueError(f"Unknown {name} keys: {unknown}; expected some of {sorted(defaults)}")
+        params[name] = {k: float(override.get(k, v)) for k, v in defaults.items()}
+    if params['risk_thresholds']['low'] > params['risk_thresholds']['med']:
+        raise ValueError("risk_thresholds: 'low' must not exceed 'med'")
+    return params
+
+def params_key(params: Dict[str, Dict[str, float]]) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+class RescoreCache:
+    """
+    Small LRU of re-score results keyed by (store uid, store version, params key).
+    """
+    def __init__(self, maxsize: int = RESCORE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+RESCORE_CACHE = RescoreCache()
+
+def _flag_fired(bits: np.ndarray) -> np.ndarray:
+    # customers per flag (FLAG_BITS order) with that flag raised
+    bits = np.asarray(bits, dtype=np.uint32)
+    return np.array([np.count_nonzero(bits & np.uint32(1 << i)) for i in range(len(FLAG_BITS))], dtype=np.int64)
+
+def _prob_summary(values: np.ndarray) -> Dict[str, Any]:
+    if not len(values):
+        return {'mean': None, 'quantiles': {str(q): None for q in PROB_QUANTILES}}
+    qs = np.quantile(values, PROB_QUANTILES)
+    return {'mean': round(float(values.mean()), 6),
+            'quantiles': {str(q): round(float(v), 6) for q, v in zip(PROB_QUANTILES, qs.tolist())}}
+
+def rescore(store: ResultStore, params: Dict[str, Dict[str, float]], cache: RescoreCache = RESCORE_CACHE) -> Tuple[Dict[str, Any], bool]:
+    """
+    Re-score every customer of a store under `params` (see resolve_params),
+    starting from the store's cached sanitized features instead of the CSV.
+    Flags (flag_thresholds) never move risk classes, which come from
+    score_norm alone, so they are compared with the stored flag bitmasks and
+    through the rule and final probabilities they feed.
+    Returns (result, served_from_cache).
+    """
+    key = (store.uid, store.version, params_key(params))
+    result = cache.get(key)
+    if result is not None:
+        return result, True
+
+    res = score_features_batch(store.features(), params['weights'],
+                               params['flag_thresholds'], params['risk_thresholds'], with_top3=False)
+    k = len(RISK_CLASSES)
+    counts = np.bincount(res['risk_code'], minlength=k)
+    migration = np.bincount(store.column('risk_code').astype(np.int64) * k + res['risk_code'], minlength=k * k).reshape(k, k)
+    # the stored result's probabilities, rebuilt from its flag bits
+    bits = store.column('flag_bits')
+    rule_prob, final_prob = blend_probs(store.column('score_norm'), flag_counts_from_bits(bits))
+    result = {
+        'params_key': key[2],
+        'score_norm': res['score_norm'],
+        'risk_code': res['risk_code'],
+        'final_prob': res['final_prob'],
+        'rule_prob': res['rule_prob'],
+        'flag_bits': res['flag_bits'],
+        'class_counts': counts,
+        'migration': migration,
+        'flag_fired': _flag_fired(res['flag_bits']),
+        'flag_fired_current': _flag_fired(bits),
+        'flags_changed': int(np.count_nonzero(res['flag_bits'] != bits)),
+        'probs': {name: {'current': _prob_summary(cur), 'new': _prob_summary(new)}
+                  for name, cur, new in (('final_prob', final_prob, res['final_prob']),
+                                         ('rule_prob', rule_prob, res['rule_prob']))}
+    }
+    cache.put(key, result)
+    return result, False
+
+def rescore_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    low, medium, high = result['class_counts'].tolist()
+    migration = result['migration']
+    return {
+        'params_key': result['params_key'],
+        'total_customers': int(migration.sum()),
+        'high_risk': high,
+        'medium_risk': medium,
+        'low_risk': low,
+        # rows: class under the current scoring, columns: class under the new params
+        'class_changes': {
+            RISK_CLASSES[i]: {RISK_CLASSES[j]: int(migration[i, j]) for j in range(len(RISK_CLASSES))}
+            for i in range(len(RISK_CLASSES))
+        },
+        'changed': int(migration.sum() - np.trace(migration)),
+        # customers with each flag raised under the new params, and the change
+        'flags': {
+            f: {'fired': int(n), 'current': int(c), 'delta': int(n - c)}
+            for f, n, c in zip(FLAG_BITS, result['flag_fired'].tolist(), result['flag_fired_current'].tolist())
+        },
+        'flags_changed': result['flags_changed'],
+        'final_prob': result['probs']['final_prob'],
+        'rule_prob': result['probs']['rule_prob']
+    }
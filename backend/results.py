@@ -0,0 +1,104 @@
+# results.py
+"""
+Scored uploads kept side by side, keyed by upload ID (the store's uid).
+
+A result set is published only once it is completely scored and is never
+written to afterwards, so a request that picked one up keeps a consistent
+view even if newer uploads land or the set is evicted meanwhile. In-memory
+sets are held under RESULTS_MAX_BYTES and evicted least-recently-used first
+(the latest upload always stays); with snapshots enabled an evicted or
+unseen upload ID is mapped back from disk on demand.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import snapshot
+from store import ResultStore
+
+RESULTS_MAX_BYTES = int(os.environ.get('RESULTS_MAX_BYTES', str(1 << 30)))
+
+class ResultRegistry:
+    def __init__(self, max_bytes: int = RESULTS_MAX_BYTES, snapshots: Optional[snapshot.SnapshotWatcher] = None):
+        self.max_bytes = max_bytes
+        self.snapshots = snapshots
+        self._items: "OrderedDict[str, ResultStore]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._added: Dict[str, float] = {}
+        self._latest: Optional[str] = None
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, store: ResultStore, latest: bool = True) -> str:
+        uid = store.uid
+        size = store.memory_bytes()
+        with self._lock:
+            self._items[uid] = store
+            self._items.move_to_end(uid)
+            self._bytes[uid] = size
+            self._added.setdefault(uid, time.time())
+            if latest:
+                self._latest = uid
+            self._evict()
+        return uid
+
+    def _evict(self):
+        total = sum(self._bytes.values())
+        for uid in list(self._items):
+            if total <= self.max_bytes:
+                break
+            if uid == self._latest:
+                continue
+            del self._items[uid]
+            total -= self._bytes.pop(uid)
+            self._added.pop(uid, None)
+            self.evictions += 1
+
+    def get(self, upload_id: str) -> Optional[ResultStore]:
+        with self._lock:
+            store = self._items.get(upload_id)
+            if store is not None:
+                self._items.move_to_end(upload_id)
+                return store
+        if self.snapshots is None:
+            return None
+        store = self.snapshots.load(upload_id)
+        if store is not None:
+            self.add(store, latest=False)
+        return store
+
+    def latest(self) -> Optional[ResultStore]:
+        # follow the snapshot pointer so uploads handled by other workers (or
+        # before a restart) become the latest here too
+        if self.snapshots is not None:
+            changed, uid = self.snapshots.check()
+            if changed and uid is not None and uid != self._latest:
+                store = self.get(uid)
+                if store is not None:
+                    with self._lock:
+                        self._latest = uid
+        if self._latest is None:
+            return None
+        return self.get(self._latest)
+
+    def total_bytes(self) -> int:
+        return sum(self._bytes.values())
+
+    def describe(self) -> List[Dict[str, Any]]:
+        # most recently used first
+        with self._lock:
+            items = list(self._items.items())[::-1]
+        return [{
+            'upload_id': uid,
+            'version': store.version,
+            'total_customers': len(store),
+            'bytes': self._bytes.get(uid, 0),
+            'latest': uid == self._latest,
+            'snapshot': store.readonly,
+            'added_at': self._added.get(uid)
+        } for uid, store in items]
@@ -0,0 +1,119 @@
+# schema.py
+from typing import Dict, Any, List, Optional
+import numpy as np
+from scoring import FEATURE_ALIASES, to_float_safe
+
+# canonical output header (REQUIRED_COLUMNS) -> (column key, accepted header aliases, first wins)
+SCHEMA_FIELDS = {
+    'Customer ID': ('customer_id', ['Customer ID', 'Customer_ID', 'CustomerID']),
+    'Credit Limit': ('credit_limit', FEATURE_ALIASES['credit_limit']),
+    'Utilisation %': ('util', FEATURE_ALIASES['util']),
+    'Avg Payment Ratio': ('avg_pay', FEATURE_ALIASES['avg_pay']),
+    'Min Due Paid Frequency': ('minpaid', FEATURE_ALIASES['minpaid']),
+    'Merchant Mix Index': ('merchant', FEATURE_ALIASES['merchant']),
+    'Cash Withdrawal %': ('cash', FEATURE_ALIASES['cash']),
+    'Recent Spend Change %': ('spend_change', FEATURE_ALIASES['spend_change']),
+    'DPD Bucket Next Month': ('dpd', ['DPD Bucket Next Month', 'DPD_Bucket_Next_Month'])
+}
+
+class CsvSchema:
+    """
+    Header of one CSV file resolved against SCHEMA_FIELDS, once per file.
+
+    fields maps each canonical name to the column index it is read from,
+    aliases to the header name that was picked, missing lists canonical names
+    with no matching column. Other columns are extras (passed through as text).
+    output_header is the file's header with picked aliases renamed to their
+    canonical names.
+    """
+    def __init__(self, header: List[str]):
+        self.header = [h.strip() for h in header]
+        self.fields: Dict[str, int] = {}
+        self.aliases: Dict[str, str] = {}
+        for name, (_, aliases) in SCHEMA_FIELDS.items():
+            for a in aliases:
+                if a in self.header:
+                    self.fields[name] = self.header.index(a)
+                    self.aliases[name] = a
+                    break
+        self.missing = [name for name in SCHEMA_FIELDS if name not in self.fields]
+
+        used = {i: name for name, i in self.fields.items()}
+        self.output_header = [used.get(i, h) for i, h in enumerate(self.header)]
+        self.extras = {h: i for i, h in enumerate(self.header) if i not in used}
+
+    def describe(self) -> Dict[str, Any]:
+        return {'columns': dict(self.aliases), 'missing': list(self.missing)}
+
+def resolve_schema(header: Optional[List[str]]) -> CsvSchema:
+    return CsvSchema(header or [])
+
+def _cells(rows: List[List[str]], idx: int) -> List[Optional[str]]:
+    try:
+        return [r[idx] for r in rows]
+    except IndexError:
+        # short rows: missing cells read as None, like csv.DictReader
+        return [r[idx] if idx < len(r) else None for r in rows]
+
+def decode_float_column(cells: List[Optional[str]]):
+    """
+    Decode one column of text cells to float64 with to_float_safe semantics.
+    Returns (values, parse_errors, blanks). Clean columns go through float()
+    in one C-level pass; only columns with bad cells are decoded cell by cell.
+    """
+    try:
+        return np.fromiter(map(float, cells), dtype=np.float64, count=len(cells)), 0, 0
+    except (ValueError, TypeError):
+        pass
+    out = np.empty(len(cells), dtype=np.float64)
+    errors = blanks = 0
+    for i, v in enumerate(cells):
+        try:
+            out[i] = float(v)
+            continue
+        except (ValueError, TypeError):
+            pass
+        if v is None or v.strip() == '':
+            blanks += 1
+            out[i] = 0.0
+            continue
+        out[i] = to_float_safe(v)
+        s = v.strip()
+        if s.endswith('%'):
+            s = s[:-1].strip()
+        try:
+            float(s.replace(',', ''))
+        except ValueError:
+            errors += 1
+    return out, errors, blanks
+
+class ColumnDecoder:
+    """
+    Turns parsed CSV rows (lists of cells) into typed columns using a resolved
+    CsvSchema, keeping per-field counts of unparseable and blank cells.
+    """
+    def __init__(self, schema: CsvSchema):
+        self.schema = schema
+
+    def decode(self, rows: List[List[str]]) -> Dict[str, Any]:
+        """
+        Returns {'ids', 'columns' (column key -> float64 array, incl. 'dpd'),
+        'text' (canonical name -> the same cells as read), 'extras' (header ->
+        stripped text), 'stats'} for a chunk of rows.
+        """
+        columns, text, errors, blanks = {}, {}, {}, {}
+        ids: List[str] = []
+        for name, idx in self.schema.fields.items():
+            key = SCHEMA_FIELDS[name][0]
+            cells = _cells(rows, idx)
+            if key == 'customer_id':
+                ids = [str(c.strip()) if isinstance(c, str) else str(c) for c in cells]
+                continue
+            columns[key], errors[name], blanks[name] = decode_float_column(cells)
+            text[name] = cells
+        extras = {
+            h: [c.strip() if isinstance(c, str) else c for c in _cells(rows, idx)]
+            for h, idx in self.schema.extras.items()
+        }
+        return {'ids': ids, 'columns': columns, 'text': text, 'extras': extras,
+                'stats': {'parse_errors': errors, 'blank_cells': blanks}}
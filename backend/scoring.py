@@ -1,6 +1,9 @@
 # scoring.py
 from typing import Dict, Any, List, Tuple
+import functools
 import math
+import numpy as np
+from metrics import instrument
 
 # Weights (tuned defaults)
 DEFAULT_WEIGHTS = {
@@ -60,15 +63,27 @@ def _first_present(row: Dict[str, Any], keys: List[str], default=None):
             return row[k]
     return default
 
+# header aliases accepted for each raw input column (first present wins)
+FEATURE_ALIASES = {
+    'util': ['Utilisation %', 'Utilisation_pct', 'Utilisation', 'Utilization_pct', 'Utilization'],
+    'avg_pay': ['Avg Payment Ratio', 'Avg_Payment_Ratio', 'AvgPaymentRatio'],
+    'minpaid': ['Min Due Paid Frequency', 'Min_Due_Paid_Frequency', 'MinDuePaidFreq'],
+    'cash': ['Cash Withdrawal %', 'Cash_Withdrawal_pct', 'Cash_pct'],
+    'spend_change': ['Recent Spend Change %', 'Recent_Spend_Change_pct', 'RecentSpendChangePct'],
+    'merchant': ['Merchant Mix Index', 'Merchant_Mix_Index', 'MerchantMixIndex'],
+    'credit_limit': ['Credit Limit', 'Credit_Limit', 'Limit']
+}
+
 # -- sanitize
+@instrument(per_row=True)
 def sanitize_row(row: Dict[str, Any]) -> Dict[str, float]:
-    util_raw = to_float_safe(_first_present(row, ['Utilisation %', 'Utilisation_pct', 'Utilisation', 'Utilization_pct', 'Utilization'], 0.0))
-    avg_pay_raw = to_float_safe(_first_present(row, ['Avg Payment Ratio', 'Avg_Payment_Ratio', 'AvgPaymentRatio'], 0.0))
-    minpaid_raw = to_float_safe(_first_present(row, ['Min Due Paid Frequency', 'Min_Due_Paid_Frequency', 'MinDuePaidFreq'], 0.0))
-    cash_raw = to_float_safe(_first_present(row, ['Cash Withdrawal %', 'Cash_Withdrawal_pct', 'Cash_pct'], 0.0))
-    spend_change_raw = to_float_safe(_first_present(row, ['Recent Spend Change %', 'Recent_Spend_Change_pct', 'RecentSpendChangePct'], 0.0))
-    merchant_raw = to_float_safe(_first_present(row, ['Merchant Mix Index', 'Merchant_Mix_Index', 'MerchantMixIndex'], 0.0))
-    credit_limit_raw = to_float_safe(_first_present(row, ['Credit Limit', 'Credit_Limit', 'Limit'], 0.0))
+    util_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['util'], 0.0))
+    avg_pay_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['avg_pay'], 0.0))
+    minpaid_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['minpaid'], 0.0))
+    cash_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['cash'], 0.0))
+    spend_change_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['spend_change'], 0.0))
+    merchant_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['merchant'], 0.0))
+    credit_limit_raw = to_float_safe(_first_present(row, FEATURE_ALIASES['credit_limit'], 0.0))
 
     util_pct = max(0.0, min(100.0, util_raw))
     avg_pay = avg_pay_raw
@@ -108,6 +123,7 @@ def sanitize_row(row: Dict[str, Any]) -> Dict[str, float]:
     }
 
 # -- feature score
+@instrument(per_row=True)
 def compute_feature_score(features: Dict[str, float], weights: Dict[str, float]=None) -> Dict[str, Any]:
     if weights is None:
         weights = DEFAULT_WEIGHTS
@@ -140,52 +156,91 @@ def compute_feature_score(features: Dict[str, float], weights: Dict[str, float]=
     return {'raw_score': round(raw_score, 6), 'score_norm': round(score_norm, 6), 'contribs': contribs, 'top3': top3}
 
 # -- flags
+# flag -> (severity, reason template over the display features), in get_flags
+# order; bit i of a flag bitmask is FLAG_BITS[i]
+FLAG_REASONS = {
+    'spend_high': ('high', 'Large spend change: {spend_change_pct:+.0f}%'),
+    'pay_low': ('high', 'Low avg payment ratio: {avg_pay:.2f}'),
+    'minpaid_high': ('high', 'Pays min-due frequently: {minpaid_pct:.0f}%'),
+    'util_high': ('high', 'High utilisation: {util_pct:.0f}%'),
+    'cash_high': ('high', 'High cash withdrawal: {cash_pct:.0f}%'),
+    'merchant_low': ('high', 'Low merchant diversification: {merchant_mix:.2f}'),
+    'spend_med': ('medium', 'Moderate spend change: {spend_change_pct:+.0f}%'),
+    'pay_med': ('medium', 'Declining payment ratio: {avg_pay:.2f}'),
+    'minpaid_med': ('medium', 'Occasional min-due payments: {minpaid_pct:.0f}%'),
+    'util_med': ('medium', 'Elevated utilisation: {util_pct:.0f}%'),
+    'cash_med': ('medium', 'Moderate cash withdrawal: {cash_pct:.0f}%'),
+    'merchant_med': ('medium', 'Below-average merchant diversification: {merchant_mix:.2f}'),
+    'util_low': ('low_support', 'Low utilisation: {util_pct:.0f}%'),
+    'pay_high': ('low_support', 'High avg payment ratio: {avg_pay:.2f}'),
+    'minpaid_low': ('low_support', 'Rarely pays only min due: {minpaid_pct:.0f}%'),
+    'spend_stable': ('low_support', 'Spend stable: {spend_change_pct:+.0f}%'),
+    'cash_low': ('low_support', 'Low cash withdrawal: {cash_pct:.0f}%')
+}
+FLAG_BITS = list(FLAG_REASONS)
+FLAG_SEVERITIES = ['high', 'medium', 'low_support']
+
+def _flag_values(features: Dict[str, float]) -> Dict[str, float]:
+    # the display features the reason templates read, with get_flags' defaults
+    return {
+        'spend_change_pct': features.get('spend_change_pct', 0.0),
+        'avg_pay': features.get('avg_pay', 1.0),
+        'minpaid_pct': features.get('minpaid_pct', 0.0),
+        'util_pct': features.get('util_pct', 0.0),
+        'cash_pct': features.get('cash_pct', 0.0),
+        'merchant_mix': features.get('merchant_mix', 0.0)
+    }
+
+def flag_reason(flag: str, values: Dict[str, float]) -> Tuple[str, str]:
+    return flag, FLAG_REASONS[flag][1].format(**values)
+
+@instrument(per_row=True)
 def get_flags(features: Dict[str, float]) -> Dict[str, List[Tuple[str, str]]]:
     flags = {'high': [], 'medium': [], 'low_support': []}
-    spend_abs = abs(features.get('spend_change_pct', 0.0))
-    spend_signed = features.get('spend_change_pct', 0.0)
-    avg_pay = features.get('avg_pay', 1.0)
-    minpaid = features.get('minpaid_pct', 0.0)
-    util = features.get('util_pct', 0.0)
-    cash = features.get('cash_pct', 0.0)
-    merchant = features.get('merchant_mix', 0.0)
+    v = _flag_values(features)
+    spend_abs = abs(v['spend_change_pct'])
+    avg_pay = v['avg_pay']
+    minpaid = v['minpaid_pct']
+    util = v['util_pct']
+    cash = v['cash_pct']
+    merchant = v['merchant_mix']
 
     if spend_abs >= FLAG_THRESHOLDS['spend_high_abs_pct']:
-        flags['high'].append(('spend_high', f'Large spend change: {spend_signed:+.0f}%'))
+        flags['high'].append(flag_reason('spend_high', v))
     if avg_pay <= FLAG_THRESHOLDS['pay_low_frac']:
-        flags['high'].append(('pay_low', f'Low avg payment ratio: {avg_pay:.2f}'))
+        flags['high'].append(flag_reason('pay_low', v))
     if minpaid >= FLAG_THRESHOLDS['minpaid_high_pct']:
-        flags['high'].append(('minpaid_high', f'Pays min-due frequently: {minpaid:.0f}%'))
+        flags['high'].append(flag_reason('minpaid_high', v))
     if util >= FLAG_THRESHOLDS['util_high_pct']:
-        flags['high'].append(('util_high', f'High utilisation: {util:.0f}%'))
+        flags['high'].append(flag_reason('util_high', v))
     if cash >= FLAG_THRESHOLDS['cash_high_pct']:
-        flags['high'].append(('cash_high', f'High cash withdrawal: {cash:.0f}%'))
+        flags['high'].append(flag_reason('cash_high', v))
     if merchant <= FLAG_THRESHOLDS['merchant_low']:
-        flags['high'].append(('merchant_low', f'Low merchant diversification: {merchant:.2f}'))
+        flags['high'].append(flag_reason('merchant_low', v))
 
     if FLAG_THRESHOLDS['spend_med_abs_pct'] <= spend_abs < FLAG_THRESHOLDS['spend_high_abs_pct']:
-        flags['medium'].append(('spend_med', f'Moderate spend change: {spend_signed:+.0f}%'))
+        flags['medium'].append(flag_reason('spend_med', v))
     if FLAG_THRESHOLDS['pay_low_frac'] < avg_pay <= FLAG_THRESHOLDS['pay_med_frac']:
-        flags['medium'].append(('pay_med', f'Declining payment ratio: {avg_pay:.2f}'))
+        flags['medium'].append(flag_reason('pay_med', v))
     if FLAG_THRESHOLDS['minpaid_med_pct'] <= minpaid < FLAG_THRESHOLDS['minpaid_high_pct']:
-        flags['medium'].append(('minpaid_med', f'Occasional min-due payments: {minpaid:.0f}%'))
+        flags['medium'].append(flag_reason('minpaid_med', v))
     if FLAG_THRESHOLDS['util_med_pct'] <= util < FLAG_THRESHOLDS['util_high_pct']:
-        flags['medium'].append(('util_med', f'Elevated utilisation: {util:.0f}%'))
+        flags['medium'].append(flag_reason('util_med', v))
     if FLAG_THRESHOLDS['cash_med_pct'] <= cash < FLAG_THRESHOLDS['cash_high_pct']:
-        flags['medium'].append(('cash_med', f'Moderate cash withdrawal: {cash:.0f}%'))
+        flags['medium'].append(flag_reason('cash_med', v))
     if FLAG_THRESHOLDS['merchant_med'] >= merchant > FLAG_THRESHOLDS['merchant_low']:
-        flags['medium'].append(('merchant_med', f'Below-average merchant diversification: {merchant:.2f}'))
+        flags['medium'].append(flag_reason('merchant_med', v))
 
     if util < 30.0:
-        flags['low_support'].append(('util_low', f'Low utilisation: {util:.0f}%'))
+        flags['low_support'].append(flag_reason('util_low', v))
     if avg_pay >= 0.8:
-        flags['low_support'].append(('pay_high', f'High avg payment ratio: {avg_pay:.2f}'))
+        flags['low_support'].append(flag_reason('pay_high', v))
     if minpaid < 15.0:
-        flags['low_support'].append(('minpaid_low', f'Rarely pays only min due: {minpaid:.0f}%'))
+        flags['low_support'].append(flag_reason('minpaid_low', v))
     if spend_abs < 5.0:
-        flags['low_support'].append(('spend_stable', f'Spend stable: {spend_signed:+.0f}%'))
+        flags['low_support'].append(flag_reason('spend_stable', v))
     if cash < 10.0:
-        flags['low_support'].append(('cash_low', f'Low cash withdrawal: {cash:.0f}%'))
+        flags['low_support'].append(flag_reason('cash_low', v))
 
     return flags
 
@@ -198,46 +253,65 @@ def compute_rule_score(flags: Dict[str, List[Tuple[str, str]]]) -> Tuple[float,
     return score, {'n_high': n_high, 'n_med': n_med, 'n_low_support': n_low}
 
 # -- recommended actions
+# risk class -> (actions always listed, [(condition on the features, action)]);
+# conditions work on scalars and on whole feature columns alike
+ACTION_TEMPLATES = {
+    'High': ([
+        "Immediate call within 24 hours to assess hardship & offer EMI restructuring.",
+        "Send urgent SMS + email reminder with payment/repayment options."
+    ], [
+        (lambda f: f['spend_change_pct'] <= -15.0, "Large reduction in spending — discuss income/expense shock."),
+        (lambda f: f['spend_change_pct'] >= 15.0, "Sudden spike in spending — review for potential fraud or unsustainable spend."),
+        (lambda f: f['util_pct'] >= 85.0, "Consider temporary soft limit-reduction or alert to prevent over-limit fees."),
+        (lambda f: f['cash_pct'] >= 30.0, "Review cash withdrawal pattern; recommend limiting cash advances (high interest).")
+    ]),
+    'Medium': ([
+        "Send friendly reminder (SMS/email) about upcoming payment; suggest minimum payment.",
+        "Suggest enabling auto-debit or scheduled payment to avoid missed payments."
+    ], [
+        (lambda f: f['avg_pay'] < 0.5, "Recommend increasing payment amount toward statement balance (show impact)."),
+        (lambda f: abs(f['spend_change_pct']) >= 10.0, "Notify customer about recent change in spend and recommend review of expenses."),
+        (lambda f: f['util_pct'] >= 60.0, "Advise to reduce discretionary spending; show utilization alert.")
+    ]),
+    'Low': ([
+        "No immediate collection action required — monitor account.",
+        "Consider cross-sell: pre-approved offers or limit enhancement if eligible."
+    ], [
+        (lambda f: f['avg_pay'] >= 0.8, "Customer is good payer — consider loyalty offer or reward.")
+    ])
+}
+MAX_ACTIONS = 5
+
+def action_code(risk_class: str, features: Dict[str, float]) -> int:
+    """
+    Action template code: bits 0-1 the risk class (index into RISK_CLASSES),
+    bit 2+j set when the class's j-th conditional action applies.
+    """
+    f = {
+        'spend_change_pct': features.get('spend_change_pct', 0.0),
+        'util_pct': features.get('util_pct', 0.0),
+        'avg_pay': features.get('avg_pay', 1.0),
+        'cash_pct': features.get('cash_pct', 0.0)
+    }
+    # anything but High / Medium gets the Low template
+    code = RISK_CLASSES.index(risk_class) if risk_class in RISK_CLASSES else 0
+    for j, (cond, _) in enumerate(ACTION_TEMPLATES[RISK_CLASSES[code]][1]):
+        if cond(f):
+            code |= 1 << (2 + j)
+    return code
+
+@functools.lru_cache(maxsize=None)
+def actions_for_code(code: int) -> Tuple[str, ...]:
+    fixed, conditional = ACTION_TEMPLATES[RISK_CLASSES[code & 3]]
+    actions = list(fixed) + [text for j, (_, text) in enumerate(conditional) if code >> (2 + j) & 1]
+    return tuple(actions[:MAX_ACTIONS])
+
+@instrument(per_row=True)
 def get_recommended_actions(risk_class: str, features: Dict[str, float], flags: Dict[str, Any]) -> List[str]:
-    actions: List[str] = []
-    spend_change = features.get('spend_change_pct', 0.0)
-    util = features.get('util_pct', 0.0)
-    avg_pay = features.get('avg_pay', 1.0)
-    minpaid = features.get('minpaid_pct', 0.0)
-    cash = features.get('cash_pct', 0.0)
-    merchant = features.get('merchant_mix', 0.0)
-
-    if risk_class == 'High':
-        actions.append("Immediate call within 24 hours to assess hardship & offer EMI restructuring.")
-        actions.append("Send urgent SMS + email reminder with payment/repayment options.")
-        if spend_change <= -15.0:
-            actions.append("Large reduction in spending — discuss income/expense shock.")
-        if spend_change >= 15.0:
-            actions.append("Sudden spike in spending — review for potential fraud or unsustainable spend.")
-        if util >= 85.0:
-            actions.append("Consider temporary soft limit-reduction or alert to prevent over-limit fees.")
-        if cash >= 30.0:
-            actions.append("Review cash withdrawal pattern; recommend limiting cash advances (high interest).")
-        return actions[:5]
-
-    if risk_class == 'Medium':
-        actions.append("Send friendly reminder (SMS/email) about upcoming payment; suggest minimum payment.")
-        actions.append("Suggest enabling auto-debit or scheduled payment to avoid missed payments.")
-        if avg_pay < 0.5:
-            actions.append("Recommend increasing payment amount toward statement balance (show impact).")
-        if abs(spend_change) >= 10.0:
-            actions.append("Notify customer about recent change in spend and recommend review of expenses.")
-        if util >= 60.0:
-            actions.append("Advise to reduce discretionary spending; show utilization alert.")
-        return actions[:5]
-
-    actions.append("No immediate collection action required — monitor account.")
-    actions.append("Consider cross-sell: pre-approved offers or limit enhancement if eligible.")
-    if avg_pay >= 0.8:
-        actions.append("Customer is good payer — consider loyalty offer or reward.")
-    return actions[:5]
+    return list(actions_for_code(action_code(risk_class, features)))
 
 # -- main scoring
+@instrument(per_row=True)
 def score_row(row: Dict[str, Any], weights: Dict[str, float]=None) -> Dict[str, Any]:
     if weights is None:
         weights = DEFAULT_WEIGHTS
@@ -298,3 +372,313 @@ def score_row(row: Dict[str, Any], weights: Dict[str, float]=None) -> Dict[str,
 
     return out
 
+
+# -- batch scoring (columnar)
+# Column-at-a-time mirror of score_row: every step below reproduces the scalar
+# arithmetic (same operation order, same clamping and rounding semantics) so
+# results are identical to score_row, just without the per-row Python work.
+CONTRIB_KEYS = ['spend', 'pay', 'minpaid', 'util', 'cash', 'merchant']
+RISK_CLASSES = ['Low', 'Medium', 'High']
+_CONTRIB_NAME_RANK = np.argsort(np.argsort(CONTRIB_KEYS))
+
+def _clamp(x: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    # same semantics as max(lo, min(hi, x)), including NaN handling
+    m = np.where(x < hi, x, hi)
+    return np.where(m > lo, m, lo)
+
+_SPLIT = 134217729.0  # 2**27 + 1, Veltkamp splitting constant
+
+def _round(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Vectorized equivalent of the builtin round(v, ndigits), bit for bit.
+
+    round() decides on the exact binary value of v. x * 10**ndigits is only
+    off by its rounding error, which matters just when the product lands
+    exactly on a .5: for those cells the error is recovered exactly (Dekker
+    two-product) and decides the direction, half-to-even on true ties. Cells
+    whose scaled value is not below 2**52 (or not finite) use the builtin.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    with np.errstate(invalid='ignore', over='ignore'):
+        p = x * scale
+        n0 = np.floor(p)
+        d = (p - n0) - 0.5
+        up = d > 0
+
+        ties = np.flatnonzero(d == 0)
+        if ties.size:
+            xt, pt, nt = x[ties], p[ties], n0[ties]
+            c = _SPLIT * xt
+            xh = c - (c - xt)
+            xl = xt - xh
+            c = _SPLIT * scale
+            sh = c - (c - scale)
+            sl = scale - sh
+            err = ((xh * sh - pt) + xh * sl + xl * sh) + xl * sl
+            up[ties] = (err > 0) | ((err == 0) & (np.fmod(nt, 2.0) != 0))
+
+        # copysign keeps -0.0 for small negatives, as round() does
+        out = np.copysign((n0 + up) / scale, x)
+
+    idx = np.flatnonzero(~(np.abs(p) < 2.0 ** 52))
+    if idx.size:
+        out[idx] = [round(v, ndigits) if v == v else v for v in x[idx].tolist()]
+    return out
+
+@instrument()
+def sanitize_batch(columns: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    util_raw = np.asarray(columns['util'], dtype=np.float64)
+    avg_pay_raw = np.asarray(columns['avg_pay'], dtype=np.float64)
+    minpaid_raw = np.asarray(columns['minpaid'], dtype=np.float64)
+    cash_raw = np.asarray(columns['cash'], dtype=np.float64)
+    spend_change_raw = np.asarray(columns['spend_change'], dtype=np.float64)
+    merchant_raw = np.asarray(columns['merchant'], dtype=np.float64)
+    credit_limit_raw = np.asarray(columns['credit_limit'], dtype=np.float64)
+
+    util_pct = _clamp(util_raw, 0.0, 100.0)
+    avg_pay = np.where(avg_pay_raw > 1.0, _clamp(avg_pay_raw, 0.0, 100.0) / 100.0, avg_pay_raw)
+    avg_pay = _clamp(avg_pay, 0.0, 1.0)
+    minpaid_pct = _clamp(minpaid_raw, 0.0, 100.0)
+    cash_pct = _clamp(cash_raw, 0.0, 100.0)
+    spend_change_pct = _clamp(spend_change_raw, -100.0, 100.0)
+
+    merchant = np.where(merchant_raw > 1.5, _clamp(merchant_raw, 0.0, 100.0) / 100.0, merchant_raw)
+    merchant = _clamp(merchant, 0.0, 1.0)
+
+    return {
+        'f_spend': np.abs(spend_change_pct) / 100.0,
+        'f_pay': 1.0 - avg_pay,
+        'f_minpaid': minpaid_pct / 100.0,
+        'f_util': util_pct / 100.0,
+        'f_cash': cash_pct / 100.0,
+        'f_merchant': 1.0 - merchant,
+        'util_pct': _round(util_pct, 2),
+        'avg_pay': _round(avg_pay, 3),
+        'minpaid_pct': _round(minpaid_pct, 2),
+        'cash_pct': _round(cash_pct, 2),
+        'spend_change_pct': _round(spend_change_pct, 2),
+        'merchant_mix': _round(merchant, 3),
+        'credit_limit': _round(credit_limit_raw, 2)
+    }
+
+# raw inputs sanitize_row reads, in the order input_hash_batch mixes them
+SCORING_INPUTS = list(FEATURE_ALIASES)
+_HASH_MUL = np.uint64(0x9E3779B97F4A7C15)
+_HASH_SHIFT = np.uint64(32)
+
+@instrument()
+def input_hash_batch(columns: Dict[str, Any]) -> np.ndarray:
+    """
+    64-bit hash per row over the float64 bit patterns of SCORING_INPUTS; rows
+    with equal hashes get identical scores (up to 64-bit collisions).
+    """
+    n = len(columns[SCORING_INPUTS[0]])
+    h = np.zeros(n, dtype=np.uint64)
+    for key in SCORING_INPUTS:
+        h ^= np.ascontiguousarray(columns[key], dtype=np.float64).view(np.uint64)
+        h *= _HASH_MUL
+        h ^= h >> _HASH_SHIFT
+    return h
+
+@instrument()
+def compute_feature_score_batch(features: Dict[str, np.ndarray], weights: Dict[str, float]=None,
+                                with_top3: bool=True) -> Dict[str, np.ndarray]:
+    """
+    Vectorized compute_feature_score. contribs is an (n, 6) array in CONTRIB_KEYS
+    order; top3 holds the matching column indices, ordered as score_row orders
+    them (None when with_top3 is False).
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+
+    w = [float(weights.get(k, 0.0)) for k in CONTRIB_KEYS]
+    bias = float(weights.get('bias', 0.0))
+
+    contribs = np.empty((len(features['f_spend']), len(CONTRIB_KEYS)), dtype=np.float64)
+    raw_score = 0
+    for j, k in enumerate(CONTRIB_KEYS):
+        contribs[:, j] = _round(w[j] * features['f_' + k], 6)
+        raw_score = raw_score + contribs[:, j]
+    raw_score = raw_score + bias
+
+    max_possible = (w[0] + w[1] + w[2] + w[3] + w[4] + w[5]) or 1.0
+    score_norm = _clamp(raw_score / (max_possible + 1e-12), 0.0, 1.0)
+
+    top3 = None
+    if with_top3:
+        # descending by (abs(contrib), key name), as in compute_feature_score
+        abs_c = np.abs(contribs)
+        rank = np.broadcast_to(-_CONTRIB_NAME_RANK, abs_c.shape)
+        top3 = np.lexsort((rank, -abs_c), axis=-1)[:, :3]
+
+    return {'raw_score': _round(raw_score, 6), 'score_norm': _round(score_norm, 6), 'contribs': contribs, 'top3': top3}
+
+@instrument()
+def flag_masks_batch(features: Dict[str, np.ndarray], flag_thresholds: Dict[str, float]=None) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Vectorized get_flags: severity -> {flag name: boolean array}, same flags,
+    thresholds and order as get_flags (without the reason strings).
+    """
+    spend_abs = np.abs(features['spend_change_pct'])
+    avg_pay = features['avg_pay']
+    minpaid = features['minpaid_pct']
+    util = features['util_pct']
+    cash = features['cash_pct']
+    merchant = features['merchant_mix']
+    t = FLAG_THRESHOLDS if flag_thresholds is None else flag_thresholds
+
+    return {
+        'high': {
+            'spend_high': spend_abs >= t['spend_high_abs_pct'],
+            'pay_low': avg_pay <= t['pay_low_frac'],
+            'minpaid_high': minpaid >= t['minpaid_high_pct'],
+            'util_high': util >= t['util_high_pct'],
+            'cash_high': cash >= t['cash_high_pct'],
+            'merchant_low': merchant <= t['merchant_low']
+        },
+        'medium': {
+            'spend_med': (t['spend_med_abs_pct'] <= spend_abs) & (spend_abs < t['spend_high_abs_pct']),
+            'pay_med': (t['pay_low_frac'] < avg_pay) & (avg_pay <= t['pay_med_frac']),
+            'minpaid_med': (t['minpaid_med_pct'] <= minpaid) & (minpaid < t['minpaid_high_pct']),
+            'util_med': (t['util_med_pct'] <= util) & (util < t['util_high_pct']),
+            'cash_med': (t['cash_med_pct'] <= cash) & (cash < t['cash_high_pct']),
+            'merchant_med': (t['merchant_med'] >= merchant) & (merchant > t['merchant_low'])
+        },
+        'low_support': {
+            'util_low': util < 30.0,
+            'pay_high': avg_pay >= 0.8,
+            'minpaid_low': minpaid < 15.0,
+            'spend_stable': spend_abs < 5.0,
+            'cash_low': cash < 10.0
+        }
+    }
+
+def _flag_counts(masks: Dict[str, Dict[str, np.ndarray]], n: int) -> Dict[str, np.ndarray]:
+    counts = {}
+    for severity, key in (('high', 'n_high'), ('medium', 'n_med'), ('low_support', 'n_low_support')):
+        total = np.zeros(n, dtype=np.int64)
+        for m in masks[severity].values():
+            total += m
+        counts[key] = total
+    return counts
+
+def flag_counts_from_bits(bits: np.ndarray) -> Dict[str, np.ndarray]:
+    # per-row flag counts by severity from stored bitmasks (see flag_bits_batch)
+    bits = np.asarray(bits, dtype=np.uint32)
+    masks = {sev: {} for sev in FLAG_SEVERITIES}
+    for i, name in enumerate(FLAG_BITS):
+        masks[FLAG_REASONS[name][0]][name] = (bits & np.uint32(1 << i)) != 0
+    return _flag_counts(masks, len(bits))
+
+def blend_probs(score_norm: np.ndarray, counts: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    # (rule_prob, final_prob) from score_norm and per-row flag counts, as score_row
+    rule_score = _clamp(counts['n_high'] * RULE_WEIGHTS['high_flag'] + counts['n_med'] * RULE_WEIGHTS['med_flag']
+                        + counts['n_low_support'] * RULE_WEIGHTS['low_support'], 0.0, 100.0)
+    rule_prob = rule_score / 100.0
+    final_prob = _clamp(BLEND['feature'] * score_norm + BLEND['rule'] * rule_prob, 0.0, 1.0)
+    return _round(rule_prob, 6), _round(final_prob, 6)
+
+def flag_bits_batch(masks: Dict[str, Dict[str, np.ndarray]]) -> np.ndarray:
+    # flag_masks_batch output packed into one uint32 per row (bit i = FLAG_BITS[i])
+    bits = None
+    for severity in FLAG_SEVERITIES:
+        for name, m in masks[severity].items():
+            b = m.astype(np.uint32) << np.uint32(FLAG_BITS.index(name))
+            bits = b if bits is None else bits | b
+    return bits
+
+def action_codes_batch(risk_code: np.ndarray, features: Dict[str, np.ndarray]) -> np.ndarray:
+    # action_code for whole columns
+    code = np.asarray(risk_code).astype(np.uint8)
+    for c, name in enumerate(RISK_CLASSES):
+        in_class = code == c
+        for j, (cond, _) in enumerate(ACTION_TEMPLATES[name][1]):
+            code |= (in_class & cond(features)).astype(np.uint8) << np.uint8(2 + j)
+    return code
+
+_SEVERITY_MASKS = {sev: sum(1 << i for i, f in enumerate(FLAG_BITS) if FLAG_REASONS[f][0] == sev) for sev in FLAG_SEVERITIES}
+
+def explain_row(flag_bits: int, code: int, features: Dict[str, float]) -> Dict[str, Any]:
+    """
+    The text parts of score_row (flags with reasons, flag_reasons,
+    recommended_actions) plus flag counts, from a stored flag bitmask and
+    action code; `features` are the row's display features (sanitize_*).
+    """
+    values = _flag_values(features)
+    flags = {sev: [] for sev in FLAG_SEVERITIES}
+    for i, name in enumerate(FLAG_BITS):
+        if flag_bits >> i & 1:
+            flags[FLAG_REASONS[name][0]].append(flag_reason(name, values))
+    flag_reasons = [{'flag': f, 'reason': r, 'severity': sev} for sev in FLAG_SEVERITIES for f, r in flags[sev]][:6]
+    return {
+        'recommended_actions': list(actions_for_code(code)),
+        'flags': flags,
+        'flag_reasons': flag_reasons,
+        'counts': {key: bin(flag_bits & _SEVERITY_MASKS[sev]).count('1')
+                   for sev, key in (('high', 'n_high'), ('medium', 'n_med'), ('low_support', 'n_low_support'))}
+    }
+
+def classify_batch(score_norm: np.ndarray, risk_thresholds: Dict[str, float]=None) -> np.ndarray:
+    # codes index RISK_CLASSES
+    t = RISK_THRESHOLDS if risk_thresholds is None else risk_thresholds
+    return np.where(score_norm < t['low'], 0,
+                    np.where(score_norm < t['med'], 1, 2)).astype(np.int8)
+
+@instrument()
+def score_batch(columns: Dict[str, Any], weights: Dict[str, float]=None) -> Dict[str, Any]:
+    """
+    Score whole columns in one vectorized pass.
+
+    columns maps each FEATURE_ALIASES key to an array of raw values (as
+    schema.ColumnDecoder decodes them). Returns the numeric score_row fields
+    as arrays plus 'risk_code' (index into RISK_CLASSES), 'contribs' / 'top3'
+    in CONTRIB_KEYS order, the sanitized 'features' and flags / actions as
+    'flag_bits' / 'action_code'; explain_row renders the text parts of
+    score_row for one row from those.
+    """
+    return score_features_batch(sanitize_batch(columns), weights)
+
+@instrument()
+def score_features_batch(features: Dict[str, np.ndarray], weights: Dict[str, float]=None,
+                         flag_thresholds: Dict[str, float]=None, risk_thresholds: Dict[str, float]=None,
+                         with_top3: bool=True) -> Dict[str, Any]:
+    """
+    score_batch from already sanitized features (sanitize_batch output), with
+    optional alternate weights and flag / risk thresholds (defaults: the
+    module-level DEFAULT_WEIGHTS, FLAG_THRESHOLDS, RISK_THRESHOLDS).
+    with_top3=False skips ranking the contributions when only scores are needed.
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+
+    feat_res = compute_feature_score_batch(features, weights, with_top3)
+    masks = flag_masks_batch(features, flag_thresholds)
+    counts = _flag_counts(masks, len(features['util_pct']))
+
+    score_norm = feat_res['score_norm']
+    rule_prob, final_prob = blend_probs(score_norm, counts)
+    risk_code = classify_batch(score_norm, risk_thresholds)
+
+    return {
+        'raw_score': feat_res['raw_score'],
+        'score_norm': score_norm,
+        'risk_score_pct': _round(score_norm * 100.0, 2),
+        'risk_code': risk_code,
+        'contribs': feat_res['contribs'],
+        'top3': feat_res['top3'],
+        'counts': counts,
+        # explanations are kept as codes; see explain_row
+        'flag_bits': flag_bits_batch(masks),
+        'action_code': action_codes_batch(risk_code, features),
+        'final_prob': final_prob,
+        'rule_prob': rule_prob,
+        'features': features
+    }
+
+def batch_contribs(batch: Dict[str, Any], i: int) -> Dict[str, float]:
+    return dict(zip(CONTRIB_KEYS, batch['contribs'][i].tolist()))
+
+def batch_top3(batch: Dict[str, Any], i: int) -> List[Tuple[str, float]]:
+    row = batch['contribs'][i]
+    return [(CONTRIB_KEYS[j], round(float(row[j]), 6)) for j in batch['top3'][i].tolist()]
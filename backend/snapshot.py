@@ -0,0 +1,322 @@
+# snapshot.py
+"""
+On-disk columnar snapshots of a ResultStore, shared by every worker process.
+
+A snapshot is a directory named after the store's uid:
+
+    meta.json                 header, size, class counts, parse stats, file map
+    col_<n>.npy               one .npy per stored numeric column
+    ids.offsets.npy/.data.npy Customer IDs as UTF-8 bytes + int64 offsets
+    ids.sorted.npy/.order.npy IDs sorted (fixed-width bytes) with their rows,
+                              used to find a customer by binary search
+    extra_<n>.*               carried-through text columns, like ids
+    text_<n>.*                uploaded cell text of the typed columns, like ids
+    agg_<n>.npy               the store's aggregates (aggregates.py), if any
+    wl_<n>.npy                worklist candidates (worklist.py), if any
+    cube_<n>.npy              exposure cube cells (cube.py), if any
+
+Snapshots are written under a temporary name and published by renaming the
+directory, then by atomically replacing the CURRENT pointer file. Readers
+memory-map every array read-only, so loading one costs the same for 1k or 10M
+rows, and nothing is copied or re-scored.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from aggregates import Aggregates
+from worklist import Worklist
+from cube import ExposureCube
+from store import ResultStore
+
+# opt-in: snapshots hold uploaded customer data, so nothing is written to disk
+# unless a directory is configured
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '')
+# published snapshots kept on disk besides the current one
+SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', '8'))
+
+FORMAT_VERSION = 2
+# snapshot directories are named by ResultStore.uid (uuid4 hex)
+_UID_RE = re.compile(r'^[0-9a-f]{32}$')
+_CURRENT = 'CURRENT'
+_META = 'meta.json'
+
+class StringColumn:
+    """
+    Read-only text column over memory-mapped UTF-8 data and int64 offsets;
+    indexes like a list (int -> str or None, slice -> list).
+    """
+    def __init__(self, offsets: np.ndarray, data: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.data.nbytes + (self.nulls.nbytes if self.nulls is not None else 0)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= start:
+                return []
+            offs = self.offsets[start:stop + 1].tolist()
+            base = offs[0]
+            raw = self.data[base:offs[-1]].tobytes()
+            out = [raw[a - base:b - base].decode('utf-8') for a, b in zip(offs, offs[1:])]
+            if self.nulls is not None:
+                for i in np.flatnonzero(self.nulls[start:stop]).tolist():
+                    out[i] = None
+            return out
+        i = int(key)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(key)
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        n = len(self)
+        for start in range(0, n, 65536):
+            yield from self[start:min(n, start + 65536)]
+
+class SortedIdIndex:
+    """
+    Customer ID -> first row, by binary search over IDs sorted as fixed-width
+    bytes (a stable sort, so the lowest row wins among duplicates).
+    """
+    def __init__(self, sorted_ids: np.ndarray, order: np.ndarray):
+        self.sorted_ids = sorted_ids
+        self.order = order
+
+    @property
+    def nbytes(self) -> int:
+        return self.sorted_ids.nbytes + self.order.nbytes
+
+    def get(self, customer_id: str, default=None):
+        key = str(customer_id).encode('utf-8')
+        if not len(self.order) or len(key) > self.sorted_ids.dtype.itemsize:
+            return default
+        pos = int(np.searchsorted(self.sorted_ids, key, side='left'))
+        if pos < len(self.order) and self.sorted_ids[pos] == key:
+            return int(self.order[pos])
+        return default
+
+    def get_many(self, ids: List[str]) -> np.ndarray:
+        # vectorized get(); -1 where absent
+        out = np.full(len(ids), -1, dtype=np.int64)
+        if not len(ids) or not len(self.order):
+            return out
+        encoded = [str(i).encode('utf-8') for i in ids]
+        keys = np.array(encoded, dtype=f'S{max(len(k) for k in encoded) or 1}')
+        pos = np.minimum(np.searchsorted(self.sorted_ids, keys, side='left'), len(self.order) - 1)
+        hit = self.sorted_ids[pos] == keys
+        # fixed-width bytes drop trailing NULs; longer keys can never match
+        hit &= np.fromiter((len(k) <= self.sorted_ids.dtype.itemsize for k in encoded), dtype=bool, count=len(encoded))
+        out[hit] = self.order[pos[hit]]
+        return out
+
+# -- writing
+def _save(path: str, name: str, arr: np.ndarray) -> str:
+    np.save(os.path.join(path, name), np.ascontiguousarray(arr), allow_pickle=False)
+    return name
+
+def _save_strings(path: str, prefix: str, values) -> Dict[str, str]:
+    encoded = [b'' if v is None else str(v).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    files = {
+        'offsets': _save(path, prefix + '.offsets.npy', offsets),
+        'data': _save(path, prefix + '.data.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    }
+    nulls = np.fromiter((v is None for v in values), dtype=bool, count=len(encoded))
+    if nulls.any():
+        files['nulls'] = _save(path, prefix + '.nulls.npy', nulls)
+    return files
+
+def write_snapshot(store: ResultStore, root: str) -> str:
+    """
+    Write `store` to root/<uid> via a temporary directory renamed into place.
+    Returns the snapshot directory.
+    """
+    final = os.path.join(root, store.uid)
+    if os.path.isdir(final):
+        return final
+    os.makedirs(root, exist_ok=True)
+    tmp = os.path.join(root, f'.tmp-{store.uid}-{os.getpid()}')
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        n = len(store)
+        columns = {name: _save(tmp, f'col_{k}.npy', store.cols[name][:n]) for k, name in enumerate(store.cols)}
+
+        ids = store.ids[:n]
+        encoded = np.array([i.encode('utf-8') for i in ids], dtype=f'S{max([len(i.encode("utf-8")) for i in ids] + [1])}')
+        order = np.argsort(encoded, kind='stable')
+        id_files = _save_strings(tmp, 'ids', ids)
+        id_files['sorted'] = _save(tmp, 'ids.sorted.npy', encoded[order])
+        id_files['order'] = _save(tmp, 'ids.order.npy', order.astype(np.int64))
+
+        extras = {h: _save_strings(tmp, f'extra_{k}', store.extras[h][:n]) for k, h in enumerate(store.extras)}
+        texts = {}
+        for k, (h, col) in enumerate(store.texts.items()):
+            if hasattr(col, 'to_arrays'):
+                texts[h] = {part: _save(tmp, f'text_{k}.{part}.npy', arr) for part, arr in col.to_arrays().items()}
+            else:
+                texts[h] = _save_strings(tmp, f'text_{k}', col[:n])
+        aggregates = {}
+        if store.aggregates is not None:
+            aggregates = {name: _save(tmp, f'agg_{k}.npy', arr) for k, (name, arr) in enumerate(store.aggregates.to_arrays().items())}
+        worklist = {}
+        if store.worklist is not None:
+            worklist = {'capacity': store.worklist.capacity,
+                        'files': {name: _save(tmp, f'wl_{k}.npy', arr) for k, (name, arr) in enumerate(store.worklist.to_arrays().items())}}
+        cube = {}
+        if store.cube is not None:
+            cube = {name: _save(tmp, f'cube_{k}.npy', arr) for k, (name, arr) in enumerate(store.cube.to_arrays().items())}
+        meta = {
+            'format': FORMAT_VERSION,
+            'uid': store.uid,
+            'version': store.version,
+            'size': n,
+            'header': store.header,
+            'class_counts': store.class_counts.tolist(),
+            'parse_stats': store.parse_stats,
+            'columns': columns,
+            'ids': id_files,
+            'extras': extras,
+            'texts': texts,
+            'aggregates': aggregates,
+            'worklist': worklist,
+            'cube': cube
+        }
+        with open(os.path.join(tmp, _META), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.rename(tmp, final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return final
+
+def _write_pointer(root: str, name: str):
+    tmp = os.path.join(root, f'.{_CURRENT}-{os.getpid()}-{threading.get_ident()}')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(root, _CURRENT))
+
+def prune_snapshots(root: str, keep: int = SNAPSHOT_KEEP):
+    # drop all but the current and `keep` newest snapshots; workers still
+    # mapping a deleted one keep reading it until they move on (POSIX)
+    current = read_pointer(root)
+    entries = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith('.') or name == current or not os.path.isdir(path):
+            continue
+        entries.append((os.path.getmtime(path), path))
+    for _, path in sorted(entries, reverse=True)[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def publish(store: ResultStore, root: Optional[str] = None) -> str:
+    """
+    Persist `store` and make it the current snapshot for every worker.
+    """
+    root = root or SNAPSHOT_DIR
+    if not root:
+        raise ValueError("No snapshot directory configured (SNAPSHOT_DIR)")
+    path = write_snapshot(store, root)
+    _write_pointer(root, os.path.basename(path))
+    prune_snapshots(root)
+    return path
+
+# -- reading
+def _load(path: str, name: str) -> np.ndarray:
+    return np.load(os.path.join(path, name), mmap_mode='r', allow_pickle=False)
+
+def _load_strings(path: str, files: Dict[str, str]) -> StringColumn:
+    nulls = _load(path, files['nulls']) if 'nulls' in files else None
+    return StringColumn(_load(path, files['offsets']), _load(path, files['data']), nulls)
+
+def load_snapshot(path: str) -> ResultStore:
+    """
+    Map a snapshot directory as a read-only ResultStore.
+    """
+    with open(os.path.join(path, _META), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {meta.get('format')!r} in {path}")
+    cols = {name: _load(path, fname) for name, fname in meta['columns'].items()}
+    ids = _load_strings(path, meta['ids'])
+    index = SortedIdIndex(_load(path, meta['ids']['sorted']), _load(path, meta['ids']['order']))
+    extras = {h: _load_strings(path, files) for h, files in meta['extras'].items()}
+    # snapshots written before texts were kept render the typed floats instead
+    texts = {h: _load_strings(path, files) for h, files in meta.get('texts', {}).items()}
+    aggregates = None
+    if meta.get('aggregates'):
+        aggregates = Aggregates.from_arrays({name: _load(path, fname) for name, fname in meta['aggregates'].items()})
+    worklist = None
+    if meta.get('worklist'):
+        worklist = Worklist.from_arrays({name: _load(path, fname) for name, fname in meta['worklist']['files'].items()},
+                                        meta['worklist']['capacity'])
+    cube = None
+    if meta.get('cube'):
+        cube = ExposureCube.from_arrays({name: _load(path, fname) for name, fname in meta['cube'].items()})
+    return ResultStore.restore(meta['header'], ids, index, cols, extras, np.array(meta['class_counts']),
+                               meta['parse_stats'], meta['uid'], meta['version'], aggregates, worklist, cube, texts)
+
+def read_pointer(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, _CURRENT), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+class SnapshotWatcher:
+    """
+    Follows root/CURRENT. check() costs one stat() per call and maps the new
+    snapshot only when the pointer file was replaced.
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or SNAPSHOT_DIR
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def check(self) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (changed, uid of the current snapshot) since the last call.
+        """
+        try:
+            st = os.stat(os.path.join(self.root, _CURRENT))
+        except FileNotFoundError:
+            return False, None
+        stamp = (st.st_ino, st.st_mtime_ns)
+        with self._lock:
+            if stamp == self._stamp:
+                return False, None
+            self._stamp = stamp
+        return True, read_pointer(self.root)
+
+    def load(self, uid: str) -> Optional[ResultStore]:
+        if not _UID_RE.match(uid or ''):
+            return None
+        try:
+            return load_snapshot(os.path.join(self.root, uid))
+        except FileNotFoundError:
+            # unknown, or pruned between reading the pointer and mapping it
+            # (a newer pointer is then already in place)
+            self._stamp = None
+            return None
+        except ValueError:
+            # written by an older format; treated as absent
+            return None
@@ -0,0 +1,547 @@
+# store.py
+from typing import Dict, Any, List, Optional, Iterator
+import bisect
+import os
+import sys
+from collections import OrderedDict
+import uuid
+import numpy as np
+from aggregates import Aggregates
+from cube import ExposureCube, LIMIT_BAND_EDGES, UTIL_BAND_EDGES
+from worklist import Worklist, WORKLIST_SIZE
+from scoring import (batch_contribs, batch_top3, sanitize_batch, input_hash_batch, explain_row,
+                     RISK_CLASSES, CONTRIB_KEYS)
+
+# original CSV columns kept as typed float64 arrays for scoring, sorting and
+# filtering (header -> decoded column key; all but 'dpd' are score_batch
+# inputs); records echo their cell text as uploaded (see TextColumn)
+TYPED_INPUT_COLUMNS = {
+    'Credit Limit': 'credit_limit',
+    'Utilisation %': 'util',
+    'Avg Payment Ratio': 'avg_pay',
+    'Min Due Paid Frequency': 'minpaid',
+    'Merchant Mix Index': 'merchant',
+    'Cash Withdrawal %': 'cash',
+    'Recent Spend Change %': 'spend_change',
+    'DPD Bucket Next Month': 'dpd'
+}
+ID_COLUMN = 'Customer ID'
+
+# fields attached to every scored record (same names /upload always used)
+SCORE_FIELDS = ['raw_score', 'score_norm', 'risk_class', 'top3_contribs', 'contribs']
+
+# per-row score columns kept from score_batch (flags / actions as codes, see scoring.explain_row)
+SCORE_COLUMNS = ('raw_score', 'score_norm', 'risk_code', 'contribs', 'top3', 'flag_bits', 'action_code')
+
+_INITIAL_CAPACITY = 1024
+# customers whose explanation (reasons, actions) is memoized per store
+EXPLAIN_CACHE_SIZE = int(os.environ.get('EXPLAIN_CACHE_SIZE', '1024'))
+_CONTRIBS_FMT = '{' + ', '.join(f"'{k}': %r" for k in CONTRIB_KEYS) + '}'
+
+# the ASCII characters str.strip() removes (str.isspace)
+_ASCII_SPACE = [chr(c) for c in range(128) if chr(c).isspace()]
+
+def _num(v: float):
+    # render stored floats the way they'd be typed in a CSV: 235570 not 235570.0
+    if v == v and v not in (float('inf'), float('-inf')) and v == int(v):
+        return int(v)
+    return v
+
+def _num_list(values: np.ndarray) -> List[Any]:
+    # _num over a float64 column slice
+    finite = np.isfinite(values)
+    if (np.abs(values[finite]) >= 2.0 ** 62).any():
+        return [_num(v) for v in values.tolist()]
+    whole = finite & (values == np.trunc(values))
+    if whole.all():
+        return values.astype(np.int64).tolist()
+    floats = values.tolist()
+    if not whole.any():
+        return floats
+    ints = np.where(whole, values, 0.0).astype(np.int64).tolist()
+    return [i if w else f for i, f, w in zip(ints, floats, whole.tolist())]
+
+def _num_text(values: np.ndarray) -> List[str]:
+    # cell text for typed values whose upload text was not kept (older snapshots)
+    return [str(v) for v in _num_list(values)]
+
+class TextColumn:
+    """
+    Stripped cell text of one typed input column, exactly as uploaded, so
+    records echo '30+', '1,000', 'n/a' or '1.0' rather than their parsed float.
+
+    Kept compactly: each appended chunk is one joined string plus offsets
+    (about one byte per character and four per cell, against ~60 for a list
+    of str). Indexes like a list (int -> str or None, slice -> list), as
+    snapshot.StringColumn does; None marks cells missing from short rows.
+    """
+    def __init__(self):
+        self._starts: List[int] = []
+        self._chunks: List[tuple] = []
+        self.size = 0
+
+    @classmethod
+    def from_cells(cls, cells: List[Optional[str]]) -> 'TextColumn':
+        col = cls()
+        col.append(cells)
+        return col
+
+    def append(self, cells: List[Optional[str]]):
+        n = len(cells)
+        if n == 0:
+            return
+        nulls = None
+        if cells.count(None):
+            nulls = np.fromiter((c is None for c in cells), dtype=bool, count=n)
+            cells = ['' if c is None else c for c in cells]
+        text = ''.join(cells)
+        # numeric text seldom has any whitespace: strip cell by cell only if it might
+        if not text.isascii() or any(c in text for c in _ASCII_SPACE):
+            cells = [c.strip() for c in cells]
+            text = ''.join(cells)
+        offsets = np.zeros(n + 1, dtype=np.int32 if len(text) < 2 ** 31 else np.int64)
+        np.cumsum(np.fromiter(map(len, cells), dtype=np.int64, count=n), out=offsets[1:])
+        self._starts.append(self.size)
+        self._chunks.append((text, offsets, nulls))
+        self.size += n
+
+    def extend(self, other: 'TextColumn'):
+        for text, offsets, nulls in other._chunks:
+            self._starts.append(self.size)
+            self._chunks.append((text, offsets, nulls))
+            self.size += len(offsets) - 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(sys.getsizeof(t) + o.nbytes + (m.nbytes if m is not None else 0) for t, o, m in self._chunks)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.size)
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            out: List[Optional[str]] = []
+            k = bisect.bisect_right(self._starts, start) - 1
+            while start < stop:
+                first = self._starts[k]
+                text, offsets, nulls = self._chunks[k]
+                end = min(stop, first + len(offsets) - 1)
+                offs = offsets[start - first:end - first + 1].tolist()
+                values = [text[a:b] for a, b in zip(offs, offs[1:])]
+                if nulls is not None:
+                    for j in np.flatnonzero(nulls[start - first:end - first]).tolist():
+                        values[j] = None
+                out += values
+                start, k = end, k + 1
+            return out
+        i = int(key)
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError(key)
+        k = bisect.bisect_right(self._starts, i) - 1
+        text, offsets, nulls = self._chunks[k]
+        j = i - self._starts[k]
+        if nulls is not None and nulls[j]:
+            return None
+        return text[offsets[j]:offsets[j + 1]]
+
+    def __iter__(self):
+        for start in range(0, self.size, 65536):
+            yield from self[start:min(self.size, start + 65536)]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        # snapshot.StringColumn layout: UTF-8 'data', int64 byte 'offsets', 'nulls' if any
+        data, offsets, nulls = [], [np.zeros(1, dtype=np.int64)], []
+        base = 0
+        for text, offs, m in self._chunks:
+            raw = text.encode('utf-8')
+            if len(raw) == len(text):
+                lens = np.diff(offs).astype(np.int64)
+            else:
+                o = offs.tolist()
+                lens = np.array([len(text[a:b].encode('utf-8')) for a, b in zip(o, o[1:])], dtype=np.int64)
+            data.append(raw)
+            offsets.append(base + np.cumsum(lens))
+            nulls.append(m if m is not None else np.zeros(len(offs) - 1, dtype=bool))
+            base += len(raw)
+        out = {'offsets': np.concatenate(offsets), 'data': np.frombuffer(b''.join(data), dtype=np.uint8)}
+        if any(m.any() for m in nulls):
+            out['nulls'] = np.concatenate(nulls)
+        return out
+
+def _extra_columns(header: List[str]) -> List[str]:
+    return [h for h in header if h != ID_COLUMN and h not in TYPED_INPUT_COLUMNS and h not in SCORE_FIELDS]
+
+def make_shard(ids: List[str], columns: Dict[str, np.ndarray], extras: Dict[str, List[Any]],
+               batch: Dict[str, Any], stats: Optional[Dict[str, Dict[str, int]]] = None,
+               text: Optional[Dict[str, List[Optional[str]]]] = None) -> Dict[str, Any]:
+    """
+    Reduce a scored chunk to what ResultStore keeps: Customer IDs, the stored
+    typed columns with their cell text and the carried-through extra columns.
+    """
+    cols = {h: columns[key] for h, key in TYPED_INPUT_COLUMNS.items()}
+    for name in SCORE_COLUMNS:
+        cols[name] = batch[name]
+    text = {h: TextColumn.from_cells(cells) for h, cells in (text or {}).items() if h in TYPED_INPUT_COLUMNS}
+    shard = {'ids': ids, 'cols': cols, 'text': text, 'extras': extras, 'stats': stats or {},
+             'worklist': Worklist.from_batch(batch['score_norm'], columns['credit_limit'])}
+    if 'features' in batch:
+        # computed here so parallel workers send them back ready to merge
+        shard['aggregates'] = Aggregates.from_batch(batch['risk_code'], batch['score_norm'], batch['features'])
+        shard['cube'] = ExposureCube.from_batch(batch['risk_code'], batch['score_norm'], batch['features'], batch['flag_bits'])
+    return shard
+
+def shard_from_decoded(decoded: Dict[str, Any], batch: Dict[str, Any]) -> Dict[str, Any]:
+    # make_shard for a schema.ColumnDecoder chunk
+    return make_shard(decoded['ids'], decoded['columns'], decoded['extras'], batch, decoded['stats'], decoded.get('text'))
+
+class ResultStore:
+    """
+    Compact columnar store for one scored upload.
+
+    Inputs and scores live in typed NumPy arrays (one per column), risk_class is
+    an int8 code into RISK_CLASSES, Customer ID -> row is a dict index and class
+    counts are maintained as rows are appended, so lookups and summaries are O(1).
+    Columns outside REQUIRED_COLUMNS are carried through as plain string lists.
+    """
+    def __init__(self, header: Optional[List[str]] = None):
+        self.header: List[str] = list(header or [])
+        self.size = 0
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.class_counts = np.zeros(len(RISK_CLASSES), dtype=np.int64)
+        # per-field counts of unparseable / blank input cells
+        self.parse_stats: Dict[str, Dict[str, int]] = {'parse_errors': {}, 'blank_cells': {}}
+        self._capacity = 0
+        self.cols: Dict[str, np.ndarray] = {}
+        # derived read-side structures (query indexes, sanitized features),
+        # dropped on every write; version lets outside caches notice writes
+        self.indexes = None
+        self._features = None
+        self._hashes = None
+        self._explained: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # merged from each shard's aggregates; None = rebuild from the columns
+        self.aggregates: Optional[Aggregates] = Aggregates()
+        # exposure cube cells, merged the same way
+        self.cube: Optional[ExposureCube] = ExposureCube()
+        # top customers for the collections worklist, merged from each shard's
+        self.worklist: Optional[Worklist] = Worklist()
+        self.version = 0
+        self.uid = uuid.uuid4().hex
+        self.extras: Dict[str, List[Any]] = {h: [] for h in _extra_columns(self.header)}
+        # uploaded text of the typed columns, for output (None: render the floats)
+        self.texts: Dict[str, Any] = {h: TextColumn() for h in TYPED_INPUT_COLUMNS}
+        # stores restored from a snapshot are read-only views of mapped files
+        self.readonly = False
+        self._alloc(_INITIAL_CAPACITY)
+
+    @classmethod
+    def restore(cls, header: List[str], ids, index, cols: Dict[str, np.ndarray], extras: Dict[str, Any],
+                class_counts: np.ndarray, parse_stats: Dict[str, Dict[str, int]], uid: str, version: int,
+                aggregates: Optional[Aggregates] = None, worklist: Optional[Worklist] = None,
+                cube: Optional[ExposureCube] = None, texts: Optional[Dict[str, Any]] = None) -> 'ResultStore':
+        """
+        Rebuild a read-only store around existing columns (see snapshot.py);
+        ids/extras/texts only need len() and list-style indexing and slicing,
+        index only .get().
+        """
+        store = cls.__new__(cls)
+        store.header = list(header)
+        store.size = len(ids)
+        store.ids = ids
+        store.index = index
+        store.class_counts = np.asarray(class_counts, dtype=np.int64)
+        store.parse_stats = parse_stats
+        store._capacity = store.size
+        store.cols = cols
+        store.indexes = None
+        store._features = None
+        store._hashes = None
+        store._explained = OrderedDict()
+        store.aggregates = aggregates
+        store.worklist = worklist
+        store.cube = cube
+        store.version = version
+        store.uid = uid
+        store.extras = extras
+        store.texts = dict(texts or {})
+        store.readonly = True
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    # -- writing
+    def _alloc(self, capacity: int):
+        specs = {h: (np.float64, ()) for h in TYPED_INPUT_COLUMNS}
+        specs.update({
+            'raw_score': (np.float64, ()),
+            'score_norm': (np.float64, ()),
+            'risk_code': (np.int8, ()),
+            'contribs': (np.float64, (len(CONTRIB_KEYS),)),
+            'top3': (np.int8, (3,)),
+            'flag_bits': (np.uint32, ()),
+            'action_code': (np.uint8, ())
+        })
+        for name, (dtype, shape) in specs.items():
+            new = np.empty((capacity,) + shape, dtype=dtype)
+            if name in self.cols:
+                new[:self.size] = self.cols[name][:self.size]
+            self.cols[name] = new
+        self._capacity = capacity
+
+    def append_shard(self, shard: Dict[str, Any]):
+        """
+        Write a chunk already reduced to arrays by make_shard (this is what
+        parallel scoring workers send back).
+        """
+        if self.readonly:
+            raise ValueError("Snapshot stores are read-only")
+        n = len(shard['ids'])
+        if n == 0:
+            return
+        start, end = self.size, self.size + n
+        if end > self._capacity:
+            self._alloc(max(end, self._capacity * 2))
+
+        for name, values in shard['cols'].items():
+            self.cols[name][start:end] = values
+        for h, values in self.extras.items():
+            values.extend(shard['extras'].get(h, [None] * n))
+        for h, col in self.texts.items():
+            text = shard.get('text', {}).get(h)
+            col.extend(text if text is not None else TextColumn.from_cells(_num_text(shard['cols'][h])))
+        for kind, counts in shard.get('stats', {}).items():
+            totals = self.parse_stats.setdefault(kind, {})
+            for name, c in counts.items():
+                totals[name] = totals.get(name, 0) + c
+
+        for i, cid in enumerate(shard['ids'], start):
+            self.ids.append(cid)
+            # first occurrence wins, like the old linear scan
+            self.index.setdefault(cid, i)
+
+        self.class_counts += np.bincount(shard['cols']['risk_code'], minlength=len(RISK_CLASSES))
+        if self.aggregates is not None:
+            if 'aggregates' in shard:
+                self.aggregates.merge(shard['aggregates'])
+            else:
+                self.aggregates = None
+        if self.cube is not None:
+            if 'cube' in shard:
+                self.cube.merge(shard['cube'])
+            else:
+                self.cube = None
+        # shards copied from another store (take) bring no candidates of their own
+        wl = shard.get('worklist')
+        if wl is None:
+            wl = Worklist.from_batch(shard['cols']['score_norm'], shard['cols']['Credit Limit'])
+        self.worklist.merge(wl, start)
+        self.size = end
+        self.indexes = None
+        self._features = None
+        self._hashes = None
+        self._explained.clear()
+        self.version += 1
+
+    # -- reading
+    def find(self, customer_id: str) -> Optional[int]:
+        return self.index.get(str(customer_id))
+
+    def find_many(self, ids: List[str]) -> np.ndarray:
+        # row of each ID (first occurrence), -1 where absent
+        if hasattr(self.index, 'get_many'):
+            return self.index.get_many(ids)
+        get = self.index.get
+        return np.fromiter((get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+
+    def column(self, name: str) -> np.ndarray:
+        # view of the filled part of a stored column
+        return self.cols[name][:self.size]
+
+    def input_columns(self) -> Dict[str, np.ndarray]:
+        # raw scoring inputs in the score_batch / sanitize_batch layout
+        return {key: self.column(h) for h, key in TYPED_INPUT_COLUMNS.items() if key != 'dpd'}
+
+    def features(self) -> Dict[str, np.ndarray]:
+        # sanitized f_* / display features, computed once per store version
+        if self._features is None:
+            self._features = sanitize_batch(self.input_columns())
+        return self._features
+
+    def input_hashes(self) -> np.ndarray:
+        # scoring.input_hash_batch of every stored row, computed once per store version
+        if self._hashes is None:
+            self._hashes = input_hash_batch(self.input_columns())
+        return self._hashes
+
+    def take(self, rows: np.ndarray, header: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Shard (see append_shard) holding copies of the given rows, with extras
+        laid out for a store with `header` (default: this store's).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        idx = rows.tolist()
+        extras = {}
+        for h in _extra_columns(self.header if header is None else header):
+            values = self.extras.get(h)
+            extras[h] = [values[i] for i in idx] if values is not None else [None] * len(idx)
+        text = {h: TextColumn.from_cells([col[i] for i in idx]) for h, col in self.texts.items()}
+        return {
+            'ids': [self.ids[i] for i in idx],
+            'cols': {name: col[rows] for name, col in self.cols.items()},
+            'text': text,
+            'extras': extras,
+            'stats': {}
+        }
+
+    def summary(self) -> Dict[str, int]:
+        low, medium, high = self.class_counts.tolist()
+        return {
+            'total_customers': self.size,
+            'high_risk': high,
+            'medium_risk': medium,
+            'low_risk': low
+        }
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """
+        Rebuild the scored record for row i: original columns in header order
+        followed by the score fields.
+        """
+        scores = {
+            'raw_score': float(self.cols['raw_score'][i]),
+            'score_norm': float(self.cols['score_norm'][i]),
+            'risk_class': RISK_CLASSES[int(self.cols['risk_code'][i])],
+            'top3_contribs': str(batch_top3(self.cols, i)),
+            'contribs': str(batch_contribs(self.cols, i))
+        }
+        out: Dict[str, Any] = {}
+        for h in self.header:
+            if h == ID_COLUMN:
+                out[h] = self.ids[i]
+            elif h in scores:
+                out[h] = scores[h]
+            elif h in TYPED_INPUT_COLUMNS:
+                out[h] = self.texts[h][i] if h in self.texts else _num_text(self.cols[h][i:i + 1])[0]
+            else:
+                out[h] = self.extras[h][i]
+        for k in SCORE_FIELDS:
+            if k not in out:
+                out[k] = scores[k]
+        return out
+
+    def get(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        i = self.find(customer_id)
+        return None if i is None else self.row(i)
+
+    def get_aggregates(self) -> Aggregates:
+        # running aggregates, or rebuilt once from the columns when some shard
+        # came without them (e.g. snapshots written before they existed)
+        if self.aggregates is None:
+            self.aggregates = Aggregates.from_batch(self.column('risk_code'), self.column('score_norm'), self.features())
+        return self.aggregates
+
+    def get_cube(self) -> ExposureCube:
+        # running exposure cube, or rebuilt once from the columns when some
+        # shard came without one or the configured bands have changed
+        if self.cube is None or (self.cube.limit_edges, self.cube.util_edges) != (LIMIT_BAND_EDGES, UTIL_BAND_EDGES):
+            self.cube = ExposureCube.from_batch(self.column('risk_code'), self.column('score_norm'), self.features(),
+                                                self.column('flag_bits'))
+        return self.cube
+
+    def get_worklist(self) -> Worklist:
+        # running worklist candidates, or selected once from the columns when
+        # missing or smaller than WORKLIST_SIZE (e.g. older snapshots)
+        if self.worklist is None or self.worklist.capacity < WORKLIST_SIZE:
+            self.worklist = Worklist.from_batch(self.column('score_norm'), self.column('Credit Limit'))
+        return self.worklist
+
+    def explain(self, i: int) -> Dict[str, Any]:
+        """
+        Flags with reasons, flag_reasons, recommended_actions and flag counts
+        of row i, rendered from its stored flag bitmask and action code on
+        first request and memoized (LRU, reset on write).
+        """
+        out = self._explained.get(i)
+        if out is not None:
+            self._explained.move_to_end(i)
+            return out
+        row = {key: self.cols[h][i:i + 1] for h, key in TYPED_INPUT_COLUMNS.items() if key != 'dpd'}
+        features = {k: float(v[0]) for k, v in sanitize_batch(row).items()}
+        out = explain_row(int(self.cols['flag_bits'][i]), int(self.cols['action_code'][i]), features)
+        self._explained[i] = out
+        while len(self._explained) > EXPLAIN_CACHE_SIZE:
+            self._explained.popitem(last=False)
+        return out
+
+    def detail(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        # get() plus the explanation, for a single customer's view
+        i = self.find(customer_id)
+        return None if i is None else dict(self.row(i), **self.explain(i))
+
+    def fields(self) -> List[str]:
+        # output field names of row(), in order
+        return self.header + [k for k in SCORE_FIELDS if k not in self.header]
+
+    def field_values(self, name: str, start: int = 0, stop: Optional[int] = None) -> List[Any]:
+        """
+        Values of one output field for rows [start, stop), rendered exactly as
+        row() renders them but one column slice at a time.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        if name == ID_COLUMN:
+            return self.ids[start:stop]
+        if name in ('raw_score', 'score_norm'):
+            return self.cols[name][start:stop].tolist()
+        if name == 'risk_class':
+            return [RISK_CLASSES[c] for c in self.cols['risk_code'][start:stop].tolist()]
+        if name == 'contribs':
+            # str(dict) of the contribs, without building the dicts
+            return [_CONTRIBS_FMT % tuple(c) for c in self.cols['contribs'][start:stop].tolist()]
+        if name == 'top3_contribs':
+            return ["[('%s', %r), ('%s', %r), ('%s', %r)]" % (CONTRIB_KEYS[a], round(c[a], 6), CONTRIB_KEYS[b], round(c[b], 6),
+                                                           CONTRIB_KEYS[d], round(c[d], 6))
+                    for c, (a, b, d) in zip(self.cols['contribs'][start:stop].tolist(), self.cols['top3'][start:stop].tolist())]
+        if name in TYPED_INPUT_COLUMNS:
+            if name in self.texts:
+                return self.texts[name][start:stop]
+            return _num_text(self.cols[name][start:stop])
+        if name in self.extras:
+            return self.extras[name][start:stop]
+        raise KeyError(name)
+
+    def iter_chunks(self, fields: Optional[List[str]] = None, chunk_rows: int = 10000) -> Iterator[List[List[Any]]]:
+        # column-major slices of `fields` (default: all of them), chunk_rows rows at a time
+        fields = fields or self.fields()
+        for start in range(0, self.size, chunk_rows):
+            yield [self.field_values(f, start, start + chunk_rows) for f in fields]
+
+    def iter_rows(self, fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        fields = fields or self.fields()
+        for chunk in self.iter_chunks(fields):
+            for values in zip(*chunk):
+                yield dict(zip(fields, values))
+
+    def nbytes(self) -> int:
+        return sum(a[:self.size].nbytes for a in self.cols.values())
+
+    def memory_bytes(self) -> int:
+        """
+        Approximate footprint: column arrays plus IDs, the ID index and text
+        columns (measured for mapped columns, estimated from a sample for lists).
+        """
+        total = self.nbytes()
+        for values in [self.ids, self.index] + list(self.extras.values()) + list(self.texts.values()):
+            if hasattr(values, 'nbytes'):
+                total += values.nbytes
+            elif isinstance(values, dict):
+                total += sys.getsizeof(values)
+            elif values:
+                sample = values[:1000]
+                total += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in sample) * len(values) // len(sample)
+        return total
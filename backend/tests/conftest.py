@@ -0,0 +1,6 @@
+# conftest.py
+# the backend modules import each other as top-level modules (see Procfile)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
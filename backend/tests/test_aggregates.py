@@ -0,0 +1,60 @@
+# test_aggregates.py
+"""
+Aggregates are additive: merging the aggregates of two halves equals
+building them over the whole, and subtracting a subset (merge(sign=-1))
+equals building them over the rest.
+"""
+import numpy as np
+import pytest
+
+from aggregates import Aggregates, AGG_RANGES
+from test_query import build_store
+from test_scoring import dirty_rows
+
+@pytest.fixture(scope='module')
+def batch():
+    store = build_store(dirty_rows(3000, 91))
+    return store, store.column('risk_code'), store.column('score_norm'), store.features()
+
+def build(batch, rows=slice(None)):
+    _, code, score, features = batch
+    return Aggregates.from_batch(code[rows], score[rows], {k: v[rows] for k, v in features.items()})
+
+def assert_same(got: Aggregates, expected: Aggregates):
+    g, e = got.to_arrays(), expected.to_arrays()
+    assert set(g) == set(e)
+    for name, value in e.items():
+        if value.dtype.kind == 'i':
+            np.testing.assert_array_equal(g[name], value, err_msg=name)
+        else:
+            np.testing.assert_allclose(g[name], value, rtol=1e-9, atol=1e-9, err_msg=name)
+
+def test_merged_halves_equal_whole(batch):
+    store = batch[0]
+    whole = build(batch)
+    half = len(store) // 2 + 17
+    merged = build(batch, slice(None, half)).merge(build(batch, slice(half, None)))
+    assert_same(merged, whole)
+    assert int(whole.counts.sum()) == len(store)
+    # the store's running aggregates, merged chunk by chunk while scoring
+    assert_same(store.get_aggregates(), whole)
+    assert merged.describe() == whole.describe()
+
+def test_subtracting_a_subset_equals_the_rest(batch):
+    store = batch[0]
+    rng = np.random.default_rng(92)
+    dropped = rng.random(len(store)) < 0.3
+    rest = build(batch).merge(build(batch, dropped), sign=-1)
+    assert_same(rest, build(batch, ~dropped))
+    for name in AGG_RANGES:
+        assert (rest.hist[name] >= 0).all()
+    assert rest.quantiles('score_norm', [0.1, 0.5, 0.9]) == build(batch, ~dropped).quantiles('score_norm', [0.1, 0.5, 0.9])
+
+    # removing everything leaves empty aggregates
+    empty = build(batch).merge(build(batch), sign=-1)
+    assert not empty.counts.any()
+    assert empty.quantiles('util_pct', [0.5]) == [None]
+
+def test_merge_rejects_other_bin_counts(batch):
+    with pytest.raises(ValueError):
+        build(batch).merge(Aggregates(bins=10))
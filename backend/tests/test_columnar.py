@@ -0,0 +1,67 @@
+# test_columnar.py
+"""
+Columnar payloads: encoded once per result set and served from the cache
+afterwards, an LRU bounded in bytes, and the same JSON from orjson as from
+the stdlib fallback.
+"""
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import columnar
+from columnar import EncodedCache, columnar_payload, encode_json
+from test_query import build_store
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+def test_second_request_is_a_cache_hit():
+    client = TestClient(app.app)
+    cache = columnar.COLUMNAR_CACHE
+    before = cache.hits, cache.misses
+    content = csv_bytes(dirty_rows(500, 121))
+    uid = client.post('/upload', files={'file': ('a.csv', content)}).json()['upload_id']
+    first = client.get('/columnar', params={'upload_id': uid})
+    assert first.status_code == 200 and first.headers['X-Cache'] == 'miss'
+    second = client.get('/columnar', params={'upload_id': uid})
+    assert second.headers['X-Cache'] == 'hit'
+    assert second.content == first.content
+    body = second.json()
+    assert body['upload_id'] == uid and len(body['columns']['score_norm']) == 500
+
+    # an upload answered in the columnar layout fills the cache for /columnar
+    res = client.post('/upload', params={'layout': 'columnar'}, files={'file': ('b.csv', content)})
+    assert res.headers['X-Cache'] == 'miss'
+    again = client.get('/columnar')
+    assert again.headers['X-Cache'] == 'hit' and again.content == res.content
+    assert (cache.hits - before[0], cache.misses - before[1]) == (2, 2)
+
+def test_cache_evicts_least_recently_used_at_max_bytes():
+    cache = EncodedCache(max_bytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'5678')
+    assert cache.get('a') == b'1234'  # 'b' is now the least recently used
+    cache.put('c', b'90ab')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234' and cache.get('c') == b'90ab'
+    assert cache._bytes == 8
+
+    # replacing a key keeps one copy; a body over the budget is not kept
+    cache.put('a', b'12345')
+    assert cache._bytes == 9 and cache.get('a') == b'12345'
+    cache.put('d', b'x' * 11)
+    assert cache.get('d') is None and cache.get('c') == b'90ab'
+
+@pytest.mark.skipif(columnar.orjson is None, reason="orjson not installed")
+def test_orjson_and_stdlib_encoders_agree(monkeypatch):
+    payload = columnar_payload(build_store(dirty_rows(800, 122)))
+    # dirty cells parse to NaN/inf in the typed input columns
+    assert any(not np.isfinite(v).all() for v in payload['columns'].values() if isinstance(v, np.ndarray) and v.dtype.kind == 'f')
+    fast = json.loads(encode_json(payload))
+    monkeypatch.setattr(columnar, 'orjson', None)
+    slow = json.loads(encode_json(payload))
+    assert slow == fast
+    values = [v for col in fast['columns'].values() if isinstance(col, list) for v in col]
+    assert None in values
@@ -0,0 +1,65 @@
+# test_cube.py
+"""
+Exposure cube cells are additive like the aggregates: merged halves equal
+the whole, subtracting a subset equals the rest. Band edges from the
+environment are checked when cube.py is imported.
+"""
+import numpy as np
+import pytest
+
+import cube
+from cube import ExposureCube, CUBE_STATS
+from test_query import build_store
+from test_scoring import dirty_rows
+
+@pytest.fixture(scope='module')
+def batch():
+    store = build_store(dirty_rows(3000, 111))
+    return store, store.column('risk_code'), store.column('score_norm'), store.features(), store.column('flag_bits')
+
+def build(batch, rows=slice(None)):
+    _, code, score, features, bits = batch
+    return ExposureCube.from_batch(code[rows], score[rows], {k: v[rows] for k, v in features.items()}, bits[rows])
+
+def assert_same(got: ExposureCube, expected: ExposureCube):
+    for s in CUBE_STATS:
+        for name in ('cells', 'flag_cells'):
+            g, e = getattr(got, name)[s], getattr(expected, name)[s]
+            if s == 'count':
+                np.testing.assert_array_equal(g, e, err_msg=f'{name}.{s}')
+            else:
+                np.testing.assert_allclose(g, e, rtol=1e-9, atol=1e-6, err_msg=f'{name}.{s}')
+
+def test_merged_halves_equal_whole(batch):
+    store = batch[0]
+    whole = build(batch)
+    half = len(store) // 2 - 5
+    merged = build(batch, slice(None, half)).merge(build(batch, slice(half, None)))
+    assert_same(merged, whole)
+    assert_same(store.get_cube(), whole)
+    assert whole.query([])['total']['count'] == len(store)
+    assert merged.query(['risk_class', 'flag']) == whole.query(['risk_class', 'flag'])
+
+def test_subtracting_a_subset_equals_the_rest(batch):
+    store = batch[0]
+    dropped = np.random.default_rng(112).random(len(store)) < 0.3
+    rest = build(batch).merge(build(batch, dropped), sign=-1)
+    assert_same(rest, build(batch, ~dropped))
+    assert (rest.cells['count'] >= 0).all() and (rest.flag_cells['count'] >= 0).all()
+    assert rest.query([])['total']['count'] == int((~dropped).sum())
+
+def test_merge_rejects_other_band_edges(batch):
+    with pytest.raises(ValueError):
+        build(batch).merge(ExposureCube(limit_edges=(1000.0,)))
+
+@pytest.mark.parametrize('value', ['', ' , ', '100,50', '10,10,20', '10,abc', '10,inf'])
+def test_bad_band_edges_are_rejected(monkeypatch, value):
+    monkeypatch.setenv('CUBE_UTIL_BANDS', value)
+    with pytest.raises(ValueError, match='CUBE_UTIL_BANDS'):
+        cube._edges('CUBE_UTIL_BANDS', '30,60,90')
+
+def test_band_edges_from_the_environment(monkeypatch):
+    monkeypatch.setenv('CUBE_LIMIT_BANDS', ' 1000, 2500.5 ,10000')
+    assert cube._edges('CUBE_LIMIT_BANDS', '50000') == (1000.0, 2500.5, 10000.0)
+    monkeypatch.delenv('CUBE_LIMIT_BANDS')
+    assert cube._edges('CUBE_LIMIT_BANDS', '50000') == (50000.0,)
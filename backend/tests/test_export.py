@@ -0,0 +1,125 @@
+# test_export.py
+"""
+/download_scored_csv in every format: the same rows and values as /records,
+`columns=` projections, and non-finite or missing cells as null/empty.
+"""
+import csv
+import gzip
+import io
+import json
+import math
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import export
+from store import ID_COLUMN, TYPED_INPUT_COLUMNS
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+FORMATS = ['csv', 'csv.gz', 'ndjson',
+           pytest.param('arrow', marks=pytest.mark.skipif(export.pa is None, reason="pyarrow not installed")),
+           pytest.param('parquet', marks=pytest.mark.skipif(export.pa is None, reason="pyarrow not installed"))]
+SHORT_ID = 'SHORT1'
+
+@pytest.fixture(scope='module')
+def client():
+    return TestClient(app.app)
+
+@pytest.fixture(scope='module')
+def uploaded(client):
+    # dirty cells include 'NaN' and 'inf'; the short row leaves its last cells missing
+    content = csv_bytes(dirty_rows(600, 71)) + f'{SHORT_ID},1000,50\n'.encode()
+    uid = client.post('/upload', files={'file': ('a.csv', content)}).json()['upload_id']
+    res = client.get('/records', params={'upload_id': uid, 'limit': 1000})
+    records = {r[ID_COLUMN]: r for r in res.json()['records']}
+    assert len(records) == 601
+    return uid, records
+
+def read_export(fmt: str, content: bytes):
+    if fmt == 'csv.gz':
+        fmt, content = 'csv', gzip.decompress(content)
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+    if fmt == 'ndjson':
+        return [json.loads(line) for line in content.decode('utf-8').splitlines()]
+    if fmt == 'arrow':
+        return export.pa.ipc.open_stream(content).read_all().to_pylist()
+    return export.pq.read_table(io.BytesIO(content)).to_pylist()
+
+def expected_value(fmt: str, store, name: str, record: dict, i: int):
+    # what each format makes of one /records cell
+    value = record[name]
+    if fmt in ('arrow', 'parquet') and name in TYPED_INPUT_COLUMNS:
+        # the parsed number, null where it is not finite
+        parsed = float(store.column(name)[i])
+        return parsed if math.isfinite(parsed) else None
+    if fmt in ('csv', 'csv.gz'):
+        return '' if value is None else str(value)
+    return value
+
+def download(client, uid, fmt, **params):
+    return client.get('/download_scored_csv', params=dict(params, upload_id=uid, format=fmt))
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_export_matches_records(client, uploaded, fmt):
+    uid, records = uploaded
+    store = app.RESULTS.get(uid)
+    res = download(client, uid, fmt)
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith(export.EXPORT_FORMATS[fmt][0])
+    rows = read_export(fmt, res.content)
+    assert len(rows) == len(records)
+    assert [r[ID_COLUMN] for r in rows] == list(store.ids)
+    for i, row in enumerate(rows):
+        record = records[row[ID_COLUMN]]
+        assert list(row) == list(record)
+        assert row == {f: expected_value(fmt, store, f, record, i) for f in record}, row[ID_COLUMN]
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_non_finite_and_missing_cells_are_null_or_empty(client, uploaded, fmt):
+    uid, _ = uploaded
+    rows = read_export(fmt, download(client, uid, fmt).content)
+    if fmt in ('arrow', 'parquet'):
+        # typed columns hold the parsed numbers that were scored
+        values = [r[f] for r in rows for f in TYPED_INPUT_COLUMNS]
+        assert None in values
+        assert all(v is None or math.isfinite(v) for v in values)
+    else:
+        # text formats echo the uploaded cell; cells missing from short rows are empty
+        empty = '' if fmt.startswith('csv') else None
+        short = next(r for r in rows if r[ID_COLUMN] == SHORT_ID)
+        assert short['Min Due Paid Frequency'] == empty and short['DPD Bucket Next Month'] == empty
+    if not fmt.startswith('csv'):
+        assert all(math.isfinite(r[f]) for r in rows for f in ('raw_score', 'score_norm'))
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_columns_projection(client, uploaded, fmt):
+    uid, records = uploaded
+    res = download(client, uid, fmt, columns='score_norm, Customer ID,risk_class,score_norm')
+    assert res.status_code == 200
+    rows = read_export(fmt, res.content)
+    assert len(rows) == len(records)
+    for row in rows:
+        assert list(row) == ['score_norm', ID_COLUMN, 'risk_class']
+        record = records[row[ID_COLUMN]]
+        assert row['risk_class'] == record['risk_class']
+        assert str(row['score_norm']) == str(record['score_norm'])
+
+    res = download(client, uid, fmt, columns='score_norm,nope')
+    assert res.status_code == 400
+    assert 'nope' in res.json()['detail']
+
+def test_unknown_format_is_400(client, uploaded):
+    assert download(client, uploaded[0], 'xlsx').status_code == 400
+
+def test_chunked_export_is_the_same_bytes(uploaded):
+    # the chunk size only changes how the stream is cut, never its text
+    store = app.RESULTS.get(uploaded[0])
+    for fmt in ('csv', 'ndjson'):
+        whole = b''.join(export.export_stream(store, fmt)[0])
+        assert b''.join(export.export_stream(store, fmt, chunk_rows=7)[0]) == whole
+    rows = read_export('csv.gz', b''.join(export.export_stream(store, 'csv.gz', chunk_rows=7)[0]))
+    np.testing.assert_array_equal([r[ID_COLUMN] for r in rows], store.ids)
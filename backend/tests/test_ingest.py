@@ -0,0 +1,126 @@
+# test_ingest.py
+"""
+Compressed and non-UTF-8 uploads (ingest.py) against uploading the same CSV
+as plain UTF-8, and the 400s for truncated or corrupt compressed bodies.
+"""
+import codecs
+import csv
+import gzip
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import ingest
+from utils import REQUIRED_COLUMNS
+from test_scoring import dirty_rows
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+needs_zstd = pytest.mark.skipif(zstandard is None, reason="zstandard not installed")
+
+def portfolio_text(n: int = 400, seed: int = 61) -> str:
+    # an extra column with characters outside ASCII but inside Windows-1252
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=REQUIRED_COLUMNS + ['Branch'], lineterminator='\n')
+    writer.writeheader()
+    for i, r in enumerate(dirty_rows(n, seed)):
+        writer.writerow(dict(r, Branch=['Zürich', 'São Paulo', 'Köln — Süd', 'plain'][i % 4]))
+    return buf.getvalue()
+
+PLAIN = portfolio_text().encode('utf-8')
+
+def multipart(filename: str, content: bytes):
+    boundary = 'ingest-test-boundary'
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n').encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+@pytest.fixture(scope='module')
+def client():
+    return TestClient(app.app)
+
+@pytest.fixture(scope='module')
+def expected(client):
+    res = client.post('/upload', files={'file': ('plain.csv', PLAIN)})
+    assert res.status_code == 200
+    return res.json()['records']
+
+def records(res):
+    assert res.status_code == 200, res.text
+    return res.json()['records']
+
+def zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor().compress(data)
+
+@pytest.mark.parametrize('name, encode', [
+    ('a.csv.gz', gzip.compress),
+    # concatenated members, as `cat a.gz b.gz` produces
+    ('a.csv.gz', lambda d: gzip.compress(d[:len(d) // 3]) + gzip.compress(d[len(d) // 3:])),
+    pytest.param('a.csv.zst', zstd, marks=needs_zstd),
+    pytest.param('a.csv.zst', lambda d: zstd(d[:1000]) + zstd(d[1000:]), marks=needs_zstd),
+])
+@pytest.mark.parametrize('mode', ['buffered', 'stream'])
+def test_compressed_upload_matches_plain(client, expected, name, encode, mode):
+    res = client.post('/upload', params={'mode': mode}, files={'file': (name, encode(PLAIN))})
+    if mode == 'stream':
+        assert res.status_code == 200
+        assert res.json()['total_customers'] == len(expected)
+        res = client.get('/records', params={'upload_id': res.json()['upload_id'], 'limit': 1000, 'sort': 'raw_score'})
+        got = {r['Customer ID']: r for r in res.json()['records']}
+        assert got == {r['Customer ID']: r for r in expected}
+    else:
+        assert records(res) == expected
+
+def test_gzip_content_encoding_matches_plain(client, expected):
+    body, ctype = multipart('plain.csv', PLAIN)
+    res = client.post('/upload', content=gzip.compress(body), headers={'Content-Type': ctype, 'Content-Encoding': 'gzip'})
+    assert records(res) == expected
+
+@pytest.mark.parametrize('encoding', ['utf-8-sig', 'cp1252', 'utf-16'])
+def test_encoded_upload_matches_plain(client, expected, encoding):
+    res = client.post('/upload', files={'file': ('enc.csv', portfolio_text().encode(encoding))})
+    assert records(res) == expected
+    assert res.json()['encoding'] == encoding
+
+@pytest.mark.parametrize('head, encoding', [
+    (b'a,b\n1,2\n', 'utf-8'),
+    ('a,b\nZürich,2\n'.encode('utf-8'), 'utf-8'),
+    ('a,b\nZürich,2\n'.encode('cp1252'), 'cp1252'),
+    (codecs.BOM_UTF8 + b'a,b\n', 'utf-8-sig'),
+    ('a,b\n'.encode('utf-16'), 'utf-16'),
+    # a sample cut inside a multi-byte character is still UTF-8
+    ('a,b\nü'.encode('utf-8')[:-1], 'utf-8'),
+])
+def test_detect_encoding(head, encoding):
+    assert ingest.detect_encoding(head) == encoding
+
+def _truncated(data: bytes) -> bytes:
+    return data[:len(data) // 2]
+
+@pytest.mark.parametrize('name, body', [
+    ('a.csv.gz', _truncated(gzip.compress(PLAIN))),
+    ('a.csv.gz', b'not gzip at all' * 50),
+    pytest.param('a.csv.zst', _truncated(zstd(PLAIN)) if zstandard else b'', marks=needs_zstd),
+    pytest.param('a.csv.zst', b'not zstd at all' * 50, marks=needs_zstd),
+    ('a.txt', PLAIN),
+])
+@pytest.mark.parametrize('mode', ['buffered', 'stream'])
+def test_bad_compressed_upload_is_400(client, expected, name, body, mode):
+    latest = client.get('/summary').json()['upload_id']
+    res = client.post('/upload', params={'mode': mode}, files={'file': (name, body)})
+    assert res.status_code == 400
+    assert client.get('/summary').json()['upload_id'] == latest
+
+@pytest.mark.parametrize('body', [
+    _truncated(gzip.compress(multipart('plain.csv', PLAIN)[0])),
+    b'not gzip at all' * 50,
+])
+def test_bad_gzip_content_encoding_is_400(client, expected, body):
+    _, ctype = multipart('plain.csv', PLAIN)
+    res = client.post('/upload', content=body, headers={'Content-Type': ctype, 'Content-Encoding': 'gzip'})
+    assert res.status_code == 400
@@ -0,0 +1,142 @@
+# test_jobs.py
+"""
+Background jobs (POST /jobs): results match /upload whether chunks are
+scored on the process pool or on the job thread, and the queue limit,
+cancellation, progress and failures behave as documented in jobs.py.
+"""
+import csv
+import io
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import ingest
+import jobs
+from store import ID_COLUMN
+from utils import REQUIRED_COLUMNS
+from test_scoring import dirty_rows
+from test_upload import next_portfolio
+
+def quoted_csv(rows) -> bytes:
+    # an extra column with quoted commas and newlines across chunk cuts
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=REQUIRED_COLUMNS + ['Notes'])
+    writer.writeheader()
+    for i, r in enumerate(rows):
+        writer.writerow(dict(r, Notes=['', 'a, b', 'line one\nline two', 'say "hi"'][i % 4]))
+    return buf.getvalue().encode('utf-8')
+
+@pytest.fixture
+def manager(monkeypatch):
+    def make(**kw):
+        m = jobs.JobManager(app._publish_job, **kw)
+        monkeypatch.setattr(app, 'JOBS', m)
+        made.append(m)
+        return m
+    made = []
+    yield make
+    for m in made:
+        m.shutdown()
+
+@pytest.fixture
+def client():
+    return TestClient(app.app)
+
+def wait(client, job_id, states=jobs._FINISHED, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        body = client.get(f'/jobs/{job_id}').json()
+        if body['state'] in states:
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {body['state']}")
+
+class GatedReader:
+    """
+    File reader that hands out its first read and then blocks until `gate` is
+    set, holding a job mid-file.
+    """
+    def __init__(self, f, gate: threading.Event, started: threading.Event):
+        self.f, self.gate, self.started, self.reads = f, gate, started, 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads > 1:
+            self.started.set()
+            assert self.gate.wait(30)
+        return self.f.read(size)
+
+@pytest.fixture
+def gated(monkeypatch):
+    gate, started = threading.Event(), threading.Event()
+    opener = ingest.open_decompressed
+    monkeypatch.setattr(ingest, 'open_decompressed', lambda raw, c: GatedReader(opener(raw, c), gate, started))
+    monkeypatch.setattr(jobs, 'JOB_CHUNK_BYTES', 4096)
+    yield gate, started
+    gate.set()
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_job_matches_upload(client, manager, monkeypatch, processes):
+    manager(processes=processes)
+    monkeypatch.setattr(jobs, 'JOB_CHUNK_BYTES', 5000)
+    base_rows = dirty_rows(1500, 41)
+    content = quoted_csv(base_rows)
+    expected = client.post('/upload', files={'file': ('a.csv', content)}).json()['upload_id']
+    job = client.post('/jobs', files={'file': ('a.csv', content)}).json()
+    done = wait(client, job['job_id'])
+    assert done['state'] == 'done', done
+    assert done['progress']['rows_done'] == len(base_rows)
+    got = app.RESULTS.get(done['result']['upload_id'])
+    assert list(got.iter_rows()) == list(app.RESULTS.get(expected).iter_rows())
+    assert got.parse_stats == app.RESULTS.get(expected).parse_stats
+
+    # upsert jobs decode on the pool and diff on the job thread
+    rows = next_portfolio(base_rows, 42)
+    content = quoted_csv(rows)
+    job = client.post('/jobs', params={'mode': 'upsert', 'base': expected}, files={'file': ('b.csv', content)}).json()
+    done = wait(client, job['job_id'])
+    assert done['state'] == 'done', done
+    fresh = client.post('/upload', files={'file': ('b.csv', content)}).json()['upload_id']
+    assert [r[ID_COLUMN] for r in app.RESULTS.get(done['result']['upload_id']).iter_rows()] == [r[ID_COLUMN] for r in rows]
+    assert list(app.RESULTS.get(done['result']['upload_id']).iter_rows()) == list(app.RESULTS.get(fresh).iter_rows())
+
+def test_queue_full_is_429_and_cancel_stops_a_running_job(client, manager, gated):
+    gate, started = gated
+    manager(workers=1, max_queue=1, processes=0)
+    content = quoted_csv(dirty_rows(2000, 43))
+    first = client.post('/jobs', files={'file': ('a.csv', content)})
+    assert first.status_code == 202
+    job_id = first.json()['job_id']
+    assert started.wait(30)
+
+    # progress after the first chunk, while the job is held mid-file
+    running = client.get(f'/jobs/{job_id}').json()
+    assert running['state'] == 'running'
+    progress = running['progress']
+    assert 0 < progress['rows_done'] < 2000
+    assert 0 < progress['bytes_read'] < progress['bytes_total']
+    assert progress['rows_per_sec'] > 0 and progress['eta_s'] is not None and progress['eta_s'] > 0
+
+    assert client.post('/jobs', files={'file': ('b.csv', content)}).status_code == 429
+
+    assert client.delete(f'/jobs/{job_id}').status_code == 200
+    gate.set()
+    cancelled = wait(client, job_id)
+    assert cancelled['state'] == 'cancelled'
+    assert cancelled['progress']['rows_done'] < 2000
+    # the slot is free again
+    assert client.post('/jobs', files={'file': ('c.csv', content)}).status_code == 202
+
+def test_failed_job_releases_its_slot(client, manager):
+    m = manager(workers=1, max_queue=1, processes=0)
+    bad = client.post('/jobs', files={'file': ('bad.csv', b'Customer ID,Other\nC1,2\n')}).json()
+    failed = wait(client, bad['job_id'])
+    assert failed['state'] == 'failed' and 'Missing required columns' in failed['error']
+    assert m.counts()['failed'] == 1
+
+    ok = client.post('/jobs', files={'file': ('ok.csv', quoted_csv(dirty_rows(50, 44)))})
+    assert ok.status_code == 202
+    assert wait(client, ok.json()['job_id'])['state'] == 'done'
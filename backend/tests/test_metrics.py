@@ -0,0 +1,68 @@
+# test_metrics.py
+"""
+/metrics after an upload: stage histograms, upload counters and the
+registry and job gauges in the Prometheus exposition text.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import metrics
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+pytestmark = pytest.mark.skipif(not metrics.METRICS_ENABLED, reason="METRICS_ENABLED=0")
+
+def scrape(client) -> dict:
+    # sample line (name and labels) -> value
+    res = client.get('/metrics')
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith('text/plain')
+    samples = {}
+    for line in res.text.splitlines():
+        if line and not line.startswith('#'):
+            key, value = line.rsplit(' ', 1)
+            samples[key] = float(value)
+    return samples
+
+def test_metrics_after_an_upload():
+    client = TestClient(app.app)
+    before = scrape(client)
+    content = csv_bytes(dirty_rows(700, 131))
+    uid = client.post('/upload', files={'file': ('a.csv', content)}).json()['upload_id']
+    assert client.post('/upload', files={'file': ('b.csv', b'Customer ID,Other\nC1,2\n')}).status_code == 400
+    after = scrape(client)
+    text = client.get('/metrics').text
+
+    def delta(key):
+        return after.get(key, 0.0) - before.get(key, 0.0)
+
+    for name in ('stage_seconds', 'upload_seconds', 'stage_rows_total', 'uploads_total', 'result_sets', 'jobs'):
+        assert f'# TYPE {metrics.PREFIX}{name} ' in text
+
+    # one timing per stage the buffered upload went through
+    for stage in ('read', 'parse', 'validate', 'decode', 'score', 'aggregate', 'materialize', 'encode'):
+        assert delta(f'delinquency_stage_seconds_count{{stage="{stage}"}}') >= 1, stage
+        assert f'delinquency_stage_seconds_bucket{{stage="{stage}",le="+Inf"}}' in after
+    assert delta('delinquency_stage_rows_total{stage="score"}') == 700
+
+    assert delta('delinquency_uploads_total{mode="buffered",status="ok"}') == 1
+    assert delta('delinquency_uploads_total{mode="buffered",status="error"}') == 1
+    assert delta('delinquency_upload_seconds_count{mode="buffered"}') == 2
+    assert delta('delinquency_rows_scored_total') == 700
+    assert delta('delinquency_bytes_ingested_total') >= len(content)
+
+    # gauges read from the registry and job manager at scrape time
+    latest = app.RESULTS.latest()
+    assert latest.uid == uid
+    assert after['delinquency_result_store_rows'] == 700
+    assert after['delinquency_result_sets'] == len(app.RESULTS)
+    assert after['delinquency_result_sets_bytes'] == app.RESULTS.total_bytes()
+    assert after['delinquency_result_set_evictions_total'] == app.RESULTS.evictions
+    for state, count in app.JOBS.counts().items():
+        assert after[f'delinquency_jobs{{state="{state}"}}'] == count
+    assert 'delinquency_jobs_rejected_total' in after
+
+def test_metric_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        metrics._Metric('x', 'help')
@@ -0,0 +1,79 @@
+# test_parallel.py
+"""
+Parallel scoring (byte-range shards on the process pool) against scoring the
+same file in one piece: same rows, text, class counts, aggregates, cube
+cells and worklist.
+"""
+import asyncio
+import csv
+import io
+
+import numpy as np
+import pytest
+
+import parallel
+from schema import ColumnDecoder, resolve_schema
+from scoring import score_batch
+from store import ResultStore, shard_from_decoded
+from utils import REQUIRED_COLUMNS, parse_csv_rows
+from test_scoring import dirty_rows
+
+def dirty_csv(n: int, seed: int) -> bytes:
+    # an extra column with quoted commas and newlines, so shard cuts have to
+    # respect quoting
+    rows = dirty_rows(n, seed)
+    for i, r in enumerate(rows):
+        r['Notes'] = ['', 'plain', 'a, b', 'line one\nline two', 'say "hi"', 'é ü ß'][i % 6]
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=REQUIRED_COLUMNS + ['Notes'])
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+def serial_store(content: bytes) -> ResultStore:
+    header, rows = parse_csv_rows(content, 'utf-8')
+    decoder = ColumnDecoder(resolve_schema(header))
+    decoded = decoder.decode(rows)
+    store = ResultStore(decoder.schema.output_header)
+    store.append_shard(shard_from_decoded(decoded, score_batch(decoded['columns'])))
+    return store
+
+def parallel_store(content: bytes, shard_bytes: int) -> ResultStore:
+    header, _ = parse_csv_rows(content[:content.index(b'\n') + 1], 'utf-8')
+    shards = asyncio.run(parallel.score_csv_parallel(content, 2, shard_bytes=shard_bytes, encoding='utf-8'))
+    store = ResultStore(resolve_schema(header).output_header)
+    for shard in shards:
+        store.append_shard(shard)
+    return store
+
+@pytest.fixture(scope='module', autouse=True)
+def pool():
+    yield
+    parallel.shutdown_pool()
+
+def test_split_csv_bytes_cuts_at_record_boundaries():
+    content = dirty_csv(500, 1)
+    header, shards = parallel.split_csv_bytes(content, 997)
+    assert len(shards) > 10
+    assert header + b''.join(shards) == content
+    expected = parse_csv_rows(content, 'utf-8')[1]
+    got = [row for s in shards for row in parse_csv_rows(header + s, 'utf-8')[1]]
+    assert got == expected
+
+@pytest.mark.parametrize('shard_bytes', [4096, 50000])
+def test_parallel_matches_serial(shard_bytes):
+    content = dirty_csv(3000, 2)
+    serial = serial_store(content)
+    par = parallel_store(content, shard_bytes)
+
+    assert par.header == serial.header
+    assert list(par.iter_rows()) == list(serial.iter_rows())
+    np.testing.assert_array_equal(par.class_counts, serial.class_counts)
+    assert par.parse_stats == serial.parse_stats
+
+    for order in ('score', 'exposure'):
+        np.testing.assert_array_equal(par.get_worklist().top(order, 200), serial.get_worklist().top(order, 200))
+    for name, value in serial.get_aggregates().to_arrays().items():
+        np.testing.assert_allclose(par.get_aggregates().to_arrays()[name], value, rtol=1e-9, err_msg=name)
+    for name, value in serial.get_cube().to_arrays().items():
+        np.testing.assert_allclose(par.get_cube().to_arrays()[name], value, rtol=1e-9, err_msg=name)
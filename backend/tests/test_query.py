@@ -0,0 +1,107 @@
+# test_query.py
+"""
+query_records (index walk, binary-searched score range, cursors) against a
+brute-force filter and sort over every row of the store.
+"""
+import csv
+import io
+import math
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from query import query_records, SORTABLE_COLUMNS
+from schema import ColumnDecoder, resolve_schema
+from scoring import score_batch, FLAG_BITS, RISK_CLASSES
+from store import ResultStore, shard_from_decoded, ID_COLUMN
+from utils import REQUIRED_COLUMNS
+from test_scoring import dirty_rows
+
+def build_store(rows, chunk=700) -> ResultStore:
+    decoder = ColumnDecoder(resolve_schema(REQUIRED_COLUMNS))
+    store = ResultStore(decoder.schema.output_header)
+    cells = [[r.get(h) for h in REQUIRED_COLUMNS] for r in rows]
+    for i in range(0, len(cells), chunk):
+        decoded = decoder.decode(cells[i:i + chunk])
+        store.append_shard(shard_from_decoded(decoded, score_batch(decoded['columns'])))
+    return store
+
+@pytest.fixture(scope='module')
+def store():
+    return build_store(dirty_rows(2500, 11))
+
+def brute_force(store, score_min=None, score_max=None, risk_class=None, flag=None, id_prefix=None,
+                sort='score_norm', order='desc'):
+    values = store.column(sort).tolist()
+    scores = store.column('score_norm').tolist()
+    codes = store.column('risk_code').tolist()
+    bits = store.column('flag_bits').tolist()
+    rows = [i for i in range(len(store))
+            if (score_min is None or scores[i] >= score_min)
+            and (score_max is None or scores[i] <= score_max)
+            and (risk_class is None or RISK_CLASSES[codes[i]] == risk_class)
+            and (flag is None or bits[i] >> FLAG_BITS.index(flag) & 1)
+            and (id_prefix is None or store.ids[i].startswith(id_prefix))]
+    # ascending with NaN last, ties in row order; desc is the exact reverse
+    rows.sort(key=lambda i: (math.isnan(values[i]), 0.0 if math.isnan(values[i]) else values[i], i))
+    return rows[::-1] if order == 'desc' else rows
+
+def random_queries(n, seed):
+    rng = random.Random(seed)
+    for _ in range(n):
+        q = {'sort': rng.choice(SORTABLE_COLUMNS), 'order': rng.choice(['asc', 'desc'])}
+        if rng.random() < 0.4:
+            q['score_min'] = round(rng.uniform(0, 0.6), 3)
+        if rng.random() < 0.4:
+            q['score_max'] = round(rng.uniform(0.3, 1), 3)
+        if rng.random() < 0.4:
+            q['risk_class'] = rng.choice(RISK_CLASSES)
+        if rng.random() < 0.4:
+            q['flag'] = rng.choice(FLAG_BITS)
+        if rng.random() < 0.3:
+            q['id_prefix'] = 'C00' + str(rng.randint(0, 24))
+        yield q
+
+@pytest.mark.parametrize('q', list(random_queries(60, 3)), ids=str)
+def test_query_records_matches_brute_force(store, q):
+    expected = [store.ids[i] for i in brute_force(store, **q)]
+    limit = random.Random(str(q)).choice([1, 7, 50, 1000])
+
+    # walking the cursor
+    got, cursor = [], None
+    while True:
+        page = query_records(store, limit=limit, cursor=cursor, with_total=True, **q)
+        assert page['total'] == len(expected)
+        got += [r[ID_COLUMN] for r in page['records']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert got == expected
+
+    # offset paging
+    got = []
+    for offset in range(0, len(expected) + limit, limit):
+        got += [r[ID_COLUMN] for r in query_records(store, offset=offset, limit=limit, **q)['records']]
+    assert got == expected
+
+def test_records_endpoint_with_non_finite_cells():
+    rows = dirty_rows(400, 5)
+    rows[0]['Utilisation %'] = 'NaN'
+    rows[1]['Credit Limit'] = 'inf'
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=REQUIRED_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    client = TestClient(app.app)
+    uploaded = client.post('/upload', files={'file': ('dirty.csv', buf.getvalue().encode())})
+    assert uploaded.status_code == 200
+    uid = uploaded.json()['upload_id']
+
+    res = client.get('/records', params={'upload_id': uid, 'sort': 'Credit Limit', 'limit': 1000})
+    assert res.status_code == 200
+    by_id = {r[ID_COLUMN]: r for r in res.json()['records']}
+    assert by_id[rows[0][ID_COLUMN]]['Utilisation %'] == 'NaN'
+    assert by_id[rows[1][ID_COLUMN]]['Credit Limit'] == 'inf'
+    assert client.get(f"/customer/{rows[1][ID_COLUMN]}", params={'upload_id': uid}).status_code == 200
@@ -0,0 +1,69 @@
+# test_rescore.py
+"""
+/rescore: identity parameters reproduce the stored result, repeated parameter
+sets are served from the cache, and flag thresholds show up in the flag and
+probability report even though they never move risk classes.
+"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from rescore import rescore, resolve_params, RescoreCache
+from scoring import score_batch, FLAG_BITS, FLAG_THRESHOLDS
+from test_query import build_store
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+@pytest.fixture(scope='module')
+def store():
+    return build_store(dirty_rows(3000, 31))
+
+def test_identity_params_reproduce_stored_result(store):
+    result, cached = rescore(store, resolve_params(), RescoreCache())
+    assert not cached
+    np.testing.assert_array_equal(result['risk_code'], store.column('risk_code'))
+    np.testing.assert_array_equal(result['score_norm'], store.column('score_norm'))
+    np.testing.assert_array_equal(result['flag_bits'], store.column('flag_bits'))
+    assert np.trace(result['migration']) == len(store)
+    assert result['flags_changed'] == 0
+    np.testing.assert_array_equal(result['flag_fired'], result['flag_fired_current'])
+    assert result['probs']['final_prob']['current'] == result['probs']['final_prob']['new']
+
+    # the probabilities rebuilt from stored flag bits match a fresh score_batch
+    batch = score_batch(store.input_columns())
+    np.testing.assert_array_equal(result['final_prob'], batch['final_prob'])
+    np.testing.assert_array_equal(result['rule_prob'], batch['rule_prob'])
+
+def test_cache_hit_on_repeated_params(store):
+    cache = RescoreCache()
+    params = resolve_params(weights={'pay': 0.5})
+    first, cached = rescore(store, params, cache)
+    assert not cached
+    again, cached = rescore(store, resolve_params(weights={'pay': 0.5}), cache)
+    assert cached and again is first
+    other, cached = rescore(store, resolve_params(weights={'pay': 0.1}), cache)
+    assert not cached and other['params_key'] != first['params_key']
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_flag_thresholds_are_reported():
+    client = TestClient(app.app)
+    uid = client.post('/upload', files={'file': ('a.csv', csv_bytes(dirty_rows(2000, 32)))}).json()['upload_id']
+
+    same = client.post('/rescore', params={'upload_id': uid}, json={}).json()
+    assert same['flags_changed'] == 0
+    assert all(f['delta'] == 0 for f in same['flags'].values())
+
+    # flag every customer on utilisation: classes stay, flags and probabilities move
+    lowered = {k: 0.0 for k in FLAG_THRESHOLDS if k.startswith('util')}
+    res = client.post('/rescore', params={'upload_id': uid}, json={'flag_thresholds': lowered}).json()
+    assert res['changed'] == 0
+    assert res['cached'] is False and res['params_key'] != same['params_key']
+    assert res['flags_changed'] > 0
+    assert set(res['flags']) == set(FLAG_BITS)
+    assert any(f['delta'] > 0 for f in res['flags'].values())
+    assert res['rule_prob']['new']['mean'] > res['rule_prob']['current']['mean']
+    assert res['final_prob']['new']['mean'] > res['final_prob']['current']['mean']
+    assert res['final_prob']['current'] == same['final_prob']['new']
+
+    assert client.post('/rescore', params={'upload_id': uid}, json={'flag_thresholds': {'nope': 1}}).status_code == 400
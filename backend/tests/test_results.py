@@ -0,0 +1,87 @@
+# test_results.py
+"""
+ResultRegistry under a small RESULTS_MAX_BYTES budget: least-recently-used
+eviction that never drops the latest upload, and `?upload_id=` routing with
+404s for evicted or unknown IDs.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from results import ResultRegistry
+from test_query import build_store
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+def test_lru_eviction_keeps_latest():
+    a, b, c = (build_store(dirty_rows(n, 81 + i)) for i, n in enumerate((400, 300, 300)))
+    sizes = {s.uid: s.memory_bytes() for s in (a, b, c)}
+    reg = ResultRegistry(max_bytes=sizes[a.uid] + max(sizes[b.uid], sizes[c.uid]))
+
+    reg.add(a)
+    reg.add(b)
+    assert len(reg) == 2 and reg.evictions == 0
+    assert reg.latest() is b
+    # reading `a` makes `b` the least recently used
+    assert reg.get(a.uid) is a
+    assert [d['upload_id'] for d in reg.describe()] == [a.uid, b.uid]
+
+    reg.add(c)
+    assert reg.get(b.uid) is None
+    assert reg.get(a.uid) is a and reg.latest() is c
+    assert reg.evictions == 1
+    assert reg.total_bytes() == sizes[a.uid] + sizes[c.uid] <= reg.max_bytes
+
+    # the latest upload stays even when it alone is over budget
+    reg.max_bytes = 1
+    d = build_store(dirty_rows(200, 84))
+    reg.add(d)
+    assert reg.latest() is d and len(reg) == 1
+    assert reg.get(a.uid) is None and reg.get(c.uid) is None
+    assert reg.evictions == 3
+
+    # results added as not-latest do not move the latest pointer
+    reg.max_bytes = 1 << 30
+    reg.add(a, latest=False)
+    assert reg.latest() is d and reg.get(a.uid) is a
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'RESULTS', ResultRegistry(max_bytes=1 << 30))
+    return TestClient(app.app)
+
+def upload(client, rows) -> str:
+    res = client.post('/upload', files={'file': ('a.csv', csv_bytes(rows))})
+    assert res.status_code == 200
+    return res.json()['upload_id']
+
+def test_upload_id_routing_and_404(client):
+    rows_b = dirty_rows(300, 86)
+    first = upload(client, dirty_rows(400, 85))
+    second = upload(client, rows_b)
+
+    # the older upload is still reachable by ID; the default is the latest
+    assert client.get('/summary').json()['upload_id'] == second
+    summary = client.get('/summary', params={'upload_id': first}).json()
+    assert summary['upload_id'] == first and summary['total_customers'] == 400
+    for path in ('/records', '/worklist', '/aggregates', '/cube', '/columnar', '/download_scored_csv'):
+        assert client.get(path, params={'upload_id': first}).status_code == 200, path
+    records = client.get('/records', params={'upload_id': first, 'limit': 1000}).json()['records']
+    assert len(records) == 400
+
+    # with room for two, a third upload evicts the least recently used one
+    # (`second`, since `first` was read since)
+    app.RESULTS.max_bytes = app.RESULTS.total_bytes()
+    third = upload(client, rows_b)
+    uploads = client.get('/uploads').json()
+    assert [u['upload_id'] for u in uploads['uploads']] == [third, first]
+    assert uploads['max_bytes'] == app.RESULTS.max_bytes
+
+    for uid in (second, 'no-such-upload'):
+        for path in ('/summary', '/records', '/worklist', '/aggregates', '/columnar', '/download_scored_csv'):
+            res = client.get(path, params={'upload_id': uid})
+            assert res.status_code == 404, path
+            assert uid in res.json()['detail']
+        assert client.get('/customer/C000001', params={'upload_id': uid}).status_code == 404
+        assert client.post('/rescore', params={'upload_id': uid}, json={}).status_code == 404
+    assert client.get('/summary').json()['upload_id'] == third
@@ -0,0 +1,63 @@
+# test_snapshot.py
+"""
+Snapshots as another worker process sees them: a store published by one
+registry is mapped, not copied, by a fresh registry following the same
+directory, and reads back the same.
+"""
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app
+import snapshot
+from results import ResultRegistry
+from store import ID_COLUMN
+from test_query import build_store
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+def test_published_store_reads_back_through_another_registry(tmp_path):
+    root = str(tmp_path)
+    store = build_store(dirty_rows(1500, 51))
+    snapshot.publish(store, root)
+
+    # a second worker: its own watcher and registry, nothing in memory
+    other = ResultRegistry(snapshots=snapshot.SnapshotWatcher(root))
+    loaded = other.latest()
+    assert loaded is not None and loaded is not store
+    assert loaded.uid == store.uid and loaded.readonly
+    for name, col in loaded.cols.items():
+        assert isinstance(col, np.memmap), name
+        np.testing.assert_array_equal(loaded.column(name), store.column(name), err_msg=name)
+
+    assert loaded.summary() == store.summary()
+    assert loaded.parse_stats == store.parse_stats
+    for i in (0, 1, len(store) // 2, len(store) - 1):
+        assert loaded.row(i) == store.row(i)
+    assert list(loaded.iter_rows()) == list(store.iter_rows())
+    customer = store.ids[7]
+    assert loaded.detail(customer) == store.detail(customer)
+    for name, value in store.get_aggregates().to_arrays().items():
+        np.testing.assert_array_equal(loaded.get_aggregates().to_arrays()[name], value, err_msg=name)
+    for name, value in store.get_cube().to_arrays().items():
+        np.testing.assert_array_equal(loaded.get_cube().to_arrays()[name], value, err_msg=name)
+    np.testing.assert_array_equal(loaded.get_worklist().top('score', 50), store.get_worklist().top('score', 50))
+
+    # a newer upload moves CURRENT; the other registry follows it, and the
+    # first one stays reachable by its upload ID
+    newer = build_store(dirty_rows(300, 52))
+    snapshot.publish(newer, root)
+    assert snapshot.read_pointer(root) == newer.uid
+    assert other.latest().uid == newer.uid
+    assert other.get(store.uid).summary() == store.summary()
+    assert loaded.find(customer) == store.find(customer)
+    assert store.ids[0] == loaded.row(0)[ID_COLUMN]
+
+def test_upload_is_published_for_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'SNAPSHOTS', snapshot.SnapshotWatcher(str(tmp_path)))
+    client = TestClient(app.app)
+    uid = client.post('/upload', files={'file': ('a.csv', csv_bytes(dirty_rows(400, 53)))}).json()['upload_id']
+
+    assert snapshot.read_pointer(str(tmp_path)) == uid
+    other = ResultRegistry(snapshots=snapshot.SnapshotWatcher(str(tmp_path))).latest()
+    assert other.uid == uid
+    assert list(other.iter_rows()) == list(app.RESULTS.get(uid).iter_rows())
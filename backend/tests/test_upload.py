@@ -0,0 +1,94 @@
+# test_upload.py
+"""
+/upload through the API: which uploads become the latest result set, and
+upserts against uploading the whole file afresh.
+"""
+import csv
+import gzip
+import io
+import random
+
+import numpy as np
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from store import ID_COLUMN
+from utils import REQUIRED_COLUMNS
+from test_scoring import DIRTY_CELLS, dirty_rows
+
+HEADER = (','.join(REQUIRED_COLUMNS) + '\n').encode()
+
+@pytest.fixture
+def client():
+    return TestClient(app.app)
+
+@pytest.mark.parametrize('query', ['', '?mode=stream', '?mode=upsert', '?mode=upsert&keep_missing=true',
+                                   '?layout=columnar', 'gzip'])
+def test_header_only_upload_is_refused(client, query):
+    first = client.post('/upload', files={'file': ('a.csv', HEADER + b'C1,1000,50,0.5,0.5,0.5,5,10,0\n')})
+    assert first.status_code == 200
+    if query == 'gzip':
+        res = client.post('/upload', files={'file': ('b.csv.gz', gzip.compress(HEADER))})
+    else:
+        res = client.post('/upload' + query, files={'file': ('b.csv', HEADER)})
+    assert res.status_code == 400
+    assert client.get('/summary').json()['upload_id'] == first.json()['upload_id']
+
+def csv_bytes(rows) -> bytes:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=REQUIRED_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buf.getvalue().encode('utf-8')
+
+def next_portfolio(rows, seed):
+    # the following month's file: customers dropped, cells changed (some only
+    # in their text, e.g. '5' -> '5.0'), new customers and repeated rows
+    rng = random.Random(seed)
+    out = []
+    for r in rows:
+        p = rng.random()
+        if p < 0.1:
+            continue
+        r = dict(r)
+        if p < 0.3:
+            h = rng.choice(REQUIRED_COLUMNS[1:])
+            r[h] = rng.choice(DIRTY_CELLS) if rng.random() < 0.5 else str(rng.uniform(0, 100))
+        elif p < 0.35 and r.get('Utilisation %', '').isdigit():
+            r['Utilisation %'] += '.0'
+        out.append(r)
+    new = dirty_rows(300, seed + 1)
+    for i, r in enumerate(new):
+        r[ID_COLUMN] = f'N{i:05d}'
+    out += new + rng.sample(out, 20)
+    rng.shuffle(out)
+    return out
+
+def assert_same_results(got, expected):
+    assert got.header == expected.header
+    assert list(got.iter_rows()) == list(expected.iter_rows())
+    np.testing.assert_array_equal(got.class_counts, expected.class_counts)
+    for order in ('score', 'exposure'):
+        np.testing.assert_array_equal(got.get_worklist().top(order, 100), expected.get_worklist().top(order, 100))
+    for name, value in expected.get_aggregates().to_arrays().items():
+        np.testing.assert_allclose(got.get_aggregates().to_arrays()[name], value, rtol=1e-9, atol=1e-6, err_msg=name)
+    for name, value in expected.get_cube().to_arrays().items():
+        np.testing.assert_allclose(got.get_cube().to_arrays()[name], value, rtol=1e-9, atol=1e-6, err_msg=name)
+
+@pytest.mark.parametrize('keep_missing', [False, True])
+def test_upsert_matches_fresh_upload(client, keep_missing):
+    base_rows = dirty_rows(2000, 21)
+    rows = next_portfolio(base_rows, 22)
+    base = client.post('/upload', files={'file': ('a.csv', csv_bytes(base_rows))}).json()['upload_id']
+    upserted = client.post('/upload', params={'mode': 'upsert', 'base': base, 'keep_missing': keep_missing},
+                           files={'file': ('b.csv', csv_bytes(rows))}).json()
+    if keep_missing:
+        # base customers missing from the file follow it unchanged, in base order
+        seen = {r[ID_COLUMN] for r in rows}
+        rows = rows + [r for r in base_rows if r[ID_COLUMN] not in seen]
+    fresh = client.post('/upload', files={'file': ('c.csv', csv_bytes(rows))}).json()['upload_id']
+
+    assert upserted['unchanged'] > 0 and upserted['changed'] > 0 and upserted['added'] > 0
+    assert_same_results(app.RESULTS.get(upserted['upload_id']), app.RESULTS.get(fresh))
@@ -0,0 +1,62 @@
+# test_worklist.py
+"""
+Worklist candidates: merging per-chunk top sets equals selecting over the
+whole, and /worklist?n= returns exactly a full sort's first n rows.
+"""
+import math
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+import worklist
+from store import ID_COLUMN
+from worklist import Worklist, WORKLIST_ORDERS
+from test_scoring import dirty_rows
+from test_upload import csv_bytes
+
+def brute_force(score: np.ndarray, limit: np.ndarray, order: str, n: int):
+    # full sort: key descending, ties by row; unparseable limits as no exposure
+    keys = []
+    for s, lim in zip(score.tolist(), limit.tolist()):
+        if order == 'exposure':
+            s = s * (lim if math.isfinite(lim) and lim > 0 else 0.0)
+        keys.append(s)
+    return sorted(range(len(keys)), key=lambda i: (-keys[i], i))[:n]
+
+def test_merged_chunks_equal_whole():
+    rng = np.random.default_rng(101)
+    # coarse scores and repeated limits for plenty of ties
+    score = rng.integers(0, 50, 5000) / 50.0
+    limit = rng.choice([np.nan, -1.0, 0.0, 1000.0, 5000.0, 1e5], 5000)
+    whole = Worklist.from_batch(score, limit, capacity=200)
+    merged = Worklist(capacity=200)
+    for start in range(0, 5000, 700):
+        merged.merge(Worklist.from_batch(score[start:start + 700], limit[start:start + 700], capacity=200), start)
+    for order in WORKLIST_ORDERS:
+        assert len(merged.rows[order]) == 200
+        np.testing.assert_array_equal(merged.top(order, 200), whole.top(order, 200))
+        assert merged.top(order, 200).tolist() == brute_force(score, limit, order, 200)
+
+def test_top_rejects_bad_arguments():
+    wl = Worklist.from_batch(np.array([0.5, 0.2]), np.array([100.0, 200.0]), capacity=10)
+    with pytest.raises(ValueError):
+        wl.top('nope', 1)
+    with pytest.raises(ValueError):
+        wl.top('score', 11)
+    # fewer rows than asked for: all of them
+    assert wl.top('score', 10).tolist() == [0, 1]
+
+@pytest.mark.parametrize('order', WORKLIST_ORDERS)
+def test_worklist_endpoint_matches_brute_force(order):
+    client = TestClient(app.app)
+    uid = client.post('/upload', files={'file': ('a.csv', csv_bytes(dirty_rows(3000, 102)))}).json()['upload_id']
+    store = app.RESULTS.get(uid)
+    for n in (1, 25, 3000):
+        body = client.get('/worklist', params={'upload_id': uid, 'n': n, 'order': order}).json()
+        expected = brute_force(store.column('score_norm'), store.column('Credit Limit'), order, n)
+        assert [r[ID_COLUMN] for r in body['records']] == [store.ids[i] for i in expected]
+        assert [r['rank'] for r in body['records']] == list(range(1, n + 1))
+        assert body['total_customers'] == len(store)
+    assert client.get('/worklist', params={'upload_id': uid, 'order': order, 'n': worklist.WORKLIST_SIZE + 1}).status_code == 400
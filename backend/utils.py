@@ -1,38 +1,149 @@
 # utils.py
 import csv
+import codecs
 import io
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from ingest import detect_encoding, SNIFF_BYTES
 
 REQUIRED_COLUMNS = [
     'Customer ID','Credit Limit','Utilisation %','Avg Payment Ratio','Min Due Paid Frequency',
     'Merchant Mix Index','Cash Withdrawal %','Recent Spend Change %','DPD Bucket Next Month'
 ]
 
-def parse_csv_bytes(content: bytes, encoding: str = 'utf-8') -> List[Dict[str, Any]]:
+def parse_csv_bytes(content: bytes, encoding: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Parse CSV bytes into a list of dict rows using csv.DictReader.
     Returns list of dict where keys are the header column names.
     """
-    text = content.decode(encoding, errors='replace')
+    text = content.decode(encoding or detect_encoding(content), errors='replace')
     f = io.StringIO(text)
     reader = csv.DictReader(f)
     rows = []
     for r in reader:
         # keep as-is (strings); scoring functions will coerce to float
-        rows.append({k.strip(): (v.strip() if isinstance(v, str) else v) for k,v in r.items()})
+        rows.append(_clean_row(r))
     return rows
 
-def validate_records_columns(records: List[Dict[str, Any]]) -> List[str]:
+def parse_csv_rows(content: bytes, encoding: Optional[str] = None):
     """
-    Check first record header columns (keys) against REQUIRED_COLUMNS.
-    Returns list of missing columns (empty list if OK).
+    Parse CSV bytes into (header, rows) where rows are lists of cell strings
+    (blank lines skipped). Cheaper than parse_csv_bytes: no dict per row.
+    The encoding is detected (ingest.detect_encoding) unless given.
     """
-    if not records:
-        return REQUIRED_COLUMNS[:]  # everything missing
-    first = records[0]
-    present = list(first.keys())
-    missing = [c for c in REQUIRED_COLUMNS if c not in present]
-    return missing
+    reader = csv.reader(io.StringIO(content.decode(encoding or detect_encoding(content), errors='replace')))
+    header = next(reader, None)
+    return [h.strip() for h in (header or [])], [r for r in reader if r]
+
+def _clean_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {k.strip(): (v.strip() if isinstance(v, str) else v) for k,v in r.items()}
+
+class CsvStreamParser:
+    """
+    Incremental CSV parser. feed() raw byte chunks as they arrive and get back
+    the dict rows completed so far (same shape as parse_csv_bytes); call close()
+    once at the end for the remainder. Only whole records are handed to the csv
+    module, so quoted fields spanning chunk boundaries are handled.
+
+    With encoding=None the encoding is detected from the first bytes of the
+    stream (ingest.detect_encoding: byte order mark, else UTF-8 or
+    Windows-1252); `encoding` holds the result once known.
+    """
+    def __init__(self, encoding: Optional[str] = None, dict_rows: bool = True):
+        # dict_rows=False returns raw cell lists instead (for schema.ColumnDecoder)
+        self.dict_rows = dict_rows
+        self.encoding = encoding
+        self._decoder = None if encoding is None else codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._head = b''
+        self._tail = ''
+        self._pending: List[str] = []  # lines of a record still inside quotes
+        self._quotes = 0
+        self.fieldnames: Optional[List[str]] = None
+        self.bytes_read = 0
+        self.rows_parsed = 0
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        self.bytes_read += len(data)
+        if self._decoder is None:
+            # hold the first bytes back until there are enough to sniff
+            self._head += data
+            if len(self._head) < SNIFF_BYTES:
+                return []
+            data, self._head = self._head, b''
+            self._start_decoder(data)
+        return self._consume(self._decoder.decode(data), final=False)
+
+    def close(self) -> List[Dict[str, Any]]:
+        data = b''
+        if self._decoder is None:
+            data, self._head = self._head, b''
+            self._start_decoder(data)
+        return self._consume(self._decoder.decode(data, final=True), final=True)
+
+    def _start_decoder(self, head: bytes):
+        self.encoding = detect_encoding(head)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+
+    def _consume(self, text: str, final: bool) -> List[Dict[str, Any]]:
+        text = self._tail + text
+        if final:
+            self._tail = ''
+        else:
+            cut = text.rfind('\n') + 1
+            text, self._tail = text[:cut], text[cut:]
+
+        lines = []
+        for line in io.StringIO(text):
+            self._pending.append(line)
+            self._quotes += line.count('"')
+            if self._quotes % 2 == 0:
+                lines.extend(self._pending)
+                self._pending = []
+                self._quotes = 0
+        if final and self._pending:
+            lines.extend(self._pending)
+            self._pending = []
+
+        if not lines:
+            return []
+        if self.fieldnames is None:
+            reader = csv.reader(lines)
+            self.fieldnames = next(reader, None)
+            if self.fieldnames is None:
+                return []
+            # a quoted header can span several physical lines
+            lines = lines[reader.line_num:]
+        if self.dict_rows:
+            rows = [_clean_row(r) for r in csv.DictReader(lines, fieldnames=self.fieldnames)]
+        else:
+            # csv.DictReader skips blank lines too
+            rows = [r for r in csv.reader(lines) if r]
+        self.rows_parsed += len(rows)
+        return rows
+
+def csv_record_end(content: bytes, start: int, quotes: int = 0) -> int:
+    """
+    Offset just past the first newline at or after `start` that ends a CSV
+    record (quotes balanced, counting `quotes` already seen since the record
+    began), or len(content).
+    """
+    pos = start
+    while True:
+        nl = content.find(b'\n', pos)
+        if nl < 0:
+            return len(content)
+        quotes += content.count(b'"', pos, nl)
+        if quotes % 2 == 0:
+            return nl + 1
+        pos = nl + 1
+
+def parse_csv_header(content: bytes, encoding: Optional[str] = None) -> List[str]:
+    """
+    Return the stripped header row of raw CSV bytes (empty list if none).
+    """
+    parser = CsvStreamParser(encoding, dict_rows=False)
+    parser.feed(content[:csv_record_end(content, 0)])
+    parser.close()
+    return [h.strip() for h in (parser.fieldnames or [])]
 
 def records_to_csv_bytes(records: List[Dict[str, Any]], encoding: str = 'utf-8') -> bytes:
     """
@@ -0,0 +1,101 @@
+# worklist.py
+"""
+Collections worklist: the top WORKLIST_SIZE customers of a result set by
+score_norm ('score') and by score_norm x credit limit ('exposure').
+
+Each scored chunk keeps only its own top candidates (a partition, not a
+sort), and appending a chunk merges its candidates into the store's bounded
+set, so the set is filled while scoring and never holds more than
+WORKLIST_SIZE rows per order. The top n of the union of per-chunk top sets is
+the top n of all rows, so a request sorts at most WORKLIST_SIZE candidates,
+whatever the store's size. Ties rank the earlier row first.
+"""
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+# candidates kept per order = largest n /worklist serves
+WORKLIST_SIZE = int(os.environ.get('WORKLIST_SIZE', '10000'))
+WORKLIST_ORDERS = ('score', 'exposure')
+
+def worklist_keys(score_norm: np.ndarray, credit_limit: np.ndarray) -> Dict[str, np.ndarray]:
+    # ranking key per order, higher first; unparseable limits count as no exposure
+    limit = np.where(np.isfinite(credit_limit) & (credit_limit > 0), credit_limit, 0.0)
+    missing = np.isnan(score_norm)
+    return {'score': np.where(missing, -np.inf, score_norm),
+            'exposure': np.where(missing, -np.inf, np.nan_to_num(score_norm) * limit)}
+
+def _top(keys: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # the k best (key desc, row asc) of the candidates, in no particular order
+    if len(keys) <= k:
+        return keys, rows
+    if k <= 0:
+        return keys[:0], rows[:0]
+    threshold = np.partition(keys, len(keys) - k)[len(keys) - k]
+    above = np.flatnonzero(keys > threshold)
+    tied = np.flatnonzero(keys == threshold)
+    need = k - len(above)
+    if need < len(tied):
+        last = np.partition(rows[tied], need - 1)[need - 1]
+        tied = tied[rows[tied] <= last]
+    take = np.concatenate([above, tied])
+    return keys[take], rows[take]
+
+class Worklist:
+    def __init__(self, capacity: int = WORKLIST_SIZE):
+        self.capacity = capacity
+        self.keys = {o: np.empty(0, dtype=np.float64) for o in WORKLIST_ORDERS}
+        self.rows = {o: np.empty(0, dtype=np.int64) for o in WORKLIST_ORDERS}
+        # per order, candidates sorted best first; rebuilt after a merge
+        self._ranked: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_batch(cls, score_norm: np.ndarray, credit_limit: np.ndarray, capacity: int = WORKLIST_SIZE) -> 'Worklist':
+        """
+        Top candidates of one scored chunk; rows are positions in the chunk.
+        """
+        wl = cls(capacity)
+        rows = np.arange(len(score_norm), dtype=np.int64)
+        for o, keys in worklist_keys(np.asarray(score_norm, dtype=np.float64),
+                                     np.asarray(credit_limit, dtype=np.float64)).items():
+            wl.keys[o], wl.rows[o] = _top(keys, rows, capacity)
+        return wl
+
+    def merge(self, other: 'Worklist', offset: int = 0) -> 'Worklist':
+        # in place; other's rows come after this one's, starting at `offset`
+        for o in WORKLIST_ORDERS:
+            self.keys[o], self.rows[o] = _top(np.concatenate([self.keys[o], other.keys[o]]),
+                                              np.concatenate([self.rows[o], other.rows[o] + offset]),
+                                              self.capacity)
+        self._ranked = {}
+        return self
+
+    def top(self, order: str, n: int) -> np.ndarray:
+        """
+        Store rows of the n best customers by `order`, best first.
+        """
+        if order not in WORKLIST_ORDERS:
+            raise ValueError(f"order must be one of {list(WORKLIST_ORDERS)}")
+        if not 1 <= n <= self.capacity:
+            raise ValueError(f"n must be between 1 and {self.capacity}")
+        if order not in self._ranked:
+            keys, rows = self.keys[order], self.rows[order]
+            self._ranked[order] = rows[np.lexsort((rows, -keys))]
+        return self._ranked[order][:n]
+
+    # -- persistence (snapshot.py)
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        out = {}
+        for o in WORKLIST_ORDERS:
+            out[f'{o}.keys'] = self.keys[o]
+            out[f'{o}.rows'] = self.rows[o]
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], capacity: int) -> 'Worklist':
+        wl = cls(capacity)
+        for o in WORKLIST_ORDERS:
+            wl.keys[o] = np.array(arrays[f'{o}.keys'], dtype=np.float64)
+            wl.rows[o] = np.array(arrays[f'{o}.rows'], dtype=np.int64)
+        return wl
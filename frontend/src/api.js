@@ -14,19 +14,83 @@ export async function uploadCSV(file) {
   return res.data;
 }
 
-export async function getSummary() {
-  const res = await axios.get(`${BASE}/summary`);
+// uploadId (from the /upload response) pins a call to that upload's results;
+// without it the latest upload is used
+
+export async function getSummary(uploadId) {
+  const res = await axios.get(`${BASE}/summary`, { params: { upload_id: uploadId } });
   return res.data;
 }
 
-export async function getCustomer(id) {
-  const res = await axios.get(`${BASE}/customer/${id}`);
+export async function getCustomer(id, uploadId) {
+  const res = await axios.get(`${BASE}/customer/${id}`, { params: { upload_id: uploadId } });
   return res.data;
 }
 
-export async function downloadScoredCSV() {
+export async function downloadScoredCSV(uploadId) {
   const res = await axios.get(`${BASE}/download_scored_csv`, {
+    params: { upload_id: uploadId },
     responseType: 'blob'
   });
   return res.data;
 }
+
+export async function queryRecords(params = {}) {
+  const res = await axios.get(`${BASE}/records`, { params });
+  return res.data;
+}
+
+export async function getColumnar(uploadId) {
+  // { ...summary, risk_classes, contrib_keys, columns: { field: [values] } }
+  const res = await axios.get(`${BASE}/columnar`, { params: { upload_id: uploadId } });
+  return res.data;
+}
+
+export async function getAggregates(uploadId, params = {}) {
+  // { counts, score_norm, features: { name: { edges, counts, mean, mean_abs, quantiles } } },
+  // each statistic keyed by 'all' and risk class
+  const res = await axios.get(`${BASE}/aggregates`, { params: { upload_id: uploadId, ...params } });
+  return res.data;
+}
+
+export async function getCube(uploadId, by = ['risk_class'], filters = {}) {
+  // { by, cells: [{ <dimension>: label, count, credit_limit_sum, score_norm_mean }], total, dimensions };
+  // filters map a dimension (risk_class, limit_band, util_band, flag) to the labels to keep
+  const params = { upload_id: uploadId, by: by.join(',') };
+  for (const [dim, labels] of Object.entries(filters)) {
+    if (labels && labels.length) params[dim] = [].concat(labels).join(',');
+  }
+  const res = await axios.get(`${BASE}/cube`, { params });
+  return res.data;
+}
+
+export async function getWorklist(n = 100, order = 'score', uploadId) {
+  // top-n customers by score_norm (order 'score') or score_norm x credit limit
+  // ('exposure'): { records: [{ rank, 'Customer ID', score_norm, exposure, top3_contribs, ... }] }
+  const res = await axios.get(`${BASE}/worklist`, { params: { n, order, upload_id: uploadId } });
+  return res.data;
+}
+
+// background scoring: submitJob answers at once with { job_id, state, progress };
+// poll getJob until state is done (result.upload_id), failed or cancelled
+
+export async function submitJob(file) {
+  const form = new FormData();
+  form.append('file', file);
+
+  const res = await axios.post(`${BASE}/jobs`, form, {
+    headers: { 'Content-Type': 'multipart/form-data' }
+  });
+
+  return res.data;
+}
+
+export async function getJob(jobId) {
+  const res = await axios.get(`${BASE}/jobs/${jobId}`);
+  return res.data;
+}
+
+export async function cancelJob(jobId) {
+  const res = await axios.delete(`${BASE}/jobs/${jobId}`);
+  return res.data;
+}
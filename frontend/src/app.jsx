@@ -2,7 +2,7 @@
 
 import LogoSmall from "./logo.png";
 import React, { useEffect, useState } from 'react';
-import { uploadCSV, getSummary, downloadScoredCSV } from './api';
+import { uploadCSV, getSummary, getAggregates, downloadScoredCSV } from './api';
 import KPI from './components/KPI';
 import UploadPanel from './components/UploadPanel';
 import RiskCharts from './components/RiskCharts';
@@ -20,6 +20,8 @@ export default function App() {
         low_risk: 0,
     });
 
+    const [uploadId, setUploadId] = useState(null);
+    const [aggregates, setAggregates] = useState(null);
     const [selectedCustomer, setSelectedCustomer] = useState(null);
     const [drawerOpen, setDrawerOpen] = useState(false);
     const [loading, setLoading] = useState(false);
@@ -55,12 +57,19 @@ export default function App() {
         try {
             const res = await uploadCSV(file);
             setRecords(res.records || []);
+            setUploadId(res.upload_id || null);
             setSummary({
                 total_customers: res.total_customers,
                 high_risk: res.high_risk,
                 medium_risk: res.medium_risk,
                 low_risk: res.low_risk,
             });
+            try {
+                setAggregates(res.upload_id ? await getAggregates(res.upload_id) : null);
+            } catch (e) {
+                // charts fall back to the records
+                setAggregates(null);
+            }
             // reset slider to show all on fresh upload
             setSliderRange({ min: 0, max: 100 });
         } catch (err) {
@@ -78,7 +87,7 @@ export default function App() {
 
     const handleDownload = async () => {
         try {
-            const blob = await downloadScoredCSV();
+            const blob = await downloadScoredCSV(uploadId || undefined);
             const url = window.URL.createObjectURL(new Blob([blob]));
             const link = document.createElement('a');
             link.href = url;
@@ -130,7 +139,7 @@ export default function App() {
                 </div>
 
                 <div className="space-y-3">
-                    <RiskCharts records={records} />
+                    <RiskCharts records={records} aggregates={aggregates} />
                 </div>
 
                 {/* --- Footer Note --- */}
@@ -42,16 +42,31 @@ const drawBarValuePlugin = {
 };
 Chart.register(drawBarValuePlugin);
 
-export default function RiskCharts({ records = [] }) {
+// bar label -> (feature in the /aggregates response, statistic, scale to %)
+const AGG_BARS = {
+  "Utilisation %": ["util_pct", "mean", 1],
+  "Avg Payment Ratio": ["avg_pay", "mean", 100],
+  "Cash Withdrawal %": ["cash_pct", "mean", 1],
+  "Recent Spend Change %": ["spend_change_pct", "mean_abs", 1],
+  "Min Due Paid Frequency": ["minpaid_pct", "mean", 1],
+};
+
+// `aggregates` (from getAggregates) is used when present; otherwise the
+// charts are computed from `records`
+export default function RiskCharts({ records = [], aggregates = null }) {
   // Count occurrences of each risk class
   const counts = useMemo(() => {
+    if (aggregates) {
+      const { Low = 0, Medium = 0, High = 0 } = aggregates.counts || {};
+      return { Low, Medium, High };
+    }
     const c = { Low: 0, Medium: 0, High: 0 };
     records.forEach((r) => {
       const key = r.risk_class || r.riskClass || r.risk || "Low";
       c[key] = (c[key] || 0) + 1;
     });
     return c;
-  }, [records]);
+  }, [records, aggregates]);
 
   const pieData = {
     labels: ["Low", "Medium", "High"],
@@ -88,6 +103,14 @@ export default function RiskCharts({ records = [] }) {
 
   // Compute averages of important columns (now includes Min Due Paid Frequency)
   const avgFeatures = useMemo(() => {
+    if (aggregates) {
+      const out = {};
+      Object.entries(AGG_BARS).forEach(([label, [name, stat, scale]]) => {
+        const v = aggregates.features?.[name]?.[stat]?.all;
+        out[label] = v == null ? 0 : v * scale;
+      });
+      return out;
+    }
     if (!records.length)
       return {
         "Utilisation %": 0,
@@ -127,7 +150,7 @@ export default function RiskCharts({ records = [] }) {
       "Recent Spend Change %": sums["Recent Spend Change %"] / n,
       "Min Due Paid Frequency": sums["Min Due Paid Frequency"] / n,
     };
-  }, [records]);
+  }, [records, aggregates]);
 
   // Order and palette
   const labels = [
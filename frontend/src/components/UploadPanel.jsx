@@ -39,7 +39,7 @@ export default function UploadPanel({ onUpload, loading }) {
       <input
         ref={fileRef}
         type="file"
-        accept=".csv"
+        accept=".csv,.gz,.zst"
         className="hidden"
         onChange={(e) => handleFileSelect(e)}
       />